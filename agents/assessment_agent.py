@@ -2,111 +2,236 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import json
-import re
-from core.ai_client import chat_completion
-from core.pdf_tool import extract_text_from_pdf
+import asyncio
+import functools
+from typing import Optional
+from core.ai_client import chat_completion, achat_completion, route_model
+from core.chunker import estimate_tokens
+from core.digest import build_digest, abuild_digest
+from core.config import PDF_MAX_EXTRACT_TOKENS, REPAIR_ENABLED
+from core.pdf_tool import iter_pdf_text
+from core.retrieval import NoMatchingMaterial, format_pages, parse_pages, pdf_index, text_index
+from core.json_extract import parse_json
 from core.logger import logger
+from core.metrics import llm_agent
+from core.repair import find_fragments, messages_tokens, repair_fragments, salvage
+from core.schemas import fill_defaults, schema_error
+
+# One entry of "questions", for repair prompts
+QUESTION_SCHEMA = (
+    "{\n"
+    "  q: string,\n"
+    "  options: array of strings (MCQ only),\n"
+    "  answer: string\n"
+    "}"
+)
 
 class AssessmentAgent:
-    def __init__(self, model="openai/gpt-5-chat-latest"):
+    def __init__(self, model=None):
+        # None follows the "assessment" route in core.ai_client; a model name pins it
         self.model = model
 
-    def generate_assessment(self, course_material: str, options: dict) -> dict:
+    @llm_agent("assessment")
+    def generate_assessment(self, course_material: str, options: dict, force: bool = False) -> dict:
+        """Generate an assessment; force=True asks the model again instead of reusing a cached response."""
+        return self._generate_assessment(course_material, options, use_cache=not force)
+
+    def _generate_assessment(self, course_material: str, options: dict, use_cache: bool = True) -> dict:
         try:
             logger.info("LessonPlanAgent started with inputs: %s", options)
-            # PDF or raw text
-            if course_material.endswith(".pdf"):
-                material_text = extract_text_from_pdf(course_material)
-                logger.info("Extracted text from PDF: %s (length=%d)", course_material, len(material_text))
-            else:
-                material_text = course_material
-                logger.info("Received raw text input (length=%d)", len(material_text))
-
+            material_text = self._load_material(course_material, options)
             if not material_text.strip():
                 logger.warning("No valid course material found in %s", course_material)
                 return {"error": "No valid course material found."}
+            model, max_tokens = route_model("assessment", self.model)
+            material_text = build_digest(material_text, model)
 
-            system_prompt = (
-                "You are an assessment designer.\n"
-                "Create an assessment based on provided material.\n\n"
-                "Return ONLY a valid JSON object with these keys: \n"
-                "- title (string)\n"
-                "- type (MCQ | ShortAnswer | Project)\n"
-                "- difficulty (string)\n"
-                "- questions (array of objects with: q, options(if MCQ), answer)\n"
-                "- rubric (array of objects with: criteria, points) if rubric requested\n\n"
-                "Do not include any prose, explanations, code fences, or markdown.\n"
-                "Use only double quotes."
-            )
-
-            user_prompt = (
-                f"Create a {options.get('type', 'MCQ')} assessment.\n"
-                f"Difficulty: {options.get('difficulty', 'Medium')}.\n"
-                f"Number of questions: {options.get('count', 5)}.\n"
-                f"Include rubric: {options.get('rubric', True)}.\n"
-            )
-
+            messages = self._build_messages(material_text, options)
             raw = chat_completion(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": material_text},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.4
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                use_cache=use_cache,
+                cache_if=functools.partial(self._assessment_complete, options=options)
             )
             print(raw)
-            # Try strict JSON parse first, then attempt sanitization
-            parsed = None
-            try:
-                parsed = json.loads(raw)
-            except json.JSONDecodeError:
-                # Attempt to extract a JSON block from code fences
-                fence_match = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", raw)
-                candidate = fence_match.group(1) if fence_match else None
-                if not candidate:
-                    # Fallback: take substring from first '{' to last '}'
-                    start = raw.find('{')
-                    end = raw.rfind('}')
-                    if start != -1 and end != -1 and end > start:
-                        candidate = raw[start:end+1]
-                if candidate:
-                    # Light normalization: remove trailing commas before } or ] and normalize smart quotes
-                    norm = candidate
-                    norm = norm.replace('\u201c', '"').replace('\u201d', '"').replace('\u2019', "'")
-                    norm = re.sub(r",\s*([}\]])", r"\1", norm)
-                    try:
-                        parsed = json.loads(norm)
-                    except json.JSONDecodeError:
-                        logger.error("Sanitized JSON still invalid. Raw: %s", raw)
-                        return {"error": "Model did not return valid JSON.", "raw": raw}
-                else:
-                    logger.error("No JSON object could be extracted. Raw: %s", raw)
-                    return {"error": "Model did not return valid JSON.", "raw": raw}
-
-            # Ensure minimal structure
-            if not isinstance(parsed, dict):
-                logger.error("Parsed JSON is not an object. Parsed: %s", parsed)
-                return {"error": "Model did not return a JSON object.", "raw": raw}
-
-            parsed.setdefault("title", "Assessment")
-            parsed.setdefault("type", options.get("type", "MCQ"))
-            parsed.setdefault("difficulty", options.get("difficulty", "Medium"))
-            parsed.setdefault("questions", [])
-            if options.get("rubric", True):
-                parsed.setdefault("rubric", [])
-
-            logger.info(
-                "AssessmentAgent successfully generated assessment with %d questions",
-                len(parsed.get("questions", []))
+            return self._parse_assessment(raw, options, messages, use_cache)
+
+        except NoMatchingMaterial as e:
+            logger.warning("%s (%s)", e, course_material)
+            return {"error": str(e)}
+        except Exception as e:
+            logger.error("AssessmentAgent failed: %s", e, exc_info=True)
+            return {"error": f"AssessmentAgent failed: {e}"}
+
+    @llm_agent("assessment")
+    async def agenerate_assessment(self, course_material: str, options: dict, force: bool = False) -> dict:
+        """Async variant of generate_assessment; PDF extraction runs in a worker thread."""
+        return await self._agenerate_assessment(course_material, options, use_cache=not force)
+
+    async def _agenerate_assessment(self, course_material: str, options: dict, use_cache: bool = True) -> dict:
+        try:
+            logger.info("AssessmentAgent (async) started with inputs: %s", options)
+            material_text = await asyncio.to_thread(self._load_material, course_material, options)
+            if not material_text.strip():
+                logger.warning("No valid course material found in %s", course_material)
+                return {"error": "No valid course material found."}
+            model, max_tokens = route_model("assessment", self.model)
+            material_text = await abuild_digest(material_text, model)
+
+            messages = self._build_messages(material_text, options)
+            raw = await achat_completion(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                use_cache=use_cache,
+                cache_if=functools.partial(self._assessment_complete, options=options)
             )
-            return parsed
-            
+            # Repair calls (if any) are blocking
+            return await asyncio.to_thread(self._parse_assessment, raw, options, messages, use_cache)
+
+        except NoMatchingMaterial as e:
+            logger.warning("%s (%s)", e, course_material)
+            return {"error": str(e)}
         except Exception as e:
             logger.error("AssessmentAgent failed: %s", e, exc_info=True)
             return {"error": f"AssessmentAgent failed: {e}"}
 
+    def _load_material(self, course_material: str, options: dict) -> str:
+        topic = (options.get("topic") or "").strip()
+        pages = parse_pages(options.get("pages"))
+        if topic or pages:
+            return self._retrieve_material(course_material, topic, pages)
+
+        # PDF or raw text
+        if course_material.endswith(".pdf"):
+            material_text = " ".join(iter_pdf_text(course_material, max_tokens=PDF_MAX_EXTRACT_TOKENS))
+            logger.info("Extracted text from PDF: %s (length=%d)", course_material, len(material_text))
+        else:
+            material_text = course_material
+            logger.info("Received raw text input (length=%d)", len(material_text))
+        return material_text
+
+    def _retrieve_material(self, course_material: str, topic: str, pages) -> str:
+        # Only the passages about the topic (and/or on the selected pages) go into the prompt
+        if course_material.endswith(".pdf"):
+            index = pdf_index(course_material)
+        else:
+            index = text_index(course_material)
+            pages = None
+        chosen = index.select(topic=topic or None, pages=pages)
+        if not chosen and pages and index.chunks:
+            with_text = {int(p) for p in index.chunk_pages}
+            raise NoMatchingMaterial(
+                f"The selected pages ({format_pages(pages)}) have no text in this document; "
+                f"pages with text: {format_pages(with_text)}."
+            )
+        material_text = index.passages(chosen)
+        logger.info(
+            "Retrieved %d of %d chunks for topic=%r pages=%s (~%d tokens)",
+            len(chosen), len(index.chunks), topic, sorted(p + 1 for p in pages) if pages else None,
+            estimate_tokens(material_text),
+        )
+        return material_text
+
+    def _build_messages(self, material_text: str, options: dict) -> list:
+        system_prompt = (
+            "You are an assessment designer.\n"
+            "Create an assessment based on provided material.\n\n"
+            "Return ONLY a valid JSON object with these keys: \n"
+            "- title (string)\n"
+            "- type (MCQ | ShortAnswer | Project)\n"
+            "- difficulty (string)\n"
+            "- questions (array of objects with: q, options(if MCQ), answer)\n"
+            "- rubric (array of objects with: criteria, points) if rubric requested\n\n"
+            "Do not include any prose, explanations, code fences, or markdown.\n"
+            "Use only double quotes."
+        )
+
+        user_prompt = (
+            f"Create a {options.get('type', 'MCQ')} assessment.\n"
+            f"Difficulty: {options.get('difficulty', 'Medium')}.\n"
+            f"Number of questions: {options.get('count', 5)}.\n"
+            f"Include rubric: {options.get('rubric', True)}.\n"
+        )
+        if options.get("topic"):
+            user_prompt += f"Focus every question on this topic: {options['topic']}.\n"
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": material_text},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _parse_assessment(self, raw: str, options: dict, messages=None, use_cache: bool = True) -> dict:
+        """
+        Parse the model output. With the prompt messages, questions that do not
+        parse or lack an answer are repaired one by one (core.repair).
+        """
+        parsed = parse_json(raw)
+        broken = None
+        if not isinstance(parsed, dict) and messages and REPAIR_ENABLED:
+            salvaged = salvage(raw, "questions", parse_json)
+            if salvaged is not None:
+                parsed, broken = salvaged
+        if parsed is None:
+            return {"error": "Model did not return valid JSON.", "raw": raw}
+
+        # Ensure minimal structure
+        if not isinstance(parsed, dict):
+            logger.error("Parsed JSON is not an object. Parsed: %s", parsed)
+            return {"error": "Model did not return a JSON object.", "raw": raw}
+
+        if messages and REPAIR_ENABLED and isinstance(parsed.get("questions"), list):
+            qtype = parsed.get("type") or options.get("type", "MCQ")
+            check = functools.partial(self._question_problem, qtype=qtype)
+            fragments = find_fragments(parsed, "questions", check, broken)
+            if fragments:
+                parsed["_repair"] = repair_fragments(
+                    parsed, "questions", fragments, QUESTION_SCHEMA,
+                    functools.partial(self._repair_call, use_cache=use_cache),
+                    parse_json, check,
+                    full_retry_tokens=messages_tokens(messages) + estimate_tokens(raw),
+                    context=f"Assessment type: {qtype}. Difficulty: {options.get('difficulty', 'Medium')}.",
+                )
+
+        # Ensure expected keys with defaults (core.schemas assessment)
+        fill_defaults(
+            "assessment", parsed,
+            type=options.get("type", "MCQ"),
+            difficulty=options.get("difficulty", "Medium"),
+            **({"rubric": []} if options.get("rubric", True) else {}),
+        )
+
+        logger.info(
+            "AssessmentAgent successfully generated assessment with %d questions",
+            len(parsed.get("questions", []))
+        )
+        return parsed
+
+    def _assessment_complete(self, raw: str, options: dict) -> bool:
+        """cache_if for assessment calls: a JSON object whose questions all pass the question schema."""
+        parsed = parse_json(raw)
+        questions = parsed.get("questions") if isinstance(parsed, dict) else None
+        qtype = (parsed.get("type") if isinstance(parsed, dict) else None) or options.get("type", "MCQ")
+        return bool(questions) and all(
+            self._question_problem(q, i, qtype) is None for i, q in enumerate(questions)
+        )
+
+    def _question_problem(self, question, index, qtype) -> Optional[str]:
+        """What makes a question unusable (per the question / question_mcq schema), or None."""
+        err = schema_error("question_mcq" if str(qtype).upper() == "MCQ" else "question", question)
+        return err.describe() if err else None
+
+    def _repair_call(self, messages: list, use_cache: bool = True) -> str:
+        model, max_tokens = route_model("json_repair", self.model)
+        return chat_completion(
+            model=model, messages=messages, temperature=0, max_tokens=max_tokens,
+            use_cache=use_cache, cache_if=lambda raw: parse_json(raw) is not None,
+        )
+
 """
 asmt_agent = AssessmentAgent()
 assessment = asmt_agent.generate_assessment(
@@ -4,7 +4,12 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from typing import Dict, Any, Optional
 from core.logger import logger
-from integrations.email_writer import parse_prompt_to_fields, draft_email
+from integrations.email_writer import (
+    parse_prompt_to_fields,
+    draft_email,
+    aparse_prompt_to_fields,
+    adraft_email,
+)
 from integrations.gmail_tool import (
     get_gmail_service,
     get_sender_address,
@@ -83,45 +88,89 @@ class EmailAgent:
             )
             logger.info("Email content drafted successfully")
 
-            # Prepare message parameters
-            subject = parsed.get("subject_override") or drafted["subject"]
-            body_html = drafted["html"] if (default_use_html and drafted["html"]) else None
-            body_text = drafted["plain"]
-            cc = parsed.get("cc") or None
-            bcc = parsed.get("bcc") or None
-            action = parsed.get("action", "send")
-            
-            # Validate action
-            if action not in ("send", "draft"):
-                logger.warning("Invalid action '%s', defaulting to 'send'", action)
-                action = "send"
-
-            # Create the email message
-            msg = create_message(
-                to=to_email,
-                subject=subject,
-                body_html=body_html,
-                body_text=body_text,
-                cc=cc,
-                bcc=bcc,
-                attachments=None,
-                sender=self.sender,
-            )
-            logger.debug("Email message created successfully")
+            return self._deliver(parsed, drafted, default_use_html)
 
-            # Execute the requested action
-            if action == "draft":
-                result = self._create_draft(msg, to_email, subject, body_text)
-            else:
-                result = self._send_message(msg, to_email, subject, body_text)
+        except Exception as e:
+            logger.error("EmailAgent failed: %s", e, exc_info=True)
+            return {"ok": False, "error": f"EmailAgent failed: {e}"}
 
-            logger.info("Email operation completed successfully: %s", action)
-            return result
+    async def aprepare(self, prompt: str) -> Dict[str, Any]:
+        """
+        Async LLM half of run(): parse the prompt and draft the content, without
+        touching Gmail. Pair with deliver() so drafts for a whole batch can be
+        generated concurrently while Gmail calls stay sequential.
+        """
+        try:
+            parsed = await aparse_prompt_to_fields(prompt)
+            to_email = (parsed.get("to_email") or "").strip()
+            if not to_email:
+                logger.warning("No recipient email found in prompt")
+                return {
+                    "ok": False, 
+                    "error": "No recipient email found in the prompt.", 
+                    "parsed": parsed
+                }
+
+            instruction = parsed.get("notes") or prompt
+            drafted = await adraft_email(
+                parsed.get("to_name", ""), 
+                instruction, 
+                parsed.get("tone", "professional, friendly")
+            )
+            return {"ok": True, "parsed": parsed, "drafted": drafted}
 
         except Exception as e:
             logger.error("EmailAgent failed: %s", e, exc_info=True)
             return {"ok": False, "error": f"EmailAgent failed: {e}"}
 
+    def deliver(self, prepared: Dict[str, Any], *, default_use_html: bool = True) -> Dict[str, Any]:
+        """Send or draft a message produced by aprepare()."""
+        if not prepared.get("ok"):
+            return prepared
+        try:
+            return self._deliver(prepared["parsed"], prepared["drafted"], default_use_html)
+        except Exception as e:
+            logger.error("EmailAgent failed: %s", e, exc_info=True)
+            return {"ok": False, "error": f"EmailAgent failed: {e}"}
+
+    def _deliver(self, parsed: Dict[str, Any], drafted: Dict[str, str], default_use_html: bool) -> Dict[str, Any]:
+        to_email = (parsed.get("to_email") or "").strip()
+
+        # Prepare message parameters
+        subject = parsed.get("subject_override") or drafted["subject"]
+        body_html = drafted["html"] if (default_use_html and drafted["html"]) else None
+        body_text = drafted["plain"]
+        cc = parsed.get("cc") or None
+        bcc = parsed.get("bcc") or None
+        action = parsed.get("action", "send")
+        
+        # Validate action
+        if action not in ("send", "draft"):
+            logger.warning("Invalid action '%s', defaulting to 'send'", action)
+            action = "send"
+
+        # Create the email message
+        msg = create_message(
+            to=to_email,
+            subject=subject,
+            body_html=body_html,
+            body_text=body_text,
+            cc=cc,
+            bcc=bcc,
+            attachments=None,
+            sender=self.sender,
+        )
+        logger.debug("Email message created successfully")
+
+        # Execute the requested action
+        if action == "draft":
+            result = self._create_draft(msg, to_email, subject, body_text)
+        else:
+            result = self._send_message(msg, to_email, subject, body_text)
+
+        logger.info("Email operation completed successfully: %s", action)
+        return result
+
     def _create_draft(self, msg: Dict[str, Any], to_email: str, subject: str, body_text: str) -> Dict[str, Any]:
         """Create a draft email."""
         try:
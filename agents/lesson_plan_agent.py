@@ -2,38 +2,673 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import asyncio
+import contextvars
+import functools
+import hashlib
 import json
-import re
-from core.ai_client import chat_completion
-from core.pdf_tool import extract_text_from_pdf
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from core.ai_client import ROUTES, chat_completion, achat_completion, chat_completion_stream, route_model
+from core.chunker import estimate_tokens
+from core.digest import build_digest, abuild_digest
+from core.json_stream import JsonArrayItemStream
+from core.config import (
+    CACHE_DIR,
+    LESSON_PLAN_CACHE_ENABLED,
+    LESSON_PLAN_CACHE_MAX_BYTES,
+    LESSON_PLAN_CACHE_TTL_SECONDS,
+    LESSON_PLAN_COMPACT_OUTPUT,
+    LESSON_PLAN_FANOUT_CONCURRENCY,
+    LESSON_PLAN_FANOUT_MIN_WEEKS,
+    LESSON_PLAN_WEEKS_PER_CALL,
+    PDF_MAX_EXTRACT_TOKENS,
+    REPAIR_ENABLED,
+)
+from core.disk_cache import DiskCache
+from core.pdf_tool import file_sha256, iter_pdf_text
+from core.json_extract import parse_json
 from core.logger import logger
+from core.metrics import llm_agent
+from core.repair import find_fragments, messages_tokens, repair_fragments, salvage
+from core.schemas import coerce_integers, fill_defaults, week_error
+from core.wire_format import LESSON_WEEK_WIRE
+
+# Fields of one weekly_schedule entry; shared by the single-call and the fan-out prompts
+WEEK_FIELDS = (
+    "    week: number,\n"
+    "    topic: string,\n"
+    "    learning_objectives: array of strings,\n"
+    "    vocabulary: array of strings (optional),\n"
+    "    activities: array of objects [{ name, duration_minutes, type }],\n"
+    "    timeline: array of objects [{ time_range, activity, instructor_notes }],\n"
+    "    materials: array of strings,\n"
+    "    differentiation: {\n"
+    "      support_strategies: array of strings,\n"
+    "      challenge_strategies: array of strings,\n"
+    "      accommodations: array of strings (optional)\n"
+    "    },\n"
+    "    assessment: {\n"
+    "      type: string (Formative/Summative/Diagnostic),\n"
+    "      questions_or_tasks: array of strings,\n"
+    "      rubric: object or string,\n"
+    "      duration_minutes: number\n"
+    "    },\n"
+    "    homework: {\n"
+    "      tasks: array of strings,\n"
+    "      estimated_time_minutes: number,\n"
+    "      due_date_offset_days: number\n"
+    "    },\n"
+    "    sections: array of objects [{\n"
+    "      section_number: number,\n"
+    "      title: string,\n"
+    "      activities: array of strings,\n"
+    "      materials: array of strings,\n"
+    "      assessment: string\n"
+    "    }] (length exactly sections_per_week)\n"
+)
+WEEKLY_SCHEDULE_SPEC = "- weekly_schedule (array of week objects): [{\n" + WEEK_FIELDS + "  }]\n"
+# Compact output mode (LESSON_PLAN_COMPACT_OUTPUT): the same fields, written with the short keys
+# of core.wire_format.LESSON_WEEK_WIRE and expanded again after parsing
+COMPACT_WEEK_KEYS = (
+    "  Write every week object in compact form, using these compact week keys instead of the field names "
+    "(arrays of values in the order shown instead of objects where noted):\n" + LESSON_WEEK_WIRE.legend()
+)
+# Fan-out skeleton: the same plan keys, with a short outline in place of the detailed weeks
+WEEK_OUTLINE_SPEC = (
+    "- week_outline (array with exactly one entry per week): [{\n"
+    "    week: number,\n"
+    "    topic: string,\n"
+    "    focus: string (one sentence: what this week builds on and leads to)\n"
+    "  }]\n"
+)
+
+# Bump whenever the lesson plan prompts or the plan post-processing change,
+# so plans cached by generate_plan are not reused
+LESSON_PLAN_PROMPT_VERSION = "4"
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def _plan_cache() -> DiskCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache(
+                    os.path.join(CACHE_DIR, "lesson_plans.sqlite"),
+                    max_bytes=LESSON_PLAN_CACHE_MAX_BYTES,
+                    default_ttl=LESSON_PLAN_CACHE_TTL_SECONDS,
+                )
+    return _cache
+
+
+def _cached_plan(key: str) -> Optional[dict]:
+    raw = _plan_cache().get(key)
+    if raw is None:
+        return None
+    try:
+        entry = json.loads(raw)
+    except ValueError:
+        return None
+    plan = entry["plan"]
+    # Entries written before _remember_plan dropped it; the repairs belong to the original run
+    plan.pop("_repair", None)
+    plan["_cache"] = {"hit": True, "cached_at": entry["cached_at"]}
+    logger.info("Lesson plan served from the result cache (%s)", key[:12])
+    return plan
+
+
+def _remember_plan(key: Optional[str], plan):
+    """Store a successful plan under key and mark it as freshly generated."""
+    if not isinstance(plan, dict) or plan.get("error"):
+        return plan
+    if key:
+        cached_at = datetime.now(timezone.utc).isoformat()
+        try:
+            # The repair report describes this run only, not later cache hits
+            stored = {k: v for k, v in plan.items() if k != "_repair"}
+            _plan_cache().set(key, json.dumps({"plan": stored, "cached_at": cached_at}, ensure_ascii=False).encode("utf-8"))
+        except (TypeError, ValueError) as e:
+            logger.warning("Lesson plan not cached: %s", e)
+    plan["_cache"] = {"hit": False}
+    return plan
+
+
+def week_index(plan: dict, week) -> Optional[int]:
+    """Position of week number `week` in plan["weekly_schedule"], or None."""
+    schedule = plan.get("weekly_schedule") if isinstance(plan, dict) else None
+    for i, entry in enumerate(schedule if isinstance(schedule, list) else []):
+        try:
+            if isinstance(entry, dict) and int(entry.get("week")) == int(week):
+                return i
+        except (TypeError, ValueError):
+            continue
+    return None
+
 
 class LessonPlanAgent:
-    def __init__(self, model="openai/gpt-5-chat-latest"):
+    def __init__(self, model=None, compact_output: Optional[bool] = None):
+        # None follows the "lesson_plan" route in core.ai_client; a model name pins it
         self.model = model
+        self.compact_output = LESSON_PLAN_COMPACT_OUTPUT if compact_output is None else compact_output
+
+    @llm_agent("lesson_plan")
+    def generate_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week, force: bool = False) -> dict:
+        """
+        Full plan as a dict. A plan generated before for the same PDF(s) and options
+        is returned from the result cache (plan["_cache"]["hit"] is True) unless force.
+        """
+        key = self._plan_cache_key(inputs, study_duration_weeks, num_students, sections_per_week)
+        if key and not force:
+            cached = _cached_plan(key)
+            if cached is not None:
+                return cached
+        # force also skips the LLM response cache, so every call asks the model again
+        plan = self._generate_plan(inputs, study_duration_weeks, num_students, sections_per_week, use_cache=not force)
+        return _remember_plan(key, plan)
 
-    def generate_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week) -> dict:
+    def _generate_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week,
+                       use_cache: bool = True) -> dict:
         try:
             logger.info("LessonPlanAgent started with inputs: %s", inputs)
-            combined_text = ""
-
-            if "course_outline" in inputs:
-                text = extract_text_from_pdf(inputs["course_outline"])
-                logger.info("Extracted course outline: %s (length=%d)",
-                            inputs["course_outline"], len(text))
-                combined_text += text + "\n"
-                
-            if "lecture_notes" in inputs:
-                text = extract_text_from_pdf(inputs["lecture_notes"])
-                logger.info("Extracted lecture notes: %s (length=%d)",
-                            inputs["lecture_notes"], len(text))
-                combined_text += text + "\n"
+            combined_text = self._collect_text(inputs)
+            if not combined_text.strip():
+                logger.warning("No valid text extracted from provided PDFs")
+                return {"error": "No valid text extracted from provided PDFs."}
+            model, max_tokens = route_model("lesson_plan", self.model)
+            combined_text = build_digest(combined_text, model)
 
+            if self._use_fanout(study_duration_weeks):
+                skeleton = self._skeleton(combined_text, study_duration_weeks, num_students, sections_per_week, use_cache)
+                if skeleton is not None:
+                    plan = None
+                    for event, data in self._iter_fanout(combined_text, skeleton, study_duration_weeks, num_students,
+                                                         sections_per_week, use_cache):
+                        if event == "plan":
+                            plan = data
+                    return plan
+
+            messages = self._build_messages(combined_text, study_duration_weeks, num_students, sections_per_week)
+            raw = chat_completion(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                use_cache=use_cache,
+                cache_if=functools.partial(self._plan_complete, sections_per_week=sections_per_week)
+            )
+            return self._parse_plan(raw, study_duration_weeks, num_students, sections_per_week, messages, use_cache)
+
+        except Exception as e:
+            logger.error("LessonPlanAgent failed: %s", e, exc_info=True)
+            return {"error": f"LessonPlanAgent failed: {e}"}
+
+    @llm_agent("lesson_plan")
+    async def agenerate_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week, force: bool = False) -> dict:
+        """Async variant of generate_plan; PDF extraction runs in a worker thread."""
+        key = await asyncio.to_thread(self._plan_cache_key, inputs, study_duration_weeks, num_students, sections_per_week)
+        if key and not force:
+            cached = await asyncio.to_thread(_cached_plan, key)
+            if cached is not None:
+                return cached
+        plan = await self._agenerate_plan(inputs, study_duration_weeks, num_students, sections_per_week, use_cache=not force)
+        return await asyncio.to_thread(_remember_plan, key, plan)
+
+    async def _agenerate_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week,
+                              use_cache: bool = True) -> dict:
+        try:
+            logger.info("LessonPlanAgent (async) started with inputs: %s", inputs)
+            combined_text = await asyncio.to_thread(self._collect_text, inputs)
             if not combined_text.strip():
                 logger.warning("No valid text extracted from provided PDFs")
                 return {"error": "No valid text extracted from provided PDFs."}
+            model, max_tokens = route_model("lesson_plan", self.model)
+            combined_text = await abuild_digest(combined_text, model)
+
+            if self._use_fanout(study_duration_weeks):
+                skeleton = await self._askeleton(combined_text, study_duration_weeks, num_students, sections_per_week, use_cache)
+                if skeleton is not None:
+                    return await self._afanout(combined_text, skeleton, study_duration_weeks, num_students,
+                                               sections_per_week, use_cache)
+
+            messages = self._build_messages(combined_text, study_duration_weeks, num_students, sections_per_week)
+            raw = await achat_completion(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                use_cache=use_cache,
+                cache_if=functools.partial(self._plan_complete, sections_per_week=sections_per_week)
+            )
+            # Repair calls (if any) are blocking
+            return await asyncio.to_thread(
+                self._parse_plan, raw, study_duration_weeks, num_students, sections_per_week, messages, use_cache
+            )
+
+        except Exception as e:
+            logger.error("LessonPlanAgent failed: %s", e, exc_info=True)
+            return {"error": f"LessonPlanAgent failed: {e}"}
+
+    @llm_agent("lesson_plan")
+    def stream_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week, force: bool = False):
+        """
+        Streaming variant of generate_plan. Yields (event, data) tuples:
+        ("week", entry) for each weekly_schedule entry as soon as it is complete,
+        then ("plan", plan_dict) with the full parsed plan (or an {"error": ...} dict).
+        A cached plan is replayed the same way.
+        """
+        key = self._plan_cache_key(inputs, study_duration_weeks, num_students, sections_per_week)
+        if key and not force:
+            cached = _cached_plan(key)
+            if cached is not None:
+                for entry in cached.get("weekly_schedule") or []:
+                    yield "week", entry
+                yield "plan", cached
+                return
+        for event, data in self._stream_plan(inputs, study_duration_weeks, num_students, sections_per_week, use_cache=not force):
+            if event == "plan":
+                data = _remember_plan(key, data)
+            yield event, data
+
+    def _stream_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week, use_cache: bool = True):
+        try:
+            logger.info("LessonPlanAgent (stream) started with inputs: %s", inputs)
+            combined_text = self._collect_text(inputs)
+            if not combined_text.strip():
+                logger.warning("No valid text extracted from provided PDFs")
+                yield "plan", {"error": "No valid text extracted from provided PDFs."}
+                return
+            model, max_tokens = route_model("lesson_plan", self.model)
+            combined_text = build_digest(combined_text, model)
+
+            if self._use_fanout(study_duration_weeks):
+                skeleton = self._skeleton(combined_text, study_duration_weeks, num_students, sections_per_week, use_cache)
+                if skeleton is not None:
+                    yield from self._iter_fanout(combined_text, skeleton, study_duration_weeks, num_students,
+                                                 sections_per_week, use_cache)
+                    return
+
+            weeks = JsonArrayItemStream("weekly_schedule")
+            parts = []
+            messages = self._build_messages(combined_text, study_duration_weeks, num_students, sections_per_week)
+            for delta in chat_completion_stream(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                use_cache=use_cache,
+                cache_if=functools.partial(self._plan_complete, sections_per_week=sections_per_week)
+            ):
+                parts.append(delta)
+                for entry in weeks.feed(delta):
+                    yield "week", self._expand_week(entry)
+
+            yield "plan", self._parse_plan("".join(parts), study_duration_weeks, num_students, sections_per_week,
+                                           messages, use_cache)
+
+        except Exception as e:
+            logger.error("LessonPlanAgent failed: %s", e, exc_info=True)
+            yield "plan", {"error": f"LessonPlanAgent failed: {e}"}
 
-            system_prompt = (
+    def cached_plan(self, inputs: dict, study_duration_weeks, num_students, sections_per_week) -> Optional[dict]:
+        """The result-cache entry generate_plan would return for these inputs, or None."""
+        key = self._plan_cache_key(inputs, study_duration_weeks, num_students, sections_per_week)
+        return _cached_plan(key) if key else None
+
+    def _plan_cache_key(self, inputs: dict, study_duration_weeks, num_students, sections_per_week) -> Optional[str]:
+        """Result-cache key: PDF content hashes, options, model and prompt version."""
+        if not LESSON_PLAN_CACHE_ENABLED:
+            return None
+        docs = {}
+        for name in ("course_outline", "lecture_notes"):
+            if name in inputs:
+                try:
+                    docs[name] = file_sha256(inputs[name])
+                except OSError:
+                    return None
+        if not docs:
+            return None
+        fanout = self._use_fanout(study_duration_weeks)
+        key = {
+            "docs": docs,
+            "weeks": study_duration_weeks,
+            "students": num_students,
+            "sections": sections_per_week,
+            # An unpinned agent follows the route; key on its primary model
+            "model": self.model or f"route:{ROUTES.get('lesson_plan', {}).get('model')}",
+            "prompt": LESSON_PLAN_PROMPT_VERSION,
+            "fanout": LESSON_PLAN_WEEKS_PER_CALL if fanout else 0,
+        }
+        if self.compact_output:
+            key["wire"] = "compact"
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    # --- Two-phase generation for long courses -------------------------------------------
+    # A short skeleton call fixes the plan-level fields and a topic per week; week ranges are
+    # then written concurrently with the skeleton as shared context and stitched back together.
+
+    def _use_fanout(self, study_duration_weeks) -> bool:
+        try:
+            weeks = int(study_duration_weeks)
+        except (TypeError, ValueError):
+            return False
+        return LESSON_PLAN_FANOUT_MIN_WEEKS > 0 and weeks >= LESSON_PLAN_FANOUT_MIN_WEEKS
+
+    def _week_ranges(self, study_duration_weeks) -> List[Tuple[int, int]]:
+        weeks = int(study_duration_weeks)
+        size = max(1, LESSON_PLAN_WEEKS_PER_CALL)
+        return [(first, min(first + size - 1, weeks)) for first in range(1, weeks + 1, size)]
+
+    def _build_skeleton_messages(self, combined_text: str, study_duration_weeks, num_students, sections_per_week) -> list:
+        # The outline is never compact, so the compact week legend goes along with the weekly_schedule spec
+        system_prompt = self._system_prompt(study_duration_weeks, num_students, sections_per_week).replace(
+            WEEKLY_SCHEDULE_SPEC + (COMPACT_WEEK_KEYS if self.compact_output else ""), WEEK_OUTLINE_SPEC
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": combined_text},
+            {"role": "user", "content": (
+                f"Return the plan-level fields and a week_outline with exactly {study_duration_weeks} entries. "
+                "Do not write the detailed weekly_schedule; it is generated separately."
+            )},
+        ]
+
+    def _build_range_messages(self, combined_text: str, skeleton: dict, first: int, last: int,
+                              num_students, sections_per_week) -> list:
+        # Identical system prompt, material and outline for every range; only the last message differs
+        system_prompt = (
+            "You are an expert CurriculumArchitect agent writing part of the weekly schedule of a lesson plan "
+            "whose outline is already fixed.\n\n"
+            "Respond ONLY in valid JSON: an object with a single key weekly_schedule, "
+            "an array of week objects: [{\n" + WEEK_FIELDS + "}]\n"
+            + (COMPACT_WEEK_KEYS if self.compact_output else "") + "\n"
+            "CONSTRAINTS:\n"
+            "- Follow the week numbers and topics of the course outline exactly\n"
+            f"- Each week must have exactly {sections_per_week} sections\n"
+            f"- Class size: {num_students} students\n"
+            "- Build on earlier weeks and prepare later ones, as described in the outline\n"
+            "- Use ONLY double quotes for strings\n"
+            "- Do NOT include prose, explanations, code fences, or markdown\n"
+        )
+        outline = {
+            "title": skeleton.get("title"),
+            "teaching_approach": skeleton.get("teaching_approach"),
+            "learning_objectives": skeleton.get("learning_objectives"),
+            "core_topics": (skeleton.get("key_concepts") or {}).get("core_topics"),
+            "week_outline": skeleton.get("week_outline"),
+        }
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": combined_text},
+            {"role": "user", "content": "Course outline:\n" + json.dumps(outline, ensure_ascii=False)},
+            {"role": "user", "content": f"Write weeks {first} to {last} only ({last - first + 1} week objects)."},
+        ]
+
+    def _parse_skeleton(self, raw: str, study_duration_weeks) -> Optional[dict]:
+        parsed = parse_json(raw)
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("week_outline"), list) or not parsed["week_outline"]:
+            logger.warning("Lesson plan skeleton unusable; falling back to a single call. Raw: %s", raw)
+            return None
+        outline = {}
+        for entry in parsed["week_outline"]:
+            if isinstance(entry, dict):
+                try:
+                    outline[int(entry.get("week"))] = entry
+                except (TypeError, ValueError):
+                    continue
+        parsed["week_outline"] = [
+            outline.get(w) or {"week": w, "topic": f"Week {w}"} for w in range(1, int(study_duration_weeks) + 1)
+        ]
+        return parsed
+
+    def _parse_range(self, raw: str, first: int, last: int) -> Optional[list]:
+        parsed = parse_json(raw)
+        entries = parsed.get("weekly_schedule") if isinstance(parsed, dict) else None
+        if not isinstance(entries, list):
+            return None
+        by_week = {}
+        for i, entry in enumerate(self._expand_week(e) for e in entries if isinstance(e, dict)):
+            try:
+                week = int(entry.get("week"))
+            except (TypeError, ValueError):
+                week = first + i
+            if first <= week <= last:
+                entry["week"] = week
+                by_week.setdefault(week, entry)
+        return [by_week[w] for w in sorted(by_week)] if by_week else None
+
+    def _skeleton_complete(self, raw: str) -> bool:
+        """cache_if for skeleton calls: a JSON object with a non-empty week_outline."""
+        parsed = parse_json(raw)
+        return isinstance(parsed, dict) and isinstance(parsed.get("week_outline"), list) and bool(parsed["week_outline"])
+
+    def _range_complete(self, raw: str, first: int, last: int) -> bool:
+        """cache_if for range calls: every week from first to last came back."""
+        return len(self._parse_range(raw, first, last) or []) == last - first + 1
+
+    def _fill_range(self, entries: Optional[list], skeleton: dict, first: int, last: int) -> list:
+        # Weeks the range call did not deliver keep their outline topic so the plan stays complete
+        have = {e["week"]: e for e in entries or []}
+        filled = []
+        for w in range(first, last + 1):
+            if w in have:
+                filled.append(have[w])
+            else:
+                o = skeleton["week_outline"][w - 1]
+                filled.append({"week": w, "topic": o.get("topic", f"Week {w}"),
+                               "learning_objectives": [o["focus"]] if o.get("focus") else []})
+        return filled
+
+    def _stitch(self, skeleton: dict, weeks: list, study_duration_weeks, num_students, sections_per_week) -> dict:
+        plan = {k: v for k, v in skeleton.items() if k != "week_outline"}
+        plan["weekly_schedule"] = sorted(weeks, key=lambda e: e["week"])
+        return self._finalize_plan(plan, study_duration_weeks, num_students, sections_per_week)
+
+    def _skeleton(self, combined_text: str, study_duration_weeks, num_students, sections_per_week,
+                  use_cache: bool = True) -> Optional[dict]:
+        model, max_tokens = route_model("lesson_plan_skeleton", self.model)
+        raw = chat_completion(
+            model=model,
+            messages=self._build_skeleton_messages(combined_text, study_duration_weeks, num_students, sections_per_week),
+            temperature=0.4,
+            max_tokens=max_tokens,
+            use_cache=use_cache,
+            cache_if=self._skeleton_complete
+        )
+        return self._parse_skeleton(raw, study_duration_weeks)
+
+    async def _askeleton(self, combined_text: str, study_duration_weeks, num_students, sections_per_week,
+                         use_cache: bool = True) -> Optional[dict]:
+        model, max_tokens = route_model("lesson_plan_skeleton", self.model)
+        raw = await achat_completion(
+            model=model,
+            messages=self._build_skeleton_messages(combined_text, study_duration_weeks, num_students, sections_per_week),
+            temperature=0.4,
+            max_tokens=max_tokens,
+            use_cache=use_cache,
+            cache_if=self._skeleton_complete
+        )
+        return self._parse_skeleton(raw, study_duration_weeks)
+
+    def _range_weeks(self, combined_text: str, skeleton: dict, first: int, last: int,
+                     num_students, sections_per_week, use_cache: bool = True) -> list:
+        model, max_tokens = route_model("lesson_plan_weeks", self.model)
+        entries = None
+        try:
+            raw = chat_completion(
+                model=model,
+                messages=self._build_range_messages(combined_text, skeleton, first, last, num_students, sections_per_week),
+                temperature=0.4,
+                max_tokens=max_tokens,
+                use_cache=use_cache,
+                cache_if=functools.partial(self._range_complete, first=first, last=last)
+            )
+            entries = self._parse_range(raw, first, last)
+        except Exception as e:
+            logger.warning("Weeks %d-%d failed: %s", first, last, e)
+        if entries is None:
+            logger.warning("Weeks %d-%d unusable; keeping their outline only", first, last)
+        return self._fill_range(entries, skeleton, first, last)
+
+    async def _arange_weeks(self, combined_text: str, skeleton: dict, first: int, last: int,
+                            num_students, sections_per_week, sem: asyncio.Semaphore, use_cache: bool = True) -> list:
+        model, max_tokens = route_model("lesson_plan_weeks", self.model)
+        entries = None
+        async with sem:
+            try:
+                raw = await achat_completion(
+                    model=model,
+                    messages=self._build_range_messages(combined_text, skeleton, first, last, num_students, sections_per_week),
+                    temperature=0.4,
+                    max_tokens=max_tokens,
+                    use_cache=use_cache,
+                    cache_if=functools.partial(self._range_complete, first=first, last=last)
+                )
+                entries = self._parse_range(raw, first, last)
+            except Exception as e:
+                logger.warning("Weeks %d-%d failed: %s", first, last, e)
+        if entries is None:
+            logger.warning("Weeks %d-%d unusable; keeping their outline only", first, last)
+        return self._fill_range(entries, skeleton, first, last)
+
+    def _iter_fanout(self, combined_text: str, skeleton: dict, study_duration_weeks, num_students, sections_per_week,
+                     use_cache: bool = True):
+        """Yields ("week", entry) in week order as ranges complete, then ("plan", plan)."""
+        ranges = self._week_ranges(study_duration_weeks)
+        started = time.perf_counter()
+        weeks: list = []
+        with ThreadPoolExecutor(max_workers=max(1, min(LESSON_PLAN_FANOUT_CONCURRENCY, len(ranges)))) as pool:
+            # copy_context keeps the @llm_agent attribution inside the pool threads
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._range_weeks,
+                            combined_text, skeleton, first, last, num_students, sections_per_week, use_cache)
+                for first, last in ranges
+            ]
+            for fut in futures:
+                for entry in fut.result():
+                    weeks.append(entry)
+                    yield "week", entry
+        logger.info("Lesson plan fan-out: %d weeks in %d ranges, %.1fs after the skeleton",
+                    len(weeks), len(ranges), time.perf_counter() - started)
+        yield "plan", self._stitch(skeleton, weeks, study_duration_weeks, num_students, sections_per_week)
+
+    async def _afanout(self, combined_text: str, skeleton: dict, study_duration_weeks, num_students, sections_per_week,
+                       use_cache: bool = True) -> dict:
+        ranges = self._week_ranges(study_duration_weeks)
+        sem = asyncio.Semaphore(max(1, LESSON_PLAN_FANOUT_CONCURRENCY))
+        started = time.perf_counter()
+        parts = await asyncio.gather(*(
+            self._arange_weeks(combined_text, skeleton, first, last, num_students, sections_per_week, sem, use_cache)
+            for first, last in ranges
+        ))
+        weeks = [entry for part in parts for entry in part]
+        logger.info("Lesson plan fan-out: %d weeks in %d ranges, %.1fs after the skeleton",
+                    len(weeks), len(ranges), time.perf_counter() - started)
+        return self._stitch(skeleton, weeks, study_duration_weeks, num_students, sections_per_week)
+
+    # --- Single-week regeneration of a saved plan ------------------------------------------
+    # The stored plan stands in for the course material: the model gets the plan's outline and
+    # the current version of the week, so one week costs a small fraction of a full generation.
+
+    @llm_agent("lesson_plan")
+    def regenerate_week(self, plan: dict, week: int, instructions: str = "") -> dict:
+        """
+        A new weekly_schedule entry for week number `week` of plan, or an {"error": ...}
+        dict. The plan itself is not modified; the caller splices the entry in.
+        """
+        index = week_index(plan, week)
+        if index is None:
+            return {"error": f"Week {week} is not in the lesson plan."}
+        current = plan["weekly_schedule"][index]
+        sections_per_week = plan.get("sections_per_week") or len(current.get("sections") or []) or 1
+        model, max_tokens = route_model("lesson_plan_weeks", self.model)
+        try:
+            raw = chat_completion(
+                model=model,
+                messages=self._build_week_messages(plan, current, int(week), sections_per_week, instructions),
+                temperature=0.4,
+                max_tokens=max_tokens,
+                # Asking again must give a new version, not the cached previous answer
+                use_cache=False
+            )
+        except Exception as e:
+            logger.error("LessonPlanAgent week %s regeneration failed: %s", week, e, exc_info=True)
+            return {"error": f"LessonPlanAgent failed: {e}"}
+
+        entries = self._parse_range(raw, int(week), int(week))
+        if not entries:
+            return {"error": f"Model did not return week {week}.", "raw": raw}
+        problem = self._week_problem(entries[0], 0, sections_per_week)
+        if problem:
+            return {"error": f"Regenerated week {week} is invalid: {problem}", "raw": raw}
+        logger.info("LessonPlanAgent regenerated week %s", week)
+        return entries[0]
+
+    def _build_week_messages(self, plan: dict, current: dict, week: int, sections_per_week, instructions: str) -> list:
+        system_prompt = (
+            "You are an expert CurriculumArchitect agent rewriting one week of an existing lesson plan.\n\n"
+            "Respond ONLY in valid JSON: an object with a single key weekly_schedule, "
+            "an array with exactly one week object: [{\n" + WEEK_FIELDS + "}]\n"
+            + (COMPACT_WEEK_KEYS if self.compact_output else "") + "\n"
+            "CONSTRAINTS:\n"
+            f"- Keep week number {week} and its place in the course outline\n"
+            f"- The week must have exactly {sections_per_week} sections\n"
+            f"- Class size: {plan.get('class_size')} students\n"
+            "- Improve on the current version of the week; follow the teacher's instructions if given\n"
+            "- Use ONLY double quotes for strings\n"
+            "- Do NOT include prose, explanations, code fences, or markdown\n"
+        )
+        outline = {
+            "title": plan.get("title"),
+            "teaching_approach": plan.get("teaching_approach"),
+            "learning_objectives": plan.get("learning_objectives"),
+            "core_topics": (plan.get("key_concepts") or {}).get("core_topics"),
+            "week_outline": [
+                {"week": e.get("week"), "topic": e.get("topic")}
+                for e in plan.get("weekly_schedule") or [] if isinstance(e, dict)
+            ],
+        }
+        shown = LESSON_WEEK_WIRE.compact(current) if self.compact_output else current
+        request = f"Rewrite week {week} only (1 week object)."
+        if instructions:
+            request += "\nTeacher's instructions: " + instructions
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "Course outline:\n" + json.dumps(outline, ensure_ascii=False)},
+            {"role": "user", "content": f"Current version of week {week}:\n" + json.dumps(shown, ensure_ascii=False)},
+            {"role": "user", "content": request},
+        ]
+
+    def _collect_text(self, inputs: dict) -> str:
+        combined_text = ""
+
+        if "course_outline" in inputs:
+            text = " ".join(iter_pdf_text(inputs["course_outline"], max_tokens=PDF_MAX_EXTRACT_TOKENS))
+            logger.info("Extracted course outline: %s (length=%d)",
+                        inputs["course_outline"], len(text))
+            combined_text += text + "\n"
+            
+        if "lecture_notes" in inputs:
+            text = " ".join(iter_pdf_text(inputs["lecture_notes"], max_tokens=PDF_MAX_EXTRACT_TOKENS))
+            logger.info("Extracted lecture notes: %s (length=%d)",
+                        inputs["lecture_notes"], len(text))
+            combined_text += text + "\n"
+
+        return combined_text
+
+    def _build_messages(self, combined_text: str, study_duration_weeks, num_students, sections_per_week) -> list:
+        return [
+            {"role": "system", "content": self._system_prompt(study_duration_weeks, num_students, sections_per_week)},
+            {"role": "user", "content": combined_text}
+        ]
+
+    def _system_prompt(self, study_duration_weeks, num_students, sections_per_week) -> str:
+        return (
     "You are an expert CurriculumArchitect agent. You have just completed detailed lesson planning. "
     "Now structure your comprehensive lesson plan into a standardized JSON format for storage and rendering.\n\n"
     
@@ -83,38 +718,7 @@ class LessonPlanAgent:
     "    page_reference: string (optional)\n"
     "  }]\n"
     
-    "- weekly_schedule (array of week objects): [{\n"
-    "    week: number,\n"
-    "    topic: string,\n"
-    "    learning_objectives: array of strings,\n"
-    "    vocabulary: array of strings (optional),\n"
-    "    activities: array of objects [{ name, duration_minutes, type }],\n"
-    "    timeline: array of objects [{ time_range, activity, instructor_notes }],\n"
-    "    materials: array of strings,\n"
-    "    differentiation: {\n"
-    "      support_strategies: array of strings,\n"
-    "      challenge_strategies: array of strings,\n"
-    "      accommodations: array of strings (optional)\n"
-    "    },\n"
-    "    assessment: {\n"
-    "      type: string (Formative/Summative/Diagnostic),\n"
-    "      questions_or_tasks: array of strings,\n"
-    "      rubric: object or string,\n"
-    "      duration_minutes: number\n"
-    "    },\n"
-    "    homework: {\n"
-    "      tasks: array of strings,\n"
-    "      estimated_time_minutes: number,\n"
-    "      due_date_offset_days: number\n"
-    "    },\n"
-    "    sections: array of objects [{\n"
-    "      section_number: number,\n"
-    "      title: string,\n"
-    "      activities: array of strings,\n"
-    "      materials: array of strings,\n"
-    "      assessment: string\n"
-    "    }] (length exactly sections_per_week)\n"
-    "  }]\n"
+    + WEEKLY_SCHEDULE_SPEC + (COMPACT_WEEK_KEYS if self.compact_output else "") +
     
     "- supplementary_resources (array of objects): [{\n"
     "    title: string,\n"
@@ -144,60 +748,89 @@ class LessonPlanAgent:
     "- Return ONLY a single valid JSON object\n"
 )
 
-            raw = chat_completion(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": combined_text}
-                ],
-                temperature=0.4,
-                max_tokens=8000
-            )
+    def _parse_plan(self, raw: str, study_duration_weeks, num_students, sections_per_week, messages=None,
+                    use_cache: bool = True) -> dict:
+        """
+        Parse the single-call plan. With the prompt messages, broken or incomplete
+        weeks are repaired one by one (core.repair) instead of failing the plan.
+        """
+        parsed = parse_json(raw)
+        broken = None
+        if not isinstance(parsed, dict) and messages and REPAIR_ENABLED:
+            salvaged = salvage(raw, "weekly_schedule", parse_json)
+            if salvaged is not None:
+                parsed, broken = salvaged
+        if parsed is None:
+            return {"error": "Model did not return valid JSON.", "raw": raw}
 
-            # Parse strictly first, then sanitize if needed
-            parsed = None
-            try:
-                parsed = json.loads(raw)
-            except json.JSONDecodeError:
-                fence = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", raw)
-                candidate = fence.group(1) if fence else None
-                if not candidate:
-                    s = raw.find('{')
-                    e = raw.rfind('}')
-                    if s != -1 and e != -1 and e > s:
-                        candidate = raw[s:e+1]
-                if candidate:
-                    norm = candidate
-                    norm = norm.replace('\u201c', '"').replace('\u201d', '"').replace('\u2019', "'")
-                    norm = re.sub(r",\s*([}\]])", r"\1", norm)
-                    try:
-                        parsed = json.loads(norm)
-                    except json.JSONDecodeError:
-                        logger.error("Sanitized JSON still invalid. Raw: %s", raw)
-                        return {"error": "Model did not return valid JSON.", "raw": raw}
-                else:
-                    logger.error("No JSON object could be extracted. Raw: %s", raw)
-                    return {"error": "Model did not return valid JSON.", "raw": raw}
-
-            if not isinstance(parsed, dict):
-                logger.error("Parsed JSON is not an object. Parsed: %s", parsed)
-                return {"error": "Model did not return a JSON object.", "raw": raw}
-
-            # Ensure expected keys with defaults
-            parsed.setdefault("title", "Lesson Plan")
-            parsed.setdefault("total_duration", study_duration_weeks)
-            parsed.setdefault("class_size", num_students)
-            parsed.setdefault("sections_per_week", sections_per_week)
-            parsed.setdefault("weekly_schedule", [])
-            parsed.setdefault("external_resources", [])
-
-            logger.info(
-                "LessonPlanAgent successfully generated lesson plan (weeks=%s, sections_per_week=%s)",
-                parsed.get("total_duration"), parsed.get("sections_per_week")
-            )
-            return parsed
+        if not isinstance(parsed, dict):
+            logger.error("Parsed JSON is not an object. Parsed: %s", parsed)
+            return {"error": "Model did not return a JSON object.", "raw": raw}
 
-        except Exception as e:
-            logger.error("LessonPlanAgent failed: %s", e, exc_info=True)
-            return {"error": f"LessonPlanAgent failed: {e}"}
+        if self.compact_output and isinstance(parsed.get("weekly_schedule"), list):
+            parsed["weekly_schedule"] = [self._expand_week(e) for e in parsed["weekly_schedule"]]
+
+        if messages and REPAIR_ENABLED and isinstance(parsed.get("weekly_schedule"), list):
+            check = functools.partial(self._week_problem, sections_per_week=sections_per_week)
+            fragments = find_fragments(parsed, "weekly_schedule", check, broken)
+            if fragments:
+                parsed["_repair"] = repair_fragments(
+                    parsed, "weekly_schedule", fragments, "{\n" + WEEK_FIELDS + "}",
+                    functools.partial(self._repair_call, use_cache=use_cache),
+                    self._parse_week, check,
+                    full_retry_tokens=messages_tokens(messages) + estimate_tokens(raw),
+                    context=(
+                        f"The plan covers {study_duration_weeks} weeks for {num_students} students "
+                        f"with {sections_per_week} section(s) per week."
+                        + ("\nThe item may use compact week keys:\n" + LESSON_WEEK_WIRE.legend() if self.compact_output else "")
+                    ),
+                )
+        return self._finalize_plan(parsed, study_duration_weeks, num_students, sections_per_week)
+
+    def _plan_complete(self, raw: str, sections_per_week) -> bool:
+        """cache_if for single-call plans: a JSON object whose weeks all pass the lesson_week schema."""
+        parsed = parse_json(raw)
+        weeks = parsed.get("weekly_schedule") if isinstance(parsed, dict) else None
+        return bool(weeks) and all(
+            self._week_problem(self._expand_week(e), i, sections_per_week) is None for i, e in enumerate(weeks)
+        )
+
+    def _expand_week(self, entry):
+        """A weekly_schedule entry in full form; compact entries (core.wire_format) are expanded."""
+        return LESSON_WEEK_WIRE.expand(entry) if self.compact_output else entry
+
+    def _parse_week(self, raw: str):
+        return self._expand_week(parse_json(raw))
+
+    def _week_problem(self, entry, index, sections_per_week) -> Optional[str]:
+        """What makes a weekly_schedule entry unusable (per the lesson_week schema), or None."""
+        err = week_error(entry, sections_per_week)
+        return err.describe() if err else None
+
+    def _repair_call(self, messages: list, use_cache: bool = True) -> str:
+        model, max_tokens = route_model("json_repair", self.model)
+        return chat_completion(
+            model=model,
+            messages=messages,
+            temperature=0,
+            max_tokens=max_tokens,
+            use_cache=use_cache,
+            cache_if=lambda raw: parse_json(raw) is not None
+        )
+
+    def _finalize_plan(self, parsed: dict, study_duration_weeks, num_students, sections_per_week) -> dict:
+        # Ensure expected keys with defaults (core.schemas lesson_plan)
+        fill_defaults(
+            "lesson_plan", parsed,
+            total_duration=study_duration_weeks,
+            class_size=num_students,
+            sections_per_week=sections_per_week,
+        )
+        # Models sometimes write the totals as text ("16 weeks")
+        coerce_integers("lesson_plan", parsed)
 
+        logger.info(
+            "LessonPlanAgent successfully generated lesson plan (weeks=%s, sections_per_week=%s)",
+            parsed.get("total_duration"), parsed.get("sections_per_week")
+        )
+        return parsed
@@ -8,6 +8,7 @@ import uuid
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from core.logger import logger
+from core.schemas import is_valid
 
 
 def validate_json_schema(output_str: Any, schema_keys: List[str]) -> Tuple[bool, Optional[Dict[str, Any]]]:
@@ -43,7 +44,7 @@ class Orchestrator:
     - HIL: pause at checkpoints for approval
     """
 
-    def __init__(self, model: str = "openai/gpt-5-chat-latest", max_retries: int = 2):
+    def __init__(self, model: Optional[str] = None, max_retries: int = 2):
         self.model = model
         self.max_retries = max_retries
         self.tools: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
@@ -141,20 +142,15 @@ class Orchestrator:
                 return email_agent.run(prompt)
             return {"ok": False, "error": "Email agent unavailable"}
 
-        # Validators
+        # Validators (document shapes live in core.schemas)
         def v_lp(plan: Any) -> bool:
-            if not isinstance(plan, dict):
-                return False
-            weekly = plan.get("weekly_schedule") or plan.get("weekly") or []
-            dw = plan.get("duration_weeks") or plan.get("total_duration")
-            spw = plan.get("sections_per_week")
-            return bool(isinstance(weekly, list) and len(weekly) > 0 and isinstance(spw, int) and isinstance(dw, int))
+            return is_valid("lesson_plan", plan)
 
         def v_md(md: Any) -> bool:
             return isinstance(md, str) and md.strip() != ""
 
         def v_asmt(a: Any) -> bool:
-            return isinstance(a, dict) and isinstance(a.get("questions"), list) and len(a["questions"]) > 0
+            return is_valid("assessment", a) and len(a["questions"]) > 0
 
         def v_form(res: Any) -> bool:
             if not isinstance(res, dict):
@@ -164,16 +160,13 @@ class Orchestrator:
             return bool(res.get("formId") or res.get("formUrl"))
 
         def v_tt(tt: Any) -> bool:
-            if not isinstance(tt, dict):
-                return False
-            slots = tt.get("suggested_slots")
-            return isinstance(slots, list) and all(isinstance(x, dict) and x.get("start") and x.get("end") and x.get("title") for x in slots)
+            return is_valid("timetable", tt)
 
         def v_sched(res: Any) -> bool:
             return isinstance(res, (list, dict))
 
         def v_email_draft(d: Any) -> bool:
-            return isinstance(d, dict) and (d.get("subject") is not None)
+            return is_valid("email_draft", d)
 
         def v_email_send(d: Any) -> bool:
             return isinstance(d, dict) and (d.get("ok") in (True, False))
@@ -289,6 +282,16 @@ class Orchestrator:
                     task["status"] = "succeeded"
                     task["result"] = out
                     job["logs"].append({"ts": int(time.time()), "level": "info", "task_id": tid, "message": "Task succeeded"})
+                    repair = out.get("_repair") if isinstance(out, dict) else None
+                    if repair:
+                        job["logs"].append({
+                            "ts": int(time.time()), "level": "info" if not repair["failed"] else "warning", "task_id": tid,
+                            "message": (
+                                f"Repaired {repair['repaired']}/{repair['fragments']} invalid items "
+                                + (f"instead of regenerating (~{repair['tokens_saved']} tokens saved)" if not repair["failed"]
+                                   else f"(~{repair['tokens_wasted']} repair tokens spent; {repair['failed']} still invalid)")
+                            ),
+                        })
                     completed[tid] = {"result": out}
                     if tid in (job.get("checkpoints") or []):
                         job["state"]["status"] = "paused"
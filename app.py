@@ -4,7 +4,7 @@ load_dotenv()  # Importing ENV file
 import os
 from pathlib import Path
 import token
-from flask import Flask, g
+from flask import Flask, g, request as flask_request
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from datetime import datetime
@@ -27,6 +27,13 @@ def create_app():
     UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "uploads")).resolve()
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
     app.config["UPLOAD_DIR"] = UPLOAD_DIR
+
+    from core.config import UPLOAD_JANITOR_ENABLED
+
+    if UPLOAD_JANITOR_ENABLED:
+        from utils.upload_janitor import start_upload_janitor
+
+        start_upload_janitor(UPLOAD_DIR)
     
     app.template_filter("remove_extension")(remove_extension)  # Add this
 
@@ -94,6 +101,16 @@ def create_app():
             print(f"TimeAgo filter error: {e} for timestamp: {timestamp_str}")
             return "Just now"
 
+    @app.after_request
+    def log_llm_usage(response):
+        # g.llm_usage is filled by core.metrics for every LLM call made while handling the request
+        usage = g.get("llm_usage")
+        if usage:
+            from core.logger import logger
+
+            logger.info("LLM usage for %s %s: %s", flask_request.method, flask_request.path, usage)
+        return response
+
     # Register datetime format filter
     try:
         from utils.date_helper import register_jinja_filters
@@ -111,6 +128,7 @@ def create_app():
     from routes.email_routes import email_bp
     from routes.timetable_routes import timetable_bp
     from routes.auth_routes import auth_bp
+    from routes.job_routes import job_bp
 
     app.register_blueprint(main_bp, url_prefix="/")
     app.register_blueprint(assessment_bp, url_prefix="/assessments")
@@ -119,6 +137,15 @@ def create_app():
     app.register_blueprint(email_bp, url_prefix="/email")
     app.register_blueprint(timetable_bp, url_prefix="/timetable")
     app.register_blueprint(auth_bp, url_prefix="/auth")
+    app.register_blueprint(job_bp, url_prefix="/jobs")
+
+    # Generation jobs run on worker threads of this process (handlers register on blueprint import)
+    from core.config import JOBS_ENABLED
+
+    if JOBS_ENABLED:
+        from core.jobs import get_job_queue
+
+        get_job_queue().start(app)
 
     return app
 
@@ -0,0 +1,78 @@
+"""
+End-to-end agent benchmark against the local stub LLM.
+
+Generates N assessments and N email drafts sequentially with the sync API and
+concurrently with the async API, and prints wall time for each.
+
+Usage:
+    python benchmarks/bench_agents.py --n 20 --latency lognormal:0.5,0.4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm_server import start_stub_server
+
+MATERIAL = (
+    "Photosynthesis converts light energy into chemical energy. Chlorophyll absorbs light "
+    "in the blue and red wavelengths. The light-dependent reactions produce ATP and NADPH, "
+    "and the Calvin cycle fixes carbon dioxide into sugars. "
+) * 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=20)
+    parser.add_argument("--latency", default="fixed:0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url, stub = start_stub_server(latency=args.latency, error_rate=args.error_rate)
+    os.environ["AI_ML_BASE_URL"] = base_url
+    os.environ.setdefault("AI_ML_API_KEY", "bench-key")
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+
+    from agents.assessment_agent import AssessmentAgent
+    from core.ai_client import run_async
+    from integrations.email_writer import draft_email, adraft_email
+
+    agent = AssessmentAgent()
+    specs = [{"type": "MCQ", "difficulty": "Medium", "count": 5 + i % 5, "rubric": True} for i in range(args.n)]
+
+    t0 = time.perf_counter()
+    for spec in specs:
+        agent.generate_assessment(MATERIAL, spec)
+    sync_asmt = time.perf_counter() - t0
+
+    async def _assessments():
+        return await asyncio.gather(*(agent.agenerate_assessment(MATERIAL, spec) for spec in specs))
+
+    t0 = time.perf_counter()
+    run_async(_assessments())
+    async_asmt = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for i in range(args.n):
+        draft_email(f"Student {i}", "Quiz on Friday covering chapter 3")
+    sync_email = time.perf_counter() - t0
+
+    async def _emails():
+        return await asyncio.gather(*(adraft_email(f"Student {i}", "Quiz on Friday covering chapter 3") for i in range(args.n)))
+
+    t0 = time.perf_counter()
+    run_async(_emails())
+    async_email = time.perf_counter() - t0
+
+    print(f"assessments x{args.n}: sync {sync_asmt:6.2f}s  async {async_asmt:6.2f}s")
+    print(f"email drafts x{args.n}: sync {sync_email:6.2f}s  async {async_email:6.2f}s")
+    print(f"stub requests served: {stub.requests}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Latency benchmark for core.ai_client.chat_completion.
+
+Runs N sequential calls against a local stub /chat/completions server and
+prints p50/p95 for the pooled session versus a bare requests.post per call.
+
+Usage:
+    python benchmarks/bench_ai_client.py --calls 200 --delay-ms 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm_server import start_stub_server
+
+import requests
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _report(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{label:<12} n={len(ms):<5} p50={_percentile(ms, 50):7.2f}ms "
+          f"p95={_percentile(ms, 95):7.2f}ms mean={statistics.mean(ms):7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="stub server think time")
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub_server(latency=f"fixed:{args.delay_ms / 1000.0}")
+    # core.config reads these at import time
+    os.environ["AI_ML_BASE_URL"] = base_url
+    os.environ.setdefault("AI_ML_API_KEY", "bench-key")
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    from core import ai_client
+
+    messages = [{"role": "user", "content": "ping"}]
+
+    unpooled = []
+    for _ in range(args.calls):
+        t0 = time.perf_counter()
+        r = requests.post(f"{base_url}/chat/completions", json={"model": "stub", "messages": messages})
+        r.raise_for_status()
+        r.json()
+        unpooled.append(time.perf_counter() - t0)
+
+    pooled = []
+    for _ in range(args.calls):
+        t0 = time.perf_counter()
+        ai_client.chat_completion(model="stub", messages=messages)
+        pooled.append(time.perf_counter() - t0)
+
+    _report("bare post", unpooled)
+    _report("pooled", pooled)
+
+    ai_client.close_session()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compact wire format benchmark: lesson plans with full vs compact week keys.
+
+Generates the same lesson plan against the local stub LLM with the verbose
+weekly_schedule keys and with LESSON_PLAN_COMPACT_OUTPUT's short keys and
+positional arrays (core.wire_format), for several course lengths. Prints the
+output tokens the stub billed, wall time with a per-token decode cost, and time
+to the first streamed week, and checks that the expanded compact plan renders
+to exactly the same markdown as the full one.
+
+Usage:
+    python benchmarks/bench_compact_output.py --weeks 4 8 16 --sections 2 --ms-per-token 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm_server import start_stub_server
+from synthetic_pdf import write_synthetic_pdf
+
+
+def _run(agent, stub, pdf, weeks, sections):
+    before = stub.completion_tokens
+    t0 = time.perf_counter()
+    plan = agent.generate_plan({"course_outline": pdf}, weeks, 30, sections)
+    elapsed = time.perf_counter() - t0
+    tokens = stub.completion_tokens - before
+
+    t0 = time.perf_counter()
+    first_week = None
+    for event, _ in agent.stream_plan({"course_outline": pdf}, weeks, 30, sections):
+        if event == "week" and first_week is None:
+            first_week = time.perf_counter() - t0
+    return plan, tokens, elapsed, first_week
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--weeks", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--sections", type=int, default=2)
+    parser.add_argument("--ms-per-token", type=float, default=5.0, help="stub decode time per output token")
+    parser.add_argument("--latency", default="fixed:0.2", help="stub time to first token")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_compact_")
+    server, base_url, stub = start_stub_server(latency=args.latency, ms_per_token=args.ms_per_token)
+    os.environ["AI_ML_BASE_URL"] = base_url
+    os.environ.setdefault("AI_ML_API_KEY", "bench-key")
+    os.environ["CACHE_DIR"] = tmp
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["LESSON_PLAN_CACHE_ENABLED"] = "0"
+    # One call per plan, so the two formats are compared on the same request
+    os.environ["LESSON_PLAN_FANOUT_MIN_WEEKS"] = "0"
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from agents.lesson_plan_agent import LessonPlanAgent
+    from core.md_render import render_lesson_plan_markdown
+
+    pdf = os.path.join(tmp, "outline.pdf")
+    write_synthetic_pdf(pdf, pages=5)
+    agents = {"full": LessonPlanAgent(compact_output=False), "compact": LessonPlanAgent(compact_output=True)}
+
+    mismatches = 0
+    print(f"stub: {args.latency} to first token, {args.ms_per_token} ms per output token; {args.sections} section(s)/week")
+    print(f"{'weeks':>5s} {'format':>8s} {'out tokens':>11s} {'saved':>7s} {'generate':>10s} {'1st week':>10s}  same plan")
+    for weeks in args.weeks:
+        results = {name: _run(agent, stub, pdf, weeks, args.sections) for name, agent in agents.items()}
+        full_plan, full_tokens = results["full"][0], results["full"][1]
+        for name, (plan, tokens, elapsed, first_week) in results.items():
+            same = "error" if plan.get("error") else ""
+            if not same:
+                plan.pop("_cache", None)
+                full_plan.pop("_cache", None)
+                same = "yes" if render_lesson_plan_markdown(plan) == render_lesson_plan_markdown(full_plan) else "NO"
+            mismatches += same != "yes"
+            saved = 1 - tokens / full_tokens if full_tokens else 0
+            print(f"{weeks:5d} {name:>8s} {tokens:11d} {saved:7.0%} {elapsed:9.2f}s {first_week or 0:9.2f}s  {same}")
+
+    server.shutdown()
+    if mismatches:
+        print(f"\n{mismatches} plan(s) differ from the full-format plan")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Microbenchmark for core.json_extract against the parsers it replaced.
+
+Checks every case in fixtures/llm_json_outputs.jsonl (malformed model outputs
+with their expected parse), then times valid, fenced and malformed documents
+from a small assessment up to a long lesson plan.
+
+Usage:
+    python benchmarks/bench_json_extract.py --weeks 40 --repeat 200
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AI_ML_API_KEY", "bench-key")
+
+from core.json_extract import parse_json
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "llm_json_outputs.jsonl")
+
+
+def legacy_agent_parse(raw):
+    """The copy that lived in LessonPlanAgent and AssessmentAgent."""
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        fence = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", raw)
+        candidate = fence.group(1) if fence else None
+        if not candidate:
+            s = raw.find('{')
+            e = raw.rfind('}')
+            if s != -1 and e != -1 and e > s:
+                candidate = raw[s:e+1]
+        if candidate:
+            norm = candidate
+            norm = norm.replace('“', '"').replace('”', '"').replace('’', "'")
+            norm = re.sub(r",\s*([}\]])", r"\1", norm)
+            try:
+                return json.loads(norm)
+            except json.JSONDecodeError:
+                return None
+        return None
+
+
+def legacy_form_parse(raw):
+    """The copy that lived in integrations.form_creator."""
+    try:
+        cleaned = raw.strip()
+        m = re.search(r"```(?:json)?\s*([\s\S]*?)```", cleaned, re.IGNORECASE)
+        if m:
+            cleaned = m.group(1).strip()
+        if not cleaned.startswith("{"):
+            start, end = cleaned.find("{"), cleaned.rfind("}")
+            if start != -1 and end != -1 and end > start:
+                cleaned = cleaned[start:end+1]
+        return json.loads(cleaned)
+    except Exception:
+        return None
+
+
+PARSERS = [("agents (old)", legacy_agent_parse), ("form_creator (old)", legacy_form_parse), ("json_extract", parse_json)]
+
+
+def _week(n):
+    return {
+        "week": n,
+        "topic": f"Topic {n}: photosynthesis and cellular respiration",
+        "learning_objectives": [f"Explain concept {n}.{i} in the student’s own words" for i in range(4)],
+        "activities": [{"name": f"Activity {i}", "duration_minutes": 15, "type": "group"} for i in range(4)],
+        "timeline": [{"time_range": f"{i * 10}-{i * 10 + 10}", "activity": "Discussion", "instructor_notes": "Ask for {examples}"} for i in range(5)],
+        "materials": ["Slides", "Worksheet"],
+        "sections": [{"section_number": s, "title": f"Section {s}", "activities": ["Lecture"], "materials": [], "assessment": "Exit ticket"} for s in (1, 2)],
+    }
+
+
+def _documents(weeks):
+    small = {"title": "Quiz", "type": "MCQ", "questions": [{"q": f"Question {i}?", "options": ["a", "b", "c"], "answer": "a"} for i in range(5)]}
+    large = {"title": "Biology", "total_duration": weeks, "weekly_schedule": [_week(n) for n in range(1, weeks + 1)]}
+    docs = {}
+    for name, doc in (("assessment", small), (f"plan {weeks}w", large)):
+        text = json.dumps(doc, ensure_ascii=False, indent=2)
+        docs[f"{name} valid"] = (text, doc)
+        docs[f"{name} fenced"] = ("Here you go:\n```json\n" + text + "\n```\nHope this helps!", doc)
+        docs[f"{name} trailing commas"] = ("```json\n" + re.sub(r"\]", ",]", text) + "\n```", doc)
+    return docs
+
+
+def check_fixtures():
+    failures = 0
+    with open(FIXTURES, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    print(f"{'fixture':36s}" + "".join(f"{label:>20s}" for label, _ in PARSERS))
+    for case in cases:
+        row = []
+        for label, parse in PARSERS:
+            ok = parse(case["raw"]) == case["expect"]
+            row.append("ok" if ok else "WRONG")
+            if parse is parse_json and not ok:
+                failures += 1
+        print(f"{case['name']:36s}" + "".join(f"{r:>20s}" for r in row))
+    print()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    failures = check_fixtures()
+
+    print(f"{'document':36s}{'size':>9s}" + "".join(f"{label:>20s}" for label, _ in PARSERS))
+    for name, (text, expect) in _documents(args.weeks).items():
+        cells = []
+        for label, parse in PARSERS:
+            ok = parse(text) == expect
+            per_call = min(timeit.repeat(lambda: parse(text), number=args.repeat, repeat=3)) / args.repeat
+            cells.append(f"{per_call * 1e6:9.1f}us {'ok' if ok else 'WRONG':>5s}")
+        print(f"{name:36s}{len(text) // 1024:>7d}KB" + "".join(f"{c:>20s}" for c in cells))
+
+    if failures:
+        print(f"\n{failures} fixture(s) parsed incorrectly by core.json_extract")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
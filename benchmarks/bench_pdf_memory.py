@@ -0,0 +1,98 @@
+"""
+Peak RSS of whole-document vs streaming PDF extraction (core.pdf_tool).
+
+Each mode runs in a fresh subprocess on the same synthetic PDF and reports
+its peak resident set size (VmHWM, else ru_maxrss) above a bare-import baseline:
+
+    full      extract_text_from_pdf(): one string, then two regex passes
+    stream    iter_pdf_text(): cleaned page by page, nothing retained
+    budget    iter_pdf_text(max_tokens=N): stops once N tokens were read
+
+Usage:
+    python benchmarks/bench_pdf_memory.py --pages 500 --lines 120
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ("baseline", "full", "stream", "budget")
+
+
+def _peak_rss_mb() -> float:
+    # On Linux ru_maxrss carries over the parent's peak across fork+exec, so a
+    # mode launched from a large process (e.g. pytest) would report that instead;
+    # VmHWM belongs to this process image only.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_mode(mode: str, path: str, budget: int) -> None:
+    os.environ.setdefault("AI_ML_API_KEY", "bench-key")
+    os.environ["PDF_CACHE_ENABLED"] = "0"
+    os.environ["PDF_EXTRACT_WORKERS"] = "1"
+    from core import pdf_tool
+
+    t0 = time.perf_counter()
+    chars = 0
+    if mode == "full":
+        chars = len(pdf_tool.extract_text_from_pdf(path))
+    elif mode == "stream":
+        for page in pdf_tool.iter_pdf_text(path):
+            chars += len(page)
+    elif mode == "budget":
+        for page in pdf_tool.iter_pdf_text(path, max_tokens=budget):
+            chars += len(page)
+    print(f"{mode} {_peak_rss_mb():.1f} {time.perf_counter() - t0:.3f} {chars}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=120, help="text lines per page")
+    parser.add_argument("--budget", type=int, default=24000, help="token budget for the budget mode")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args.mode, args.path, args.budget)
+        return
+
+    from synthetic_pdf import write_synthetic_pdf
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(path, args.pages, args.lines)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB PDF")
+
+        results = {}
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--path", path, "--budget", str(args.budget)],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            results[mode] = (float(out[1]), float(out[2]), int(out[3]))
+
+        base = results["baseline"][0]
+        for mode in MODES[1:]:
+            rss, secs, chars = results[mode]
+            print(f"{mode:<8} peak +{rss - base:7.1f} MB  {secs:7.3f}s  {chars:>10} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Validation benchmark for core.schemas.
+
+Validates N generated documents (lesson plans, assessments, timetables and
+email drafts; about one in five invalid) with the compiled schemas and with
+the hand-written Orchestrator checks they replaced, and prints docs/s for each.
+
+Usage:
+    python benchmarks/bench_schemas.py --n 10000 --weeks 16
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AI_ML_API_KEY", "bench-key")
+
+from core.schemas import is_valid, schema_error
+
+
+# The checks core.schemas replaced (Orchestrator.register_defaults)
+def old_v_lp(plan):
+    if not isinstance(plan, dict):
+        return False
+    weekly = plan.get("weekly_schedule") or plan.get("weekly") or []
+    dw = plan.get("duration_weeks") or plan.get("total_duration")
+    spw = plan.get("sections_per_week")
+    return bool(isinstance(weekly, list) and len(weekly) > 0 and isinstance(spw, int) and isinstance(dw, int))
+
+
+def old_v_asmt(a):
+    return isinstance(a, dict) and isinstance(a.get("questions"), list) and len(a["questions"]) > 0
+
+
+def old_v_tt(tt):
+    if not isinstance(tt, dict):
+        return False
+    slots = tt.get("suggested_slots")
+    return isinstance(slots, list) and all(isinstance(x, dict) and x.get("start") and x.get("end") and x.get("title") for x in slots)
+
+
+def old_v_email_draft(d):
+    return isinstance(d, dict) and (d.get("subject") is not None)
+
+
+OLD = {"lesson_plan": old_v_lp, "assessment": old_v_asmt, "timetable": old_v_tt, "email_draft": old_v_email_draft}
+
+
+def _plan(rng, weeks, broken):
+    plan = {
+        "title": "Biology",
+        "total_duration": weeks,
+        "class_size": 30,
+        "sections_per_week": 2,
+        "weekly_schedule": [
+            {
+                "week": n,
+                "topic": f"Topic {n}",
+                "learning_objectives": ["Explain", "Apply"],
+                "materials": ["Slides"],
+                "sections": [{"section_number": s, "title": f"Section {s}"} for s in (1, 2)],
+            }
+            for n in range(1, weeks + 1)
+        ],
+        "external_resources": [],
+    }
+    if broken:
+        week = rng.choice(plan["weekly_schedule"])
+        week["learning_objectives"] = "Explain and apply"  # string instead of list
+    return plan
+
+
+def _assessment(rng, broken):
+    doc = {
+        "title": "Quiz",
+        "type": "MCQ",
+        "questions": [{"q": f"Question {i}?", "options": ["a", "b", "c"], "answer": "a"} for i in range(10)],
+    }
+    if broken:
+        del rng.choice(doc["questions"])["q"]
+    return doc
+
+
+def _timetable(rng, broken):
+    doc = {"suggested_slots": [
+        {"start": "2025-01-06T09:00:00", "end": "2025-01-06T10:00:00", "title": f"Week {i}"} for i in range(1, 33)
+    ], "metadata": {}}
+    if broken:
+        rng.choice(doc["suggested_slots"])["title"] = ""
+    return doc
+
+
+def _email(rng, broken):
+    return {"plain": "Hello"} if broken else {"subject": "Quiz on Friday", "plain": "Hello", "html": "<p>Hello</p>"}
+
+
+def _documents(n, weeks, seed=7):
+    rng = random.Random(seed)
+    kinds = ["lesson_plan", "assessment", "timetable", "email_draft"]
+    docs = []
+    for i in range(n):
+        kind = kinds[i % len(kinds)]
+        broken = rng.random() < 0.2
+        if kind == "lesson_plan":
+            doc = _plan(rng, weeks, broken)
+        elif kind == "assessment":
+            doc = _assessment(rng, broken)
+        elif kind == "timetable":
+            doc = _timetable(rng, broken)
+        else:
+            doc = _email(rng, broken)
+        docs.append((kind, doc, broken))
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--weeks", type=int, default=16)
+    args = parser.parse_args()
+
+    docs = _documents(args.n, args.weeks)
+
+    results = {}
+    for label, check in (
+        ("hand-written", lambda kind, doc: OLD[kind](doc)),
+        ("core.schemas is_valid", is_valid),
+        ("core.schemas schema_error", lambda kind, doc: schema_error(kind, doc) is None),
+    ):
+        t0 = time.perf_counter()
+        verdicts = [check(kind, doc) for kind, doc, _ in docs]
+        elapsed = time.perf_counter() - t0
+        caught = sum(1 for (_, _, broken), ok in zip(docs, verdicts) if broken and not ok)
+        results[label] = (elapsed, caught)
+
+    broken_total = sum(1 for _, _, broken in docs if broken)
+    print(f"{args.n} documents ({broken_total} invalid), lesson plans of {args.weeks} weeks")
+    for label, (elapsed, caught) in results.items():
+        print(f"{label:28s} {elapsed * 1000:8.1f} ms  {args.n / elapsed:10.0f} docs/s  invalid caught {caught}/{broken_total}")
+
+    sample = next(schema_error(kind, doc) for kind, doc, broken in docs if broken and kind == "lesson_plan")
+    print(f"example error: {sample.describe()}  path={list(sample.path)}")
+
+
+if __name__ == "__main__":
+    main()
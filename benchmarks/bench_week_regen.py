@@ -0,0 +1,93 @@
+"""
+Single-week regeneration vs full lesson plan generation, against the stub LLM.
+
+Generates a plan from a synthetic PDF, then regenerates one of its weeks the
+way POST /lesson-plans/api/<id>/weeks/<n>/regenerate does, and prints prompt
+and output tokens and wall time for both (the stub charges a decode cost per
+output token).
+
+Usage:
+    python benchmarks/bench_week_regen.py --weeks 12 --sections 2 --pages 30 --ms-per-token 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm_server import start_stub_server
+from synthetic_pdf import write_synthetic_pdf
+
+
+def _measure(stub, fn):
+    prompt, completion = stub.prompt_tokens, stub.completion_tokens
+    t0 = time.perf_counter()
+    out = fn()
+    return out, stub.prompt_tokens - prompt, stub.completion_tokens - completion, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--sections", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=30, help="pages of course material in the PDF")
+    parser.add_argument("--ms-per-token", type=float, default=5.0, help="stub decode time per output token")
+    parser.add_argument("--latency", default="fixed:0.2", help="stub time to first token")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_week_regen_")
+    server, base_url, stub = start_stub_server(latency=args.latency, ms_per_token=args.ms_per_token)
+    os.environ["AI_ML_BASE_URL"] = base_url
+    os.environ.setdefault("AI_ML_API_KEY", "bench-key")
+    os.environ["CACHE_DIR"] = tmp
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["LESSON_PLAN_CACHE_ENABLED"] = "0"
+    os.environ["LESSON_PLAN_FANOUT_MIN_WEEKS"] = "0"
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from agents.lesson_plan_agent import LessonPlanAgent, week_index
+    from core.md_render import render_lesson_plan_markdown, render_week_markdown, replace_week_markdown
+
+    pdf = os.path.join(tmp, "outline.pdf")
+    write_synthetic_pdf(pdf, pages=args.pages)
+    agent = LessonPlanAgent()
+
+    plan, p_full, c_full, t_full = _measure(
+        stub, lambda: agent.generate_plan({"course_outline": pdf}, args.weeks, 30, args.sections))
+    if plan.get("error"):
+        sys.exit(f"generation failed: {plan['error']}")
+
+    week = (args.weeks + 1) // 2
+    entry, p_week, c_week, t_week = _measure(
+        stub, lambda: agent.regenerate_week(plan, week, "More hands-on practice"))
+    if entry.get("error"):
+        sys.exit(f"week {week} regeneration failed: {entry['error']}")
+
+    # What the route does next: splice the entry and only its markdown
+    plan.pop("_cache", None)
+    markdown = render_lesson_plan_markdown(plan)
+    t0 = time.perf_counter()
+    plan["weekly_schedule"][week_index(plan, week)] = entry
+    spliced = replace_week_markdown(markdown, week, render_week_markdown(entry))
+    t_splice = time.perf_counter() - t0
+    same = spliced == render_lesson_plan_markdown(plan)
+
+    print(f"{args.weeks}-week plan, {args.sections} section(s)/week, {args.pages}-page PDF; "
+          f"stub {args.latency} + {args.ms_per_token} ms/output token")
+    print(f"{'':22s}{'prompt tok':>11s}{'output tok':>11s}{'time':>9s}")
+    print(f"{'full generation':22s}{p_full:11d}{c_full:11d}{t_full:8.2f}s")
+    print(f"{f'regenerate week {week}':22s}{p_week:11d}{c_week:11d}{t_week:8.2f}s")
+    print(f"{'fraction':22s}{p_week / p_full:11.1%}{c_week / c_full:11.1%}{t_week / t_full:8.1%}")
+    print(f"markdown splice: {t_splice * 1000:.2f} ms, same as a full re-render: {'yes' if same else 'NO'}")
+
+    server.shutdown()
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
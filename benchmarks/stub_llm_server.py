@@ -0,0 +1,370 @@
+"""
+Local stand-in for the AI/ML API (OpenAI-compatible /chat/completions).
+
+Point the app or a benchmark at it with
+    AI_ML_BASE_URL=http://127.0.0.1:8099/v1
+
+It recognises the prompts used by LessonPlanAgent, AssessmentAgent,
+email_writer and core.digest and answers with schema-valid canned JSON,
+sized from the request (weeks, sections, question count). Lesson plan
+prompts that ask for compact week keys get their weeks in that form
+(core.wire_format). Latency, decode speed (per output token), error rate and
+streaming pace are configurable, and "usage" token counts are reported like
+the real API.
+
+Usage:
+    python benchmarks/stub_llm_server.py --port 8099 \\
+        --latency lognormal:0.8,0.5 --ms-per-token 10 --error-rate 0.02 --stream-delay-ms 20
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# -------- Latency models --------
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Build a sampler (seconds) from a spec string:
+      fixed:S | uniform:LO,HI | normal:MEAN,STD | lognormal:MEDIAN,SIGMA
+    """
+    kind, _, args = (spec or "fixed:0").partition(":")
+    vals = [float(x) for x in args.split(",") if x.strip()] if args else []
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        s = vals[0] if vals else 0.0
+        return lambda: s
+    if kind == "uniform":
+        lo, hi = vals
+        return lambda: random.uniform(lo, hi)
+    if kind == "normal":
+        mean, std = vals
+        return lambda: max(0.0, random.gauss(mean, std))
+    if kind == "lognormal":
+        median, sigma = vals
+        mu = math.log(median) if median > 0 else 0.0
+        return lambda: random.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+# -------- Canned responses --------
+
+def _int_after(pattern: str, text: str, default: int) -> int:
+    m = re.search(pattern, text, re.IGNORECASE)
+    return int(m.group(1)) if m else default
+
+
+def _week(n: int, sections: int) -> Dict[str, Any]:
+    return {
+        "week": n,
+        "topic": f"Topic {n}",
+        "learning_objectives": [f"Explain core idea {n}", f"Apply idea {n} to a worked problem"],
+        "vocabulary": [f"term{n}a", f"term{n}b"],
+        "activities": [
+            {"name": "Mini lecture", "duration_minutes": 20, "type": "Direct Instruction"},
+            {"name": "Pair practice", "duration_minutes": 25, "type": "Think-Pair-Share"},
+        ],
+        "timeline": [
+            {"time_range": "0-20", "activity": "Mini lecture", "instructor_notes": "Check prior knowledge"},
+            {"time_range": "20-45", "activity": "Pair practice", "instructor_notes": "Circulate and prompt"},
+        ],
+        "materials": ["Slides", "Worksheet"],
+        "differentiation": {
+            "support_strategies": ["Worked examples", "Sentence starters"],
+            "challenge_strategies": ["Extension problem"],
+            "accommodations": ["Extra time"],
+        },
+        "assessment": {
+            "type": "Formative",
+            "questions_or_tasks": [f"Exit ticket on topic {n}"],
+            "rubric": "1 point per correct step",
+            "duration_minutes": 5,
+        },
+        "homework": {
+            "tasks": [f"Exercises for topic {n}"],
+            "estimated_time_minutes": 30,
+            "due_date_offset_days": 7,
+        },
+        "sections": [
+            {
+                "section_number": s,
+                "title": f"Week {n} section {s}",
+                "activities": ["Discussion", "Practice"],
+                "materials": ["Worksheet"],
+                "assessment": "Exit ticket",
+            }
+            for s in range(1, sections + 1)
+        ],
+    }
+
+
+def lesson_plan_response(system: str, user: str) -> Dict[str, Any]:
+    weeks = _int_after(r"total_duration \(number\):\s*(\d+)", system, 8)
+    sections = _int_after(r"sections_per_week \(number\):\s*(\d+)", system, 0) or \
+        _int_after(r"exactly (\d+) sections", system, 1)
+    # Week-range and single-week prompts ("Write weeks 5 to 8 only", "Rewrite week 12 only")
+    # get just those weeks
+    rng = re.search(r"weeks? (\d+)(?: to (\d+))? only", user)
+    first, last = (int(rng.group(1)), int(rng.group(2) or rng.group(1))) if rng else (1, weeks)
+    schedule = [_week(n, sections) for n in range(first, last + 1)]
+    if "compact week keys" in system:
+        from core.wire_format import LESSON_WEEK_WIRE
+        schedule = LESSON_WEEK_WIRE.compact(schedule)
+    if rng:
+        return {"weekly_schedule": schedule}
+    students = _int_after(r"class_size \(number\):\s*(\d+)", system, 20)
+    return {
+        "title": "Stub Course",
+        "metadata": {"course": "Stub Course", "grade_level": "Undergraduate"},
+        "total_duration": weeks,
+        "class_size": students,
+        "sections_per_week": sections,
+        "teaching_approach": "Mixed",
+        "learning_objectives": ["Describe the key concepts", "Apply them to problems"],
+        "key_concepts": {"core_topics": [f"Topic {n}" for n in range(1, weeks + 1)]},
+        "teaching_strategies": ["Direct Instruction", "Think-Pair-Share"],
+        "teaching_activities": [{
+            "title": "Warm-up", "duration_minutes": 10, "description": "Quick recall questions.",
+            "steps": ["Ask", "Discuss"], "learning_outcomes": ["Recall prior topic"],
+        }],
+        "materials_needed": [{"item": "Slides"}],
+        "weekly_schedule": schedule,
+        "supplementary_resources": [{"title": "Reference", "url": "https://example.com", "type": "article"}],
+        "quality_checklist": {
+            "realistic_timing": True, "diverse_activities": True, "clear_assessments": True,
+            "differentiation_included": True, "standards_aligned": True,
+        },
+    }
+
+
+def assessment_response(system: str, user: str) -> Dict[str, Any]:
+    count = _int_after(r"Number of questions:\s*(\d+)", user, 5)
+    atype = (re.search(r"Create a (\w+) assessment", user) or [None, "MCQ"])[1]
+    questions = []
+    for i in range(1, count + 1):
+        q = {"q": f"Stub question {i}?", "answer": "A"}
+        if atype == "MCQ":
+            q["options"] = ["A", "B", "C", "D"]
+        questions.append(q)
+    return {
+        "title": "Stub Assessment",
+        "type": atype,
+        "difficulty": (re.search(r"Difficulty:\s*(\w+)", user) or [None, "Medium"])[1],
+        "questions": questions,
+        "rubric": [{"criteria": "Correct answer", "points": 1}],
+    }
+
+
+def email_fields_response(system: str, user: str) -> Dict[str, Any]:
+    def field(name: str) -> str:
+        m = re.search(rf"^{name}:\s*(.*)$", user, re.MULTILINE)
+        return m.group(1).strip() if m else ""
+    email = field("to") or ((re.search(r"[\w\.-]+@[\w\.-]+\.\w+", user) or [""])[0])
+    return {
+        "to_email": email, "to_name": field("to_name"), "tone": field("tone"),
+        "cc": field("cc"), "bcc": field("bcc"), "action": field("action") or "send",
+        "subject_override": field("subject"), "notes": field("notes"),
+    }
+
+
+def email_draft_response(system: str, user: str) -> Dict[str, Any]:
+    name = (re.search(r"Recipient name:\s*(.*)", user) or [None, "there"])[1].strip()
+    body = f"Hello {name},\n\nThis is a reminder about the upcoming class activity.\n\nBest regards"
+    return {"subject": "Class reminder", "plain": body, "html": "<p>" + body.replace("\n", "<br>") + "</p>"}
+
+
+def summary_response(system: str, user: str) -> Dict[str, Any]:
+    words = user.split()
+    return {
+        "section_title": " ".join(words[:5]) or "Section",
+        "summary": " ".join(words[:150]),
+        "key_topics": list(dict.fromkeys(w for w in words if len(w) > 8))[:5],
+        "key_terms": [],
+    }
+
+
+# First matching marker in the system prompt picks the generator
+RESPONDERS: List[Tuple[str, Callable[[str, str], Dict[str, Any]]]] = [
+    ("CurriculumArchitect", lesson_plan_response),
+    ("assessment designer", assessment_response),
+    ("Extract email-send intent", email_fields_response),
+    ("You write concise, polite emails", email_draft_response),
+    ("You condense one section", summary_response),
+]
+
+
+def canned_content(messages: List[Dict[str, Any]]) -> str:
+    system = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+    user = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "user")
+    for marker, fn in RESPONDERS:
+        if marker in system:
+            return json.dumps(fn(system, user), ensure_ascii=False)
+    return json.dumps({"ok": True})
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# -------- HTTP server --------
+
+class StubConfig:
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0,
+                 error_status: int = 429, stream_delay_ms: float = 0.0, stream_chunk_chars: int = 40,
+                 ms_per_token: float = 0.0):
+        self.sample_latency = parse_latency(latency)
+        # Decode time: every output token costs this much on top of the latency
+        self.sec_per_token = ms_per_token / 1000.0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stream_delay = stream_delay_ms / 1000.0
+        self.stream_chunk_chars = stream_chunk_chars
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def add_usage(self, usage: Dict[str, int]):
+        with self._lock:
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+
+
+def _make_handler(cfg: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive like the real API
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status: int, obj: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            cfg.count()
+            try:
+                req = json.loads(raw or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                return
+
+            time.sleep(cfg.sample_latency())
+            if cfg.error_rate and random.random() < cfg.error_rate:
+                self._send_json(cfg.error_status, {"error": {"message": "stub injected error"}}, {"Retry-After": "0"})
+                return
+
+            messages = req.get("messages") or []
+            content = canned_content(messages)
+            usage = {
+                "prompt_tokens": sum(_approx_tokens(str(m.get("content") or "")) for m in messages),
+                "completion_tokens": _approx_tokens(content),
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            cfg.add_usage(usage)
+            cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = req.get("model") or "stub"
+
+            if req.get("stream"):
+                self._stream(cid, model, content, usage)
+                return
+
+            time.sleep(usage["completion_tokens"] * cfg.sec_per_token)
+            self._send_json(200, {
+                "id": cid,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        def _stream(self, cid: str, model: str, content: str, usage: Dict[str, int]):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            step = max(1, cfg.stream_chunk_chars)
+            for i in range(0, len(content), step):
+                chunk = {
+                    "id": cid, "object": "chat.completion.chunk", "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                pause = cfg.stream_delay + _approx_tokens(content[i:i + step]) * cfg.sec_per_token
+                if pause:
+                    time.sleep(pause)
+            final = {"id": cid, "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+            self.close_connection = True
+
+    return StubHandler
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **config) -> Tuple[ThreadingHTTPServer, str, StubConfig]:
+    """
+    Start the stub in a daemon thread. Returns (server, base_url, config);
+    base_url already ends in /v1 and can be used as AI_ML_BASE_URL.
+    """
+    cfg = StubConfig(**config)
+    server = ThreadingHTTPServer((host, port), _make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1", cfg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the AI/ML chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S | uniform:LO,HI | normal:MEAN,STD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--stream-delay-ms", type=float, default=0.0, help="pause between streamed chunks")
+    parser.add_argument("--stream-chunk-chars", type=int, default=40)
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="decode time per output token")
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub_server(
+        args.host, args.port,
+        latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+        stream_delay_ms=args.stream_delay_ms, stream_chunk_chars=args.stream_chunk_chars,
+        ms_per_token=args.ms_per_token,
+    )
+    print(f"Stub LLM listening; set AI_ML_BASE_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Write text-only PDFs of any page count without extra dependencies, for the
+PDF benchmarks. Each page gets a running header and footer and paragraphs of
+filler course text, so extraction and cleaning do realistic work.
+
+Usage:
+    python benchmarks/synthetic_pdf.py out.pdf --pages 100
+"""
+import argparse
+import random
+
+WORDS = (
+    "photosynthesis chlorophyll energy reaction cycle carbon dioxide glucose membrane "
+    "enzyme substrate equilibrium gradient transport protein structure function cell "
+    "theory experiment variable hypothesis analysis model system process evidence data"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_lines(page_no: int, lines_per_page: int, rng: random.Random) -> list:
+    lines = [f"Introduction to Biology - Course Reader", f"Chapter {page_no // 10 + 1}. Section {page_no % 10 + 1}"]
+    for _ in range(lines_per_page):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + ".")
+    lines.append(f"Page {page_no + 1}")
+    return lines
+
+
+def write_synthetic_pdf(path: str, pages: int, lines_per_page: int = 40, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    objects = []  # object bodies; object n is objects[n - 1]
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in once the page tree exists
+    pages_obj = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    kids = []
+    for p in range(pages):
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        for line in _page_lines(p, lines_per_page, rng):
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    objects[pages_obj - 1] = (
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=40)
+    args = parser.parse_args()
+    write_synthetic_pdf(args.path, args.pages, args.lines)
@@ -1,21 +1,565 @@
-import requests 
-from core.config import AI_ML_API_KEY, AI_ML_BASE_URL
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
 
-def chat_completion(model: str, messages: list, max_tokens : int = None ,temperature: float = 0) -> str:
-    # Wrapper for AI ML chat completions
-    url = f"{AI_ML_BASE_URL}/chat/completions"
-    headers = {
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.chunker import estimate_tokens
+from core.config import (
+    AI_ML_API_KEY,
+    AI_ML_ASYNC_MAX_CONNECTIONS,
+    AI_ML_BASE_URL,
+    AI_ML_BACKOFF_FACTOR,
+    AI_ML_CONNECT_TIMEOUT,
+    AI_ML_MAX_RETRIES,
+    AI_ML_POOL_SIZE,
+    AI_ML_READ_TIMEOUT,
+    LLM_CACHE_ENABLED,
+    LLM_ROUTE_MAX_ERROR_RATE,
+    LLM_ROUTE_MIN_SAMPLES,
+    LLM_ROUTE_WINDOW_SECONDS,
+    LLM_ROUTES,
+)
+from core.llm_cache import get_llm_cache, make_cache_key
+from core.logger import logger
+from core.metrics import record_llm_call
+from core.rate_limit import ModelGuard, get_model_guard, limiter_snapshot
+from core.single_flight import get_single_flight
+
+# Upstream answers worth retrying: rate limited or a transient server error
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# cache_if predicate: True when a completion is good enough to cache
+CacheCheck = Callable[[str], bool]
+
+# Completion size charged against the token budget when max_tokens is not set
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# Task kind -> primary model, fallback model, completion budget and the moving
+# p95 latency (seconds) above which the primary is considered degraded.
+DEFAULT_ROUTES: Dict[str, dict] = {
+    "field_extraction": {"model": "gpt-4o-mini", "fallback": "openai/gpt-5-chat-latest", "max_tokens": 400, "p95_seconds": 8},
+    "email_draft": {"model": "openai/gpt-5-chat-latest", "fallback": "gpt-4o-mini", "max_tokens": 1200, "p95_seconds": 30},
+    "assessment": {"model": "openai/gpt-5-chat-latest", "fallback": "gpt-4o", "max_tokens": None, "p95_seconds": 120},
+    "lesson_plan": {"model": "openai/gpt-5-chat-latest", "fallback": "gpt-4o", "max_tokens": 8000, "p95_seconds": 180},
+    "lesson_plan_skeleton": {"model": "openai/gpt-5-chat-latest", "fallback": "gpt-4o", "max_tokens": 3000, "p95_seconds": 60},
+    "lesson_plan_weeks": {"model": "openai/gpt-5-chat-latest", "fallback": "gpt-4o", "max_tokens": 6000, "p95_seconds": 120},
+    "json_repair": {"model": "openai/gpt-5-chat-latest", "fallback": "gpt-4o", "max_tokens": 2500, "p95_seconds": 60},
+}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# One AsyncClient per event loop: httpx clients cannot be shared across loops
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _auth_headers() -> dict:
+    return {
         "Authorization": f"Bearer {AI_ML_API_KEY}",
         "Content-Type": "application/json",
     }
-    payload = {
+
+
+def _build_session() -> requests.Session:
+    """
+    Build a keep-alive session with a connection pool and retry policy.
+    Read errors are not retried: the request may already have been billed.
+    """
+    retry = Retry(
+        total=AI_ML_MAX_RETRIES,
+        connect=AI_ML_MAX_RETRIES,
+        read=0,
+        status=AI_ML_MAX_RETRIES,
+        backoff_factor=AI_ML_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=AI_ML_POOL_SIZE,
+        pool_maxsize=AI_ML_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(_auth_headers())
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Return the shared session for this worker process.
+    A forked gunicorn worker gets its own session instead of the parent's sockets.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def close_session() -> None:
+    """Close pooled connections (tests, benchmarks, worker shutdown)."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the AsyncClient bound to the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers=_auth_headers(),
+            timeout=httpx.Timeout(AI_ML_READ_TIMEOUT, connect=AI_ML_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=AI_ML_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_ML_POOL_SIZE,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_async_client() -> None:
+    """Close the AsyncClient of the running loop, e.g. before asyncio.run() returns."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _build_payload(model: str, messages: list, max_tokens: int = None, temperature: float = 0) -> dict:
+    return {
         "model": model,
         "messages": messages,
         "temperature": temperature,
         **({"max_tokens": max_tokens} if max_tokens is not None else {}),
         "response_format": {"type": "json_object"},
     }
-    response = requests.post(url, headers=headers, json=payload)
+
+
+def _extract_content(data: dict) -> str:
+    return data["choices"][0]["message"]["content"]
+
+
+def _retry_delay(attempt: int, retry_after: str = None) -> float:
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return AI_ML_BACKOFF_FACTOR * (2 ** attempt)
+
+
+def _cache_key(payload: dict) -> str:
+    return make_cache_key(
+        payload["model"],
+        payload["messages"],
+        payload["temperature"],
+        payload.get("max_tokens"),
+        payload["response_format"],
+    )
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the response cache and single-flight for this worker."""
+    return {**get_llm_cache().stats(), "single_flight": get_single_flight().stats()}
+
+
+def limiter_stats() -> dict:
+    """Rate-limit bucket levels and circuit-breaker state per model for this worker."""
+    return limiter_snapshot()
+
+
+class ModelHealth:
+    """Moving window of (time, latency, ok) samples per model for this worker."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            samples = self._samples.setdefault(model, deque(maxlen=1000))
+            samples.append((now, latency, ok))
+
+    def _recent(self, model: str) -> list:
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            samples = self._samples.get(model)
+            if not samples:
+                return []
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            return list(samples)
+
+    def summary(self, model: str) -> dict:
+        samples = self._recent(model)
+        if not samples:
+            return {"samples": 0, "p50": None, "p95": None, "error_rate": 0.0}
+        latencies = sorted(s[1] for s in samples)
+        pick = lambda pct: latencies[min(len(latencies) - 1, int(round(pct * (len(latencies) - 1))))]
+        errors = sum(1 for s in samples if not s[2])
+        return {
+            "samples": len(samples),
+            "p50": round(pick(0.50), 3),
+            "p95": round(pick(0.95), 3),
+            "error_rate": round(errors / len(samples), 4),
+        }
+
+    def degraded(self, model: str, p95_limit: Optional[float]) -> bool:
+        # Time-aware: once the cool-down ends the primary gets routed its half-open trial
+        if get_model_guard(model).breaker.rejecting():
+            return True
+        s = self.summary(model)
+        if s["samples"] < LLM_ROUTE_MIN_SAMPLES:
+            return False
+        if s["error_rate"] > LLM_ROUTE_MAX_ERROR_RATE:
+            return True
+        return p95_limit is not None and s["p95"] > p95_limit
+
+
+_health = ModelHealth(LLM_ROUTE_WINDOW_SECONDS)
+
+
+def _load_routes() -> Dict[str, dict]:
+    routes = {task: dict(route) for task, route in DEFAULT_ROUTES.items()}
+    try:
+        overrides = json.loads(LLM_ROUTES or "{}")
+        for task, route in overrides.items():
+            routes.setdefault(task, {}).update(route)
+    except (ValueError, AttributeError):
+        logger.warning("Ignoring malformed LLM_ROUTES")
+    return routes
+
+
+ROUTES = _load_routes()
+
+
+def route_model(task: str, model: str = None) -> Tuple[str, Optional[int]]:
+    """
+    Pick (model, max_tokens) for a task kind from ROUTES.
+    The primary model is used unless its moving p95 latency or error rate is over
+    the route's threshold (or its circuit is open) and the fallback is healthier.
+    An explicit model pins the choice and only takes max_tokens from the route.
+    """
+    route = ROUTES[task]
+    if model:
+        return model, route.get("max_tokens")
+    primary, fallback = route["model"], route.get("fallback")
+    p95_limit = route.get("p95_seconds")
+    if fallback and _health.degraded(primary, p95_limit) and not _health.degraded(fallback, p95_limit):
+        logger.debug("Routing %s to fallback %s (primary %s degraded)", task, fallback, primary)
+        return fallback, route.get("max_tokens")
+    return primary, route.get("max_tokens")
+
+
+def routing_stats() -> dict:
+    """Route table plus moving latency/error summary for every model in it."""
+    models = {m for r in ROUTES.values() for m in (r.get("model"), r.get("fallback")) if m}
+    return {
+        "routes": ROUTES,
+        "models": {m: _health.summary(m) for m in sorted(models)},
+    }
+
+
+def _estimate_call_tokens(payload: dict) -> int:
+    prompt = sum(estimate_tokens(str(m.get("content") or "")) for m in payload["messages"])
+    return prompt + (payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def _record_outcome(
+    guard: ModelGuard,
+    status_code: Optional[int],
+    started: float,
+    usage: Optional[dict] = None,
+    request_bytes: Optional[int] = None,
+    response_bytes: Optional[int] = None,
+) -> None:
+    # Only throttling, server and transport errors (status None) count against
+    # upstream health; a 4xx is our request's fault
+    failed = status_code is None or status_code in RETRY_STATUS_CODES
+    if failed:
+        guard.breaker.record_failure()
+    else:
+        guard.breaker.record_success()
+    elapsed = time.monotonic() - started
+    _health.record(guard.model, elapsed, not failed)
+    usage = usage or {}
+    record_llm_call(
+        guard.model,
+        elapsed,
+        ok=status_code is not None and status_code < 400,
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+        request_bytes=request_bytes,
+        response_bytes=response_bytes,
+    )
+
+
+def _response_json(response) -> dict:
+    if not 200 <= response.status_code < 300:
+        return {}
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def chat_completion(model: str, messages: list, max_tokens : int = None ,temperature: float = 0, *,
+                    use_cache: bool = True, cache_if: Optional[CacheCheck] = None) -> str:
+    # Wrapper for AI ML chat completions; use_cache=False forces a fresh call.
+    # cache_if(content) decides whether a completion is worth caching (e.g. it parses);
+    # rejected completions are returned but not stored.
+    # Concurrent identical calls (double-clicked forms) share one upstream request.
+    url = f"{AI_ML_BASE_URL}/chat/completions"
+    payload = _build_payload(model, messages, max_tokens, temperature)
+    key = _cache_key(payload)
+
+    caching = LLM_CACHE_ENABLED and use_cache
+    if caching:
+        cached = _cached(key, cache_if)
+        if cached is not None:
+            return cached
+
+    def _call() -> str:
+        content = _post(url, payload)
+        if caching and _cacheable(content, cache_if):
+            get_llm_cache().set(key, content)
+        return content
+
+    return get_single_flight().do(key, _call, _cache_lookup(key, cache_if) if caching else None)
+
+
+def _post(url: str, payload: dict) -> str:
+    guard = get_model_guard(payload["model"])
+    guard.acquire(_estimate_call_tokens(payload))
+    started = time.monotonic()
+    try:
+        response = get_session().post(
+            url,
+            json=payload,
+            timeout=(AI_ML_CONNECT_TIMEOUT, AI_ML_READ_TIMEOUT),
+        )
+    except requests.RequestException:
+        _record_outcome(guard, None, started)
+        raise
+    data = _response_json(response)
+    _record_outcome(
+        guard, response.status_code, started, data.get("usage"),
+        len(response.request.body or b""), len(response.content),
+    )
     response.raise_for_status()
-    data = response.json()
-    return data["choices"][0]["message"]["content"]
\ No newline at end of file
+    return _extract_content(data)
+
+
+def _cacheable(content: str, cache_if: Optional[CacheCheck]) -> bool:
+    if cache_if is None:
+        return True
+    try:
+        return bool(cache_if(content))
+    except Exception:
+        return False
+
+
+def _cached(key: str, cache_if: Optional[CacheCheck]) -> Optional[str]:
+    """Cached completion for key; an entry that fails cache_if (stored before the check existed) is dropped."""
+    cached = get_llm_cache().get(key)
+    if cached is not None and not _cacheable(cached, cache_if):
+        get_llm_cache().invalidate(key)
+        return None
+    return cached
+
+
+def _cache_lookup(key: str, cache_if: Optional[CacheCheck] = None):
+    # What another worker's in-flight call will leave behind once it finishes
+    return lambda: _cached(key, cache_if)
+
+
+def chat_completion_stream(model: str, messages: list, max_tokens: int = None, temperature: float = 0, *,
+                           use_cache: bool = True, cache_if: Optional[CacheCheck] = None):
+    """
+    Streaming (SSE) variant of chat_completion: yields content deltas as they arrive.
+    A cache hit is yielded as a single chunk; a completed stream that passes
+    cache_if is stored in the same cache slot a non-streaming call would use. A
+    caller that joins an identical call already in flight gets the full text as
+    one chunk when it ends.
+    """
+    url = f"{AI_ML_BASE_URL}/chat/completions"
+    payload = _build_payload(model, messages, max_tokens, temperature)
+    key = _cache_key(payload)
+
+    caching = LLM_CACHE_ENABLED and use_cache
+    if caching:
+        cached = _cached(key, cache_if)
+        if cached is not None:
+            yield cached
+            return
+
+    flight = get_single_flight()
+    fut, leader = flight.claim(key)
+    if not leader:
+        yield fut.result()
+        return
+
+    parts = []
+    try:
+        peer = flight.peer_result(key, _cache_lookup(key, cache_if)) if caching else None
+        if peer is not None:
+            parts.append(peer)
+            yield peer
+        else:
+            try:
+                for delta in _post_stream(url, payload):
+                    parts.append(delta)
+                    yield delta
+            finally:
+                if caching:
+                    flight.release(key)
+            if caching and parts and _cacheable("".join(parts), cache_if):
+                get_llm_cache().set(key, "".join(parts))
+    except BaseException as e:
+        if isinstance(e, GeneratorExit):
+            # Our consumer went away; waiting callers must not see GeneratorExit
+            flight.resolve(key, fut, exc=RuntimeError("identical LLM stream was closed before it finished"))
+        else:
+            flight.resolve(key, fut, exc=e)
+        raise
+    flight.resolve(key, fut, "".join(parts))
+
+
+def _post_stream(url: str, payload: dict):
+    guard = get_model_guard(payload["model"])
+    guard.acquire(_estimate_call_tokens(payload))
+    started = time.monotonic()
+    try:
+        response = get_session().post(
+            url,
+            json={**payload, "stream": True, "stream_options": {"include_usage": True}},
+            timeout=(AI_ML_CONNECT_TIMEOUT, AI_ML_READ_TIMEOUT),
+            stream=True,
+        )
+    except requests.RequestException:
+        _record_outcome(guard, None, started)
+        raise
+    request_bytes = len(response.request.body or b"")
+    if not 200 <= response.status_code < 300:
+        _record_outcome(guard, response.status_code, started, None, request_bytes, len(response.content))
+        response.raise_for_status()
+
+    usage, received, status = None, 0, response.status_code
+    try:
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                received += len(line) + 1
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+    except (requests.RequestException, ValueError):
+        status = None
+        raise
+    finally:
+        # Recorded once the stream ends, so latency covers the whole body
+        _record_outcome(guard, status, started, usage, request_bytes, received)
+
+
+async def achat_completion(model: str, messages: list, max_tokens: int = None, temperature: float = 0, *,
+                           use_cache: bool = True, cache_if: Optional[CacheCheck] = None) -> str:
+    """
+    Async counterpart of chat_completion.
+    Same payload, response cache (and cache_if), single-flight and retry policy (429/5xx and
+    connect errors, exponential backoff), so many calls can be kept in flight
+    with asyncio.gather.
+    """
+    url = f"{AI_ML_BASE_URL}/chat/completions"
+    payload = _build_payload(model, messages, max_tokens, temperature)
+    key = _cache_key(payload)
+
+    caching = LLM_CACHE_ENABLED and use_cache
+    if caching:
+        cached = _cached(key, cache_if)
+        if cached is not None:
+            return cached
+
+    async def _call() -> str:
+        guard = get_model_guard(model)
+        await guard.aacquire(_estimate_call_tokens(payload))
+        content = await _apost(url, payload, guard)
+        if caching and _cacheable(content, cache_if):
+            get_llm_cache().set(key, content)
+        return content
+
+    return await get_single_flight().ado(key, _call, _cache_lookup(key, cache_if) if caching else None)
+
+
+async def _apost(url: str, payload: dict, guard: ModelGuard) -> str:
+    client = get_async_client()
+    attempt = 0
+    started = time.monotonic()
+    while True:
+        try:
+            response = await client.post(url, json=payload)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if attempt >= AI_ML_MAX_RETRIES:
+                _record_outcome(guard, None, started)
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+            attempt += 1
+            continue
+        except httpx.TransportError:
+            _record_outcome(guard, None, started)
+            raise
+        if response.status_code in RETRY_STATUS_CODES and attempt < AI_ML_MAX_RETRIES:
+            await asyncio.sleep(_retry_delay(attempt, response.headers.get("Retry-After")))
+            attempt += 1
+            continue
+        data = _response_json(response)
+        _record_outcome(
+            guard, response.status_code, started, data.get("usage"),
+            len(response.request.content), len(response.content),
+        )
+        response.raise_for_status()
+        return _extract_content(data)
+
+
+def run_async(coro):
+    """
+    Run a coroutine that uses achat_completion from synchronous code (Flask views)
+    and close that loop's AsyncClient before the loop goes away.
+    """
+    async def _runner():
+        try:
+            return await coro
+        finally:
+            await aclose_async_client()
+
+    return asyncio.run(_runner())
@@ -0,0 +1,101 @@
+"""
+Running headers, footers and other boilerplate in extracted PDF text.
+
+A line that appears on a large share of pages (after folding case, spacing
+and digits, so "Page 3 of 40" matches "Page 4 of 40") is boilerplate: course
+title headers, copyright footers, page numbers. Table-of-contents pages
+(mostly "Title ..... 12" lines) are dropped as a whole. Detection only needs
+a set of line hashes per page, so it can run over a sample of pages and the
+result can be cached per document.
+"""
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List
+
+from core.chunker import CHARS_PER_TOKEN
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+_TOC_LINE = re.compile(r"(\.{3,}|…|\s{3,}|\.\s\.\s\.)\s*[\divxlc]+\s*$", re.IGNORECASE)
+
+# Lines longer than this are content, even when repeated (e.g. a repeated instruction paragraph)
+MAX_BOILERPLATE_LINE = 160
+
+
+def line_key(line: str) -> str:
+    norm = _SPACES.sub(" ", _DIGITS.sub("#", line.strip().lower()))
+    return hashlib.blake2b(norm.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _lines(raw: str) -> List[str]:
+    return [l for l in raw.splitlines() if l.strip()]
+
+
+def is_toc_page(lines: List[str]) -> bool:
+    if len(lines) < 5:
+        return False
+    leaders = sum(1 for l in lines if _TOC_LINE.search(l))
+    return leaders >= 0.6 * len(lines)
+
+
+def detect(pages: Iterable[str], min_share: float = 0.5, min_pages: int = 4) -> FrozenSet[str]:
+    """Keys of lines that occur on at least min_share of the given pages."""
+    counts: Counter = Counter()
+    n = 0
+    for raw in pages:
+        if not raw:
+            continue
+        n += 1
+        counts.update({line_key(l) for l in _lines(raw) if len(l.strip()) <= MAX_BOILERPLATE_LINE})
+    if n < min_pages:
+        return frozenset()
+    threshold = max(2, min_share * n)
+    return frozenset(k for k, c in counts.items() if c >= threshold)
+
+
+class BoilerplateFilter:
+    """Removes detected lines (and ToC pages) from raw page text, counting what it dropped."""
+
+    def __init__(self, keys: FrozenSet[str]):
+        self.keys = keys
+        self.pages = 0
+        self.chars_in = 0
+        self.chars_removed = 0
+        self.lines_removed = 0
+        self.toc_pages = 0
+
+    def apply(self, raw: str) -> str:
+        if not raw:
+            return raw
+        self.pages += 1
+        self.chars_in += len(raw)
+        lines = _lines(raw)
+        if is_toc_page(lines):
+            self.toc_pages += 1
+            self.lines_removed += len(lines)
+            self.chars_removed += len(raw)
+            return ""
+        if not self.keys:
+            return raw
+        kept = []
+        for l in lines:
+            if line_key(l) in self.keys:
+                self.lines_removed += 1
+                self.chars_removed += len(l) + 1
+            else:
+                kept.append(l)
+        return "\n".join(kept)
+
+    def report(self) -> Dict:
+        tokens_in = self.chars_in // CHARS_PER_TOKEN
+        tokens_removed = self.chars_removed // CHARS_PER_TOKEN
+        return {
+            "pages": self.pages,
+            "patterns": len(self.keys),
+            "lines_removed": self.lines_removed,
+            "toc_pages": self.toc_pages,
+            "tokens_before": tokens_in,
+            "tokens_removed": tokens_removed,
+            "percent_removed": round(100.0 * tokens_removed / tokens_in, 1) if tokens_in else 0.0,
+        }
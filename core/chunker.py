@@ -0,0 +1,73 @@
+import math
+from typing import Iterable, Iterator, List
+
+# Rough English average for GPT-style BPE tokenizers; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer dependency)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def chunk_text(text: str, max_tokens: int = 3000, overlap_tokens: int = 100) -> List[str]:
+    """
+    Split text into chunks of at most ~max_tokens, preferring to cut at a
+    sentence end, then at whitespace. Consecutive chunks overlap slightly so
+    a definition cut in half still appears whole in one of them.
+    """
+    if not text:
+        return []
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    overlap_chars = max(0, min(overlap_tokens * CHARS_PER_TOKEN, max_chars // 4))
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks: List[str] = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(start + max_chars, n)
+        if end < n:
+            floor = start + int(max_chars * 0.7)
+            cut = max(text.rfind(". ", floor, end), text.rfind("? ", floor, end), text.rfind("! ", floor, end))
+            if cut != -1:
+                end = cut + 1
+            else:
+                space = text.rfind(" ", floor, end)
+                if space != -1:
+                    end = space
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= n:
+            break
+        next_start = end - overlap_chars
+        if overlap_chars:
+            space = text.find(" ", next_start, end)
+            next_start = space + 1 if space != -1 else next_start
+        start = max(next_start, start + 1)
+    return chunks
+
+
+def chunk_stream(pieces: Iterable[str], max_tokens: int = 3000, overlap_tokens: int = 100) -> Iterator[str]:
+    """
+    chunk_text over a stream of text pieces (e.g. pages from
+    pdf_tool.iter_pdf_text), buffering only about two chunks at a time.
+    Stop consuming whenever enough chunks have been produced.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    buf = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        buf = f"{buf} {piece}" if buf else piece
+        if len(buf) >= 2 * max_chars:
+            chunks = chunk_text(buf, max_tokens, overlap_tokens)
+            yield from chunks[:-1]
+            # The last chunk may continue on the next piece; it already carries the overlap
+            buf = chunks[-1]
+    if buf:
+        yield from chunk_text(buf, max_tokens, overlap_tokens)
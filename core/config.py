@@ -5,7 +5,130 @@ from dotenv import load_dotenv
 load_dotenv(override = True)
 
 AI_ML_API_KEY = os.getenv("AI_ML_API_KEY")
-AI_ML_BASE_URL = "https://api.aimlapi.com/v1"
+# Override to point at a local stand-in, e.g. benchmarks/stub_llm_server.py
+AI_ML_BASE_URL = os.getenv("AI_ML_BASE_URL", "https://api.aimlapi.com/v1").rstrip("/")
+
+# HTTP transport for chat completions (per-worker pooled session)
+AI_ML_CONNECT_TIMEOUT = float(os.getenv("AI_ML_CONNECT_TIMEOUT", "10"))
+AI_ML_READ_TIMEOUT = float(os.getenv("AI_ML_READ_TIMEOUT", "180"))
+AI_ML_MAX_RETRIES = int(os.getenv("AI_ML_MAX_RETRIES", "3"))
+AI_ML_BACKOFF_FACTOR = float(os.getenv("AI_ML_BACKOFF_FACTOR", "0.5"))
+AI_ML_POOL_SIZE = int(os.getenv("AI_ML_POOL_SIZE", "10"))
+# Upper bound on concurrent in-flight requests for achat_completion (per event loop)
+AI_ML_ASYNC_MAX_CONNECTIONS = int(os.getenv("AI_ML_ASYNC_MAX_CONNECTIONS", "50"))
+
+# Shared on-disk caches (one directory for all gunicorn workers on the host)
+CACHE_DIR = os.getenv(
+    "CACHE_DIR",
+    os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "cache"),
+)
+
+# LLM response cache: in-memory LRU in front of a size-bounded sqlite store
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256"))
+
+# Map-reduce condensation of long course material before the final prompt
+MATERIAL_TOKEN_BUDGET = int(os.getenv("MATERIAL_TOKEN_BUDGET", "24000"))
+DIGEST_CHUNK_TOKENS = int(os.getenv("DIGEST_CHUNK_TOKENS", "3000"))
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "8"))
+DIGEST_CACHE_MAX_BYTES = int(os.getenv("DIGEST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Per-model request/token budgets and circuit breaker for LLM calls.
+# LLM_RATE_LIMITS overrides per model, e.g. {"openai/gpt-5-chat-latest": {"rpm": 60, "tpm": 200000}}
+LLM_RPM = float(os.getenv("LLM_RPM", "120"))
+LLM_TPM = float(os.getenv("LLM_TPM", "400000"))
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", "30"))
+# Share buckets across gunicorn workers through sqlite in CACHE_DIR
+LLM_RATE_LIMIT_SHARED = os.getenv("LLM_RATE_LIMIT_SHARED", "0").lower() in ("1", "true", "yes")
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Collapse concurrent identical LLM calls; across workers via a sqlite lease in CACHE_DIR
+LLM_SINGLE_FLIGHT_SHARED = os.getenv("LLM_SINGLE_FLIGHT_SHARED", "1").lower() not in ("0", "false", "no")
+LLM_SINGLE_FLIGHT_LEASE_SECONDS = float(
+    os.getenv("LLM_SINGLE_FLIGHT_LEASE_SECONDS", str(AI_ML_CONNECT_TIMEOUT + AI_ML_READ_TIMEOUT))
+)
+
+# Task-kind model routing. LLM_ROUTES overrides entries of ai_client.DEFAULT_ROUTES, e.g.
+# {"field_extraction": {"model": "gpt-4o-mini", "fallback": "openai/gpt-5-chat-latest", "p95_seconds": 5}}
+LLM_ROUTES = os.getenv("LLM_ROUTES", "")
+# Latency/error samples older than this no longer count, so a demoted primary is retried
+LLM_ROUTE_WINDOW_SECONDS = float(os.getenv("LLM_ROUTE_WINDOW_SECONDS", "300"))
+LLM_ROUTE_MIN_SAMPLES = int(os.getenv("LLM_ROUTE_MIN_SAMPLES", "10"))
+LLM_ROUTE_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTE_MAX_ERROR_RATE", "0.25"))
+
+# Lesson plans of at least this many weeks (0 = never) are generated in two phases: a short
+# skeleton call, then week ranges of LESSON_PLAN_WEEKS_PER_CALL weeks written concurrently
+LESSON_PLAN_FANOUT_MIN_WEEKS = int(os.getenv("LESSON_PLAN_FANOUT_MIN_WEEKS", "12"))
+LESSON_PLAN_WEEKS_PER_CALL = int(os.getenv("LESSON_PLAN_WEEKS_PER_CALL", "4"))
+LESSON_PLAN_FANOUT_CONCURRENCY = int(os.getenv("LESSON_PLAN_FANOUT_CONCURRENCY", "6"))
+
+# Finished lesson plans keyed by PDF hash + options + model + prompt version (force=1 bypasses)
+LESSON_PLAN_CACHE_ENABLED = os.getenv("LESSON_PLAN_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LESSON_PLAN_CACHE_TTL_SECONDS = float(os.getenv("LESSON_PLAN_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+LESSON_PLAN_CACHE_MAX_BYTES = int(os.getenv("LESSON_PLAN_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# Ask for weekly_schedule entries with short keys and positional arrays (core.wire_format)
+# and expand them locally: fewer output tokens per week
+LESSON_PLAN_COMPACT_OUTPUT = os.getenv("LESSON_PLAN_COMPACT_OUTPUT", "0").lower() in ("1", "true", "yes")
+
+# Targeted repair: re-ask the model for just the invalid weeks/questions instead of regenerating everything
+REPAIR_ENABLED = os.getenv("REPAIR_ENABLED", "1").lower() not in ("0", "false", "no")
+REPAIR_MAX_FRAGMENTS = int(os.getenv("REPAIR_MAX_FRAGMENTS", "4"))
+
+# PDF text extraction: PDFs with at least this many pages are split across a process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Extracted page text and cleaned text, keyed by SHA-256 of the PDF bytes
+PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Agents stop reading a PDF after this many (estimated) tokens; the digest cannot use more
+PDF_MAX_EXTRACT_TOKENS = int(os.getenv("PDF_MAX_EXTRACT_TOKENS", "500000"))
+
+# Lines repeated on at least this share of pages (headers, footers, copyright) are dropped
+# before prompting; detection samples up to BOILERPLATE_SAMPLE_PAGES pages per document
+BOILERPLATE_ENABLED = os.getenv("BOILERPLATE_ENABLED", "1").lower() not in ("0", "false", "no")
+BOILERPLATE_MIN_SHARE = float(os.getenv("BOILERPLATE_MIN_SHARE", "0.5"))
+BOILERPLATE_SAMPLE_PAGES = int(os.getenv("BOILERPLATE_SAMPLE_PAGES", "64"))
+
+# BM25 retrieval over course material (assessment "topic"/"pages" options)
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_TOKENS", "300"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "6000"))
+RETRIEVAL_CACHE_MAX_BYTES = int(os.getenv("RETRIEVAL_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# Upload janitor: deletes files in UPLOAD_DIR that no assessments/lesson_plans row references.
+# Unreferenced files go after UPLOAD_MAX_AGE_SECONDS; above UPLOAD_MAX_BYTES (0 = no cap) the
+# least recently used unreferenced files go first, but never ones younger than the grace period.
+UPLOAD_JANITOR_ENABLED = os.getenv("UPLOAD_JANITOR_ENABLED", "1").lower() not in ("0", "false", "no")
+UPLOAD_JANITOR_INTERVAL_SECONDS = float(os.getenv("UPLOAD_JANITOR_INTERVAL_SECONDS", "3600"))
+UPLOAD_JANITOR_BATCH = int(os.getenv("UPLOAD_JANITOR_BATCH", "500"))
+UPLOAD_MAX_AGE_SECONDS = float(os.getenv("UPLOAD_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+UPLOAD_GRACE_SECONDS = float(os.getenv("UPLOAD_GRACE_SECONDS", str(24 * 3600)))
+# A cycle deletes nothing when the database reports no references, or fewer than this share
+# of the last accepted count (a lookup that silently lost rows); 0 accepts any drop
+UPLOAD_JANITOR_MIN_REFERENCE_RATIO = float(os.getenv("UPLOAD_JANITOR_MIN_REFERENCE_RATIO", "0.5"))
+
+# Background jobs for the generation endpoints: job state lives in sqlite so a restarted
+# worker's jobs are picked up again once their heartbeat goes stale
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "1").lower() not in ("0", "false", "no")
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(CACHE_DIR, "jobs.sqlite"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# An SSE response ends after this long; EventSource reconnects with Last-Event-ID.
+# Each open stream holds a sync gunicorn worker, so the browser polls /jobs/<id> by default
+JOB_SSE_MAX_SECONDS = float(os.getenv("JOB_SSE_MAX_SECONDS", "25"))
+
+# Bearer token required by GET /metrics when set (Prometheus scrape config)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 if not AI_ML_API_KEY:
-    raise ValueError("❌ Missing AI_ML_API_KEY. Please add it to your .env file")
\ No newline at end of file
+    raise ValueError("❌ Missing AI_ML_API_KEY. Please add it to your .env file")
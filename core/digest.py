@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from core.ai_client import achat_completion, run_async
+from core.chunker import CHARS_PER_TOKEN, chunk_text, estimate_tokens
+from core.config import (
+    CACHE_DIR,
+    DIGEST_CACHE_MAX_BYTES,
+    DIGEST_CHUNK_TOKENS,
+    DIGEST_CONCURRENCY,
+    MATERIAL_TOKEN_BUDGET,
+)
+from core.disk_cache import DiskCache
+from core.json_extract import parse_json_object
+from core.logger import logger
+
+# Bump when the summary prompt changes so stale summaries are not reused
+DIGEST_PROMPT_VERSION = "1"
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You condense one section of course material for a curriculum and assessment designer.\n"
+    "Return ONLY a JSON object with keys:\n"
+    "- section_title (string): chapter/section name if visible, else a short descriptive title\n"
+    "- summary (string): 120-250 words covering the concepts taught, in order\n"
+    "- key_topics (array of strings)\n"
+    "- key_terms (array of strings): definitions, formulas, named methods\n"
+    "Keep facts and terminology from the text; drop examples, exercises and filler. "
+    "Use only double quotes."
+)
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def _summary_cache() -> DiskCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache(
+                    os.path.join(CACHE_DIR, "chunk_summaries.sqlite"),
+                    max_bytes=DIGEST_CACHE_MAX_BYTES,
+                )
+    return _cache
+
+
+def _chunk_key(model: str, chunk: str) -> str:
+    h = hashlib.sha256()
+    h.update(f"{DIGEST_PROMPT_VERSION}\0{model}\0".encode("utf-8"))
+    h.update(chunk.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _format_section(index: int, summary: Dict) -> str:
+    title = summary.get("section_title") or f"Section {index}"
+    lines = [f"## {index}. {title}", str(summary.get("summary") or "").strip()]
+    if summary.get("key_topics"):
+        lines.append("Key topics: " + "; ".join(str(t) for t in summary["key_topics"]))
+    if summary.get("key_terms"):
+        lines.append("Key terms: " + "; ".join(str(t) for t in summary["key_terms"]))
+    return "\n".join(l for l in lines if l)
+
+
+def _json_object(raw: str) -> bool:
+    return parse_json_object(raw, log=False) is not None
+
+
+def _truncate(text: str, budget_tokens: int) -> str:
+    # Cut at the last section break that keeps at least half the budget
+    limit = budget_tokens * CHARS_PER_TOKEN
+    cut = text.rfind("\n\n", 0, limit)
+    return text[: cut if cut >= limit // 2 else limit].rstrip()
+
+
+async def _summarize_chunk(model: str, chunk: str, sem: asyncio.Semaphore) -> Dict:
+    key = _chunk_key(model, chunk)
+    cached = _summary_cache().get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    async with sem:
+        try:
+            raw = await achat_completion(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": chunk},
+                ],
+                temperature=0,
+                max_tokens=800,
+                cache_if=_json_object,
+            )
+            summary = parse_json_object(raw)
+            if summary is None:
+                raise ValueError("summary is not a JSON object")
+        except Exception as e:
+            # Keep the head of the chunk rather than losing the section entirely
+            logger.warning("Chunk summary failed, using excerpt instead: %s", e)
+            return {"summary": chunk[:1500]}
+
+    _summary_cache().set(key, json.dumps(summary, ensure_ascii=False).encode("utf-8"))
+    return summary
+
+
+async def abuild_digest(
+    text: str,
+    model: str,
+    budget_tokens: int = MATERIAL_TOKEN_BUDGET,
+    chunk_tokens: int = DIGEST_CHUNK_TOKENS,
+    max_rounds: int = 4,
+) -> str:
+    """
+    Map-reduce condensation of long course material.
+
+    Text that already fits budget_tokens is returned unchanged. Otherwise it is
+    split into chunks, each chunk is summarized concurrently (map), and the
+    per-section summaries are joined into one digest (reduce). While the digest
+    is over budget it is condensed again; after max_rounds, or once a round no
+    longer shrinks it, the digest is truncated to budget_tokens.
+    """
+    rounds = 0
+    while estimate_tokens(text) > budget_tokens and rounds < max_rounds:
+        before = estimate_tokens(text)
+        chunks = chunk_text(text, max_tokens=chunk_tokens)
+        logger.info(
+            "Condensing material: ~%d tokens in %d chunks (budget %d, round %d)",
+            estimate_tokens(text), len(chunks), budget_tokens, rounds + 1,
+        )
+        sem = asyncio.Semaphore(DIGEST_CONCURRENCY)
+        summaries: List[Dict] = await asyncio.gather(*(_summarize_chunk(model, c, sem) for c in chunks))
+        text = "\n\n".join(_format_section(i, s) for i, s in enumerate(summaries, 1))
+        rounds += 1
+        if estimate_tokens(text) >= before:
+            break
+    if estimate_tokens(text) > budget_tokens:
+        logger.warning(
+            "Digest still ~%d tokens after %d rounds; truncating to the %d-token budget",
+            estimate_tokens(text), rounds, budget_tokens,
+        )
+        text = _truncate(text, budget_tokens)
+    return text
+
+
+def build_digest(text: str, model: str, budget_tokens: int = MATERIAL_TOKEN_BUDGET, chunk_tokens: int = DIGEST_CHUNK_TOKENS) -> str:
+    """Blocking wrapper around abuild_digest; skips the event loop when no condensing is needed."""
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    return run_async(abuild_digest(text, model, budget_tokens, chunk_tokens))
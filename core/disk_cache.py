@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+from core.logger import logger
+
+
+class DiskCache:
+    """
+    Size-bounded key/value store in a single sqlite file.
+
+    Safe to share between gunicorn workers (sqlite handles the file locking).
+    Entries carry an optional TTL; when the total payload exceeds max_bytes the
+    least recently read entries are evicted first.
+    """
+
+    def __init__(self, path: str, max_bytes: int, default_ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL,"
+                " expires REAL"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_with_expiry(key)
+        return entry[0] if entry else None
+
+    def get_with_expiry(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        """(value, expires) for a live entry, or None; expires is a time.time() deadline or None."""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires is not None and expires < now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return value, expires
+        except sqlite3.Error as e:
+            logger.warning("DiskCache read failed (%s): %s", self.path, e)
+            return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+        if len(value) > self.max_bytes:
+            return
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed, expires)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now, now, expires),
+            )
+            self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning("DiskCache write failed (%s): %s", self.path, e)
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]], ttl: Optional[float] = None) -> None:
+        """Store several entries in one transaction with a single eviction pass."""
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+        rows = [
+            (key, sqlite3.Binary(value), len(value), now, now, expires)
+            for key, value in items
+            if len(value) <= self.max_bytes
+        ]
+        if not rows:
+            return
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created, accessed, expires)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+            self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning("DiskCache write failed (%s): %s", self.path, e)
+
+    def delete(self, key: str) -> None:
+        try:
+            self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("DiskCache delete failed (%s): %s", self.path, e)
+
+    def total_bytes(self) -> int:
+        row = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (now,))
+        total = int(conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0])
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so we are not evicting on every subsequent write
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            if total - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        logger.debug("DiskCache %s evicted %d entries (%d bytes)", self.path, len(victims), freed)
@@ -0,0 +1,352 @@
+"""
+Background jobs for long-running generation requests.
+
+A request enqueues a job (kind + JSON payload) and returns its id; worker
+threads in every web process claim queued jobs from a shared sqlite file and
+run the handler registered for the kind. Handlers report progress through
+`emit(event, data)`; the events are stored with the job so any process can
+serve them to a polling or SSE client.
+
+Each worker refreshes a heartbeat on the jobs it runs. A running job whose
+heartbeat is older than JOB_STALE_SECONDS (its process died or was
+restarted) is queued again, up to JOB_MAX_ATTEMPTS attempts.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from core.config import (
+    JOB_HEARTBEAT_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_SECONDS,
+    JOB_RETENTION_SECONDS,
+    JOB_STALE_SECONDS,
+    JOB_WORKERS,
+    JOBS_DB,
+)
+from core.logger import logger
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+Emit = Callable[[str, Any], None]
+Handler = Callable[[Dict, Emit], Dict]
+
+_handlers: Dict[str, Handler] = {}
+
+
+class JobError(Exception):
+    """Raised by a handler to fail its job with a user-facing message."""
+
+
+def job_handler(kind: str):
+    """Register `fn(payload, emit) -> result dict` as the runner for jobs of `kind`."""
+
+    def decorator(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        return fn
+
+    return decorator
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " user_id TEXT,"
+            " status TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " owner TEXT,"
+            " heartbeat REAL,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " job_id TEXT NOT NULL,"
+            " event TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " created REAL NOT NULL"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, kind: str, payload: Dict, user_id: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO jobs (id, kind, user_id, status, payload, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, user_id, QUEUED, _dumps(payload), time.time()),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def claim(self, owner: str) -> Optional[Dict]:
+        """Move the oldest queued job to running for `owner` (after requeueing stale ones)."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._requeue_stale(conn, now)
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, started = ?, attempts = attempts + 1"
+                " WHERE id = ?",
+                (RUNNING, owner, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def _requeue_stale(self, conn: sqlite3.Connection, now: float) -> None:
+        stale = conn.execute(
+            "SELECT id, attempts FROM jobs WHERE status = ? AND heartbeat < ?",
+            (RUNNING, now - JOB_STALE_SECONDS),
+        ).fetchall()
+        for row in stale:
+            if row["attempts"] >= JOB_MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished = ?, owner = NULL WHERE id = ?",
+                    (FAILED, "The worker running this job stopped responding.", now, row["id"]),
+                )
+                event, data = "done", {"status": FAILED}
+            else:
+                conn.execute("UPDATE jobs SET status = ?, owner = NULL WHERE id = ?", (QUEUED, row["id"]))
+                event, data = "retry", {"attempt": row["attempts"] + 1}
+            conn.execute(
+                "INSERT INTO job_events (job_id, event, data, created) VALUES (?, ?, ?, ?)",
+                (row["id"], event, _dumps(data), now),
+            )
+            logger.warning("Job %s lost its worker; %s", row["id"], "requeued" if event == "retry" else "failed")
+
+    def heartbeat(self, job_ids: List[str], owner: str) -> None:
+        if not job_ids:
+            return
+        marks = ",".join("?" * len(job_ids))
+        self._connect().execute(
+            f"UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ? AND id IN ({marks})",
+            (time.time(), owner, RUNNING, *job_ids),
+        )
+
+    def add_event(self, job_id: str, event: str, data: Any) -> int:
+        cur = self._connect().execute(
+            "INSERT INTO job_events (job_id, event, data, created) VALUES (?, ?, ?, ?)",
+            (job_id, event, _dumps(data), time.time()),
+        )
+        return cur.lastrowid
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict]:
+        rows = self._connect().execute(
+            "SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after),
+        ).fetchall()
+        return [{"seq": r["seq"], "event": r["event"], "data": json.loads(r["data"])} for r in rows]
+
+    def finish(self, job_id: str, owner: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        """Record the outcome; False if the job was meanwhile handed to another worker."""
+        conn = self._connect()
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, owner = NULL"
+            " WHERE id = ? AND owner = ? AND status = ?",
+            (status, _dumps(result) if result is not None else None, error, time.time(), job_id, owner, RUNNING),
+        )
+        if cur.rowcount:
+            self.add_event(job_id, "done", {"status": status})
+        return bool(cur.rowcount)
+
+    def purge(self, older_than: float) -> int:
+        conn = self._connect()
+        cutoff = time.time() - older_than
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE status IN (?, ?) AND finished < ?)",
+                (*FINISHED, cutoff),
+            )
+            cur = conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?", (*FINISHED, cutoff))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+
+class JobQueue:
+    """Worker threads that run queued jobs; one queue per process."""
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = max(1, workers)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._app = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._running: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def enqueue(self, kind: str, payload: Dict, user_id: Optional[str] = None) -> str:
+        if kind not in _handlers:
+            raise ValueError(f"No job handler registered for {kind!r}")
+        job_id = self.store.create(kind, payload, user_id)
+        self._wake.set()
+        logger.info("Queued %s job %s", kind, job_id)
+        return job_id
+
+    def start(self, app=None) -> None:
+        """Start the workers (once per process); `app` gives handlers a Flask app context."""
+        with self._lock:
+            if self._threads:
+                return
+            self._app = app
+            self.owner = f"{socket.gethostname()}:{os.getpid()}"
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            t = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _beat(self) -> None:
+        last_purge = 0.0
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            with self._lock:
+                ids = list(self._running)
+            try:
+                self.store.heartbeat(ids, self.owner)
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    self.store.purge(JOB_RETENTION_SECONDS)
+            except sqlite3.Error as e:
+                logger.warning("Job heartbeat failed: %s", e)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(self.owner)
+            except sqlite3.Error as e:
+                logger.warning("Job claim failed: %s", e)
+                job = None
+            if job is None:
+                # Local enqueues wake us at once; jobs queued by other processes are seen on the next poll
+                self._wake.wait(JOB_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict) -> None:
+        job_id = job["id"]
+        handler = _handlers.get(job["kind"])
+        with self._lock:
+            self._running[job_id] = time.time()
+        started = time.perf_counter()
+
+        def emit(event: str, data: Any) -> None:
+            self.store.add_event(job_id, event, data)
+
+        try:
+            if handler is None:
+                raise JobError(f"Unknown job kind {job['kind']!r}")
+            if self._app is not None:
+                with self._app.app_context():
+                    result = handler(job["payload"], emit)
+            else:
+                result = handler(job["payload"], emit)
+            self.store.finish(job_id, self.owner, SUCCEEDED, result=result)
+            logger.info("Job %s (%s) succeeded in %.1fs", job_id, job["kind"], time.perf_counter() - started)
+        except JobError as e:
+            self.store.finish(job_id, self.owner, FAILED, error=str(e))
+            logger.warning("Job %s (%s) failed: %s", job_id, job["kind"], e)
+        except Exception as e:
+            self.store.finish(job_id, self.owner, FAILED, error=f"Job failed: {e}")
+            logger.error("Job %s (%s) crashed: %s", job_id, job["kind"], e, exc_info=True)
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(JobStore(JOBS_DB))
+    return _queue
+
+
+def public_job(job: Dict) -> Dict:
+    """Fields of a job that are returned to its owner."""
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created": job["created"],
+        "started": job["started"],
+        "finished": job["finished"],
+        "result": job["result"],
+        "error": job["error"],
+    }
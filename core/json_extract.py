@@ -0,0 +1,111 @@
+"""
+Tolerant JSON extraction for model output.
+
+Models wrap JSON in code fences or prose, use smart quotes, leave trailing
+commas and put raw newlines inside strings. parse_json() handles all of that
+without a chain of full-string regex passes:
+
+- fast path: output that is already valid JSON goes straight to json.loads,
+  and valid JSON behind a preamble is decoded in place from its first brace
+  (raw_decode ignores whatever follows, fences and prose included);
+- otherwise one regex scan rewrites smart-quoted strings and trailing commas.
+  Strings and plain text are skipped inside the regex engine; only the fixes
+  come back to Python. The fixed text is decoded the same way, so trailing
+  prose (even prose containing "}") never reaches the decoder.
+
+Decoding is non-strict, so raw newlines and tabs inside strings pass.
+
+    plan = parse_json(raw)          # parsed value, or None
+"""
+import json
+import re
+from typing import Any, List, Optional
+
+from core.logger import logger
+
+# Everything the scan passes over: plain text, brackets, whole strings, ordinary commas
+_PLAIN = r'(?:[^",\u201c\u201d]++|"[^"\\]*+(?:\\.[^"\\]*+)*+"|,(?!\s*[}\]]))*+'
+_FIX = re.compile(
+    _PLAIN
+    + r'(?:(,)'                                           # 1: trailing comma
+    r'|([\u201c\u201d][^\u201c\u201d"\n]*[\u201c\u201d])'  # 2: string in smart quotes
+    r'|["\u201c\u201d]|\Z)',                             # unpaired quote, or the end
+    re.S,
+)
+_FENCE = "```"
+_OPEN = "{["
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+def _json_start(raw: str) -> int:
+    """Offset of the first object (or, failing that, array); inside a code fence if there is one."""
+    fence = raw.find(_FENCE)
+    if fence != -1:
+        start = raw.find("{", fence + len(_FENCE))
+        if start != -1:
+            return start
+    start = raw.find("{")
+    return start if start != -1 else raw.find("[")
+
+
+def repair_json(raw: str, start: int = 0) -> str:
+    """
+    raw from start on, with smart-quoted strings turned into JSON strings and
+    trailing commas dropped. One scan: only the fixes come back to Python.
+    Text after the JSON value is fixed too, which is harmless to raw_decode.
+    """
+    pieces: List[str] = []
+    copied = start
+    for m in _FIX.finditer(raw, start):
+        comma, smart = m.group(1, 2)
+        if comma or smart:
+            # Copy what precedes the fix, then the replacement (nothing for a trailing comma)
+            pieces.append(raw[copied:m.start(2 if smart else 1)])
+            if smart:
+                pieces.append(json.dumps(smart[1:-1], ensure_ascii=False))
+            copied = m.end()
+        elif m.end() == len(raw):
+            break
+    if not pieces:
+        return raw[start:]
+    pieces.append(raw[copied:])
+    return "".join(pieces)
+
+
+def parse_json(raw: str, log: bool = True) -> Any:
+    """Parsed value of the JSON in model output raw, or None if there is none."""
+    if not raw:
+        return None
+    stripped = raw.strip()
+    if stripped[:1] in _OPEN:
+        try:
+            return _decoder.decode(stripped)
+        except ValueError:
+            pass
+    start = _json_start(raw)
+    if start == -1:
+        if log:
+            logger.error("No JSON object could be extracted. Raw: %s", raw)
+        return None
+    # Valid JSON behind a preamble or inside a fence; whatever follows it is ignored
+    try:
+        return _decoder.raw_decode(raw, start)[0]
+    except ValueError:
+        pass
+    try:
+        return _decoder.raw_decode(repair_json(raw, start))[0]
+    except ValueError as e:
+        if log:
+            logger.error("Model output is not valid JSON (%s). Raw: %s", e, raw)
+        return None
+
+
+def parse_json_object(raw: str, log: bool = True) -> Optional[dict]:
+    """Like parse_json, but only a JSON object counts."""
+    parsed = parse_json(raw, log)
+    if parsed is not None and not isinstance(parsed, dict):
+        if log:
+            logger.error("Parsed JSON is not an object. Parsed: %s", parsed)
+        return None
+    return parsed
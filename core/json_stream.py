@@ -0,0 +1,97 @@
+import json
+from typing import Any, List
+
+from core.logger import logger
+
+
+class JsonArrayItemStream:
+    """
+    Incremental scanner that pulls finished items out of one array in a JSON
+    object while the document is still streaming in.
+
+    Feed it raw text chunks; each call returns the elements of the top-level
+    `key` array (e.g. "weekly_schedule") whose closing brace has been seen.
+    Only the element currently being read is buffered.
+
+        stream = JsonArrayItemStream("weekly_schedule")
+        for chunk in chunks:
+            for week in stream.feed(chunk):
+                ...
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_chars: List[str] = []   # string being read at depth 1 (a candidate key)
+        self._last_string = None          # last complete string at depth 1
+        self._current_key = None          # key whose value we are in at depth 1
+        self._array_depth = None          # depth inside the target array
+        self._done = False
+        self._item: List[str] = []        # chars of the element being captured
+        self._capturing = False
+        self.items_emitted = 0
+
+    @property
+    def done(self) -> bool:
+        """True once the target array has been closed."""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Any]:
+        out: List[Any] = []
+        if self._done or not chunk:
+            return out
+
+        for ch in chunk:
+            if self._capturing:
+                self._item.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and not self._capturing:
+                        self._last_string = "".join(self._key_chars)
+                elif self._depth == 1 and not self._capturing:
+                    self._key_chars.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and not self._capturing:
+                    self._key_chars = []
+            elif ch == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif ch == "," and self._depth == 1:
+                self._current_key = None
+            elif ch in "{[":
+                if (
+                    ch == "["
+                    and self._depth == 1
+                    and self._array_depth is None
+                    and self._current_key == self.key
+                ):
+                    self._array_depth = self._depth + 1
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth and not self._capturing:
+                    self._capturing = True
+                    self._item = [ch]
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._capturing and ch == "}" and self._depth == self._array_depth:
+                    self._capturing = False
+                    text = "".join(self._item)
+                    self._item = []
+                    try:
+                        out.append(json.loads(text))
+                        self.items_emitted += 1
+                    except json.JSONDecodeError as e:
+                        logger.warning("Skipping malformed streamed %s item: %s", self.key, e)
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self._done = True
+                    break
+        return out
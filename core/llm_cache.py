@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import (
+    CACHE_DIR,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_MEMORY_ITEMS,
+    LLM_CACHE_TTL_SECONDS,
+)
+from core.disk_cache import DiskCache
+
+
+def make_cache_key(model: str, messages: list, temperature: float, max_tokens: Optional[int], response_format: Any) -> str:
+    """SHA-256 over a canonical JSON encoding of everything that shapes the completion."""
+    blob = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-level completion cache: a per-process LRU in front of a DiskCache that
+    all workers on the host share. Memory entries keep the expiry of their disk
+    entry, so both levels honour the TTL. Counters are per process.
+    """
+
+    def __init__(self, disk: DiskCache, memory_items: int = 256, ttl: Optional[float] = None):
+        self.disk = disk
+        self.memory_items = memory_items
+        self.ttl = ttl
+        # key -> (value, expires); expires is a time.time() deadline or None
+        self._memory: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bytes_saved": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires >= time.time():
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    self._stats["bytes_saved"] += len(value)
+                    return value
+                del self._memory[key]
+
+        found = self.disk.get_with_expiry(key)
+        if found is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        value = found[0].decode("utf-8")
+        with self._lock:
+            self._remember(key, value, found[1])
+            self._stats["disk_hits"] += 1
+            self._stats["bytes_saved"] += len(value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.disk.set(key, value.encode("utf-8"), ttl=self.ttl)
+        with self._lock:
+            self._remember(key, value, time.time() + self.ttl if self.ttl else None)
+            self._stats["stores"] += 1
+
+    def invalidate(self, key: str) -> None:
+        """Drop key from both levels (in this process; other workers' memory entries age out)."""
+        with self._lock:
+            self._memory.pop(key, None)
+        self.disk.delete(key)
+
+    def _remember(self, key: str, value: str, expires: Optional[float]) -> None:
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["memory_items"] = len(self._memory)
+        lookups = out["memory_hits"] + out["disk_hits"] + out["misses"]
+        out["hit_ratio"] = round((out["memory_hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return out
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                disk = DiskCache(
+                    os.path.join(CACHE_DIR, "llm_responses.sqlite"),
+                    max_bytes=LLM_CACHE_MAX_BYTES,
+                )
+                _cache = LLMCache(disk, memory_items=LLM_CACHE_MEMORY_ITEMS, ttl=LLM_CACHE_TTL_SECONDS)
+    return _cache
@@ -86,6 +86,28 @@ def _looks_like_weeks(entries: List[Any]) -> bool:
     # Heuristic: dicts containing a "week" field
     return any(isinstance(e, dict) and ("week" in e or "Week" in e) for e in entries)
 
+def render_week_markdown(entry: Any) -> str:
+    """Render one weekly_schedule entry ('### Week N: topic' plus its details)."""
+    if isinstance(entry, dict):
+        wk_no = entry.get("week") or entry.get("Week") or entry.get("index") or entry.get("id")
+        topic = entry.get("topic") or entry.get("title") or entry.get("name") or ""
+        heading = f"### Week {wk_no}{(': ' + str(topic)) if topic else ''}".rstrip()
+        block = _render_kv_block(entry)
+        return f"{heading}\n\n{block}" if block else heading
+    return f"### Week entry\n\n{_as_str(entry)}"
+
+def replace_week_markdown(markdown: str, week: Any, week_md: str) -> Optional[str]:
+    """markdown with the '### Week N' block (up to the next ##/### heading) replaced by week_md; None if absent."""
+    import re
+    pattern = re.compile(rf"^### Week {re.escape(str(week))}\b.*?(?=^#{{2,3}} |\Z)", re.M | re.S)
+    m = pattern.search(markdown or "")
+    if not m:
+        return None
+    block = m.group()
+    # keep the original separator ("\n\n" between weeks, "\n\n\n" before a ## section, none at the end)
+    tail = block[len(block.rstrip()):]
+    return markdown[:m.start()] + week_md + tail + markdown[m.end():]
+
 def render_lesson_plan_markdown(plan: Dict[str, Any]) -> str:
     if not isinstance(plan, dict):
         return "### Error\nInvalid lesson plan payload."
@@ -126,17 +148,7 @@ def render_lesson_plan_markdown(plan: Dict[str, Any]) -> str:
             if _looks_like_weeks(val):
                 # use 'Week N: <topic/title>' style headings
                 for entry in val:
-                    if isinstance(entry, dict):
-                        wk_no = entry.get("week") or entry.get("Week") or entry.get("index") or entry.get("id")
-                        topic = entry.get("topic") or entry.get("title") or entry.get("name") or ""
-                        heading = f"### Week {wk_no}{(': ' + str(topic)) if topic else ''}".rstrip()
-                        out.append(heading)
-                        block = _render_kv_block(entry)
-                        if block:
-                            out.append(block)
-                    else:
-                        out.append(f"### Week entry")
-                        out.append(_as_str(entry))
+                    out.append(render_week_markdown(entry))
             else:
                 out.extend(_render_list_of_entries(val, heading_prefix=section_title[:-1] if section_title.endswith('s') else section_title))
             rendered_keys.add(wk)
@@ -0,0 +1,223 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.logger import logger
+
+# Name of the agent whose code is making LLM calls (set with @llm_agent)
+_current_agent: contextvars.ContextVar = contextvars.ContextVar("llm_agent", default="unknown")
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 180, 300)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _num(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Dict[str, str], amount: float = 1) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(k)} {_num(v)}" for k, v in items)
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with Prometheus semantics (le buckets, _sum, _count)."""
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float]):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Dict[str, str], value: float) -> None:
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts (+Inf last), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, [list(s[0]), s[1], s[2]]) for k, s in self._series.items())
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _num(bound)))} {running}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+LLM_REQUESTS = Counter("llm_requests_total", "Upstream LLM calls by model, agent and outcome.")
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM API by model, agent and kind (prompt/completion).")
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "Wall time of upstream LLM calls.", LATENCY_BUCKETS)
+LLM_PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Prompt tokens per LLM call.", TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = Histogram("llm_completion_tokens", "Completion tokens per LLM call.", TOKEN_BUCKETS)
+LLM_REQUEST_BYTES = Histogram("llm_request_bytes", "Request body size of LLM calls.", BYTE_BUCKETS)
+LLM_RESPONSE_BYTES = Histogram("llm_response_bytes", "Response body size of LLM calls.", BYTE_BUCKETS)
+LLM_REPAIR_FRAGMENTS = Counter("llm_repair_fragments_total", "Invalid output items sent for targeted repair, by agent and outcome.")
+LLM_REPAIR_TOKENS_SAVED = Counter("llm_repair_tokens_saved_total", "Estimated tokens saved by targeted repair compared with a full retry.")
+LLM_REPAIR_TOKENS_WASTED = Counter("llm_repair_tokens_wasted_total", "Estimated tokens spent on targeted repairs that left items broken.")
+
+REGISTRY = [
+    LLM_REQUESTS, LLM_TOKENS, LLM_LATENCY, LLM_PROMPT_TOKENS,
+    LLM_COMPLETION_TOKENS, LLM_REQUEST_BYTES, LLM_RESPONSE_BYTES,
+    LLM_REPAIR_FRAGMENTS, LLM_REPAIR_TOKENS_SAVED, LLM_REPAIR_TOKENS_WASTED,
+]
+
+
+def llm_agent(name: str):
+    """
+    Decorator attributing the LLM calls made inside a function (sync, async or
+    generator) to agent `name` in the metrics.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                outer = _current_agent.get()
+                _current_agent.set(name)
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _current_agent.set(outer)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                gen = fn(*args, **kwargs)
+                # Only tag the generator's own steps; the consumer runs in between
+                try:
+                    while True:
+                        outer = _current_agent.get()
+                        _current_agent.set(name)
+                        try:
+                            item = next(gen)
+                        except StopIteration:
+                            return
+                        finally:
+                            _current_agent.set(outer)
+                        yield item
+                finally:
+                    gen.close()
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            outer = _current_agent.get()
+            _current_agent.set(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_agent.set(outer)
+        return wrapper
+
+    return decorator
+
+
+def current_agent() -> str:
+    return _current_agent.get()
+
+
+def record_llm_call(
+    model: str,
+    seconds: float,
+    ok: bool,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    request_bytes: Optional[int] = None,
+    response_bytes: Optional[int] = None,
+) -> None:
+    """Record one upstream LLM call into the histograms and the Flask request totals."""
+    agent = _current_agent.get()
+    labels = {"model": model, "agent": agent}
+    LLM_REQUESTS.inc({**labels, "outcome": "ok" if ok else "error"})
+    LLM_LATENCY.observe(labels, seconds)
+    if prompt_tokens is not None:
+        LLM_PROMPT_TOKENS.observe(labels, prompt_tokens)
+        LLM_TOKENS.inc({**labels, "kind": "prompt"}, prompt_tokens)
+    if completion_tokens is not None:
+        LLM_COMPLETION_TOKENS.observe(labels, completion_tokens)
+        LLM_TOKENS.inc({**labels, "kind": "completion"}, completion_tokens)
+    if request_bytes is not None:
+        LLM_REQUEST_BYTES.observe(labels, request_bytes)
+    if response_bytes is not None:
+        LLM_RESPONSE_BYTES.observe(labels, response_bytes)
+    _add_to_request_totals(seconds, prompt_tokens, completion_tokens, request_bytes, response_bytes)
+
+
+def _add_to_request_totals(seconds, prompt_tokens, completion_tokens, request_bytes, response_bytes) -> None:
+    # Flask is optional here: the agents also run from scripts and benchmarks
+    try:
+        from flask import g, has_app_context
+    except ImportError:
+        return
+    if not has_app_context():
+        return
+    try:
+        usage = g.get("llm_usage")
+        if usage is None:
+            usage = g.llm_usage = {
+                "calls": 0, "seconds": 0.0, "prompt_tokens": 0,
+                "completion_tokens": 0, "request_bytes": 0, "response_bytes": 0,
+            }
+        usage["calls"] += 1
+        usage["seconds"] = round(usage["seconds"] + seconds, 3)
+        usage["prompt_tokens"] += prompt_tokens or 0
+        usage["completion_tokens"] += completion_tokens or 0
+        usage["request_bytes"] += request_bytes or 0
+        usage["response_bytes"] += response_bytes or 0
+    except Exception as e:
+        logger.debug("Could not attach LLM usage to request: %s", e)
+
+
+def render_prometheus() -> str:
+    """All LLM metrics of this process in Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
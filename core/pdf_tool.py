@@ -1,40 +1,421 @@
 import PyPDF2
 import re
 import logging
+import hashlib
+import json
+import os
+import threading
+import multiprocessing
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
-def extract_text_from_pdf(file_path: str) -> str:
+from core.boilerplate import BoilerplateFilter, detect
+from core.config import (
+    BOILERPLATE_ENABLED,
+    BOILERPLATE_MIN_SHARE,
+    BOILERPLATE_SAMPLE_PAGES,
+    CACHE_DIR,
+    PDF_CACHE_ENABLED,
+    PDF_CACHE_MAX_BYTES,
+    PDF_EXTRACT_WORKERS,
+    PDF_PARALLEL_MIN_PAGES,
+)
+from core.chunker import CHARS_PER_TOKEN, estimate_tokens
+from core.disk_cache import DiskCache
+
+# Bump whenever clean_text() or boilerplate removal changes so cached cleaned text is not reused
+CLEAN_TEXT_VERSION = "2"
+
+# Pages per pool task when iter_pdf_text reads ahead in parallel
+PAGES_PER_TASK = 8
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def _text_cache() -> DiskCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache(os.path.join(CACHE_DIR, "pdf_text.sqlite"), max_bytes=PDF_CACHE_MAX_BYTES)
+    return _cache
+
+
+def file_sha256(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_get(key: str) -> Optional[str]:
+    raw = _text_cache().get(key)
+    return zlib.decompress(raw).decode("utf-8") if raw is not None else None
+
+
+def _cache_set(key: str, value: str) -> None:
+    _text_cache().set(key, zlib.compress(value.encode("utf-8"), 1))
+
+
+def _cache_set_pages(digest: str, pages: Iterable[Tuple[int, str]]) -> None:
+    _text_cache().set_many(
+        (f"page:{digest}:{i}", zlib.compress(text.encode("utf-8"), 1)) for i, text in pages
+    )
+
+
+def _cached_page_count(digest: str) -> Optional[int]:
+    meta = _cache_get(f"meta:{digest}")
+    return json.loads(meta)["pages"] if meta is not None else None
+
+
+def _page_count(file_path: str, digest: Optional[str]) -> int:
+    count = _cached_page_count(digest) if digest else None
+    if count is None:
+        with open(file_path, "rb") as f:
+            count = len(PyPDF2.PdfReader(f).pages)
+    return count
+
+
+def _boilerplate_keys(file_path: str, digest: Optional[str], pages: Optional[List[str]] = None) -> FrozenSet[str]:
+    """
+    Line keys repeated across the document. Uses `pages` when the caller
+    already holds every page, otherwise an evenly spaced sample of pages.
+    """
+    if not BOILERPLATE_ENABLED:
+        return frozenset()
+    key = f"boiler:{CLEAN_TEXT_VERSION}:{BOILERPLATE_MIN_SHARE}:{digest}"
+    if digest:
+        cached = _cache_get(key)
+        if cached is not None:
+            return frozenset(json.loads(cached))
+    try:
+        if pages is None:
+            count = _page_count(file_path, digest)
+            step = max(1, count / max(1, BOILERPLATE_SAMPLE_PAGES))
+            sample = sorted({int(i * step) for i in range(min(count, BOILERPLATE_SAMPLE_PAGES))})
+            pages = _iter_raw_pages(file_path, digest, sample)
+        keys = detect(pages, BOILERPLATE_MIN_SHARE)
+    except Exception as e:
+        logging.warning(f"⚠️ Boilerplate detection failed for {file_path}: {e}")
+        return frozenset()
+    if digest:
+        _cache_set(key, json.dumps(sorted(keys)))
+    return keys
+
+
+def _log_boilerplate(file_path: str, filt: BoilerplateFilter) -> None:
+    if filt.chars_removed:
+        r = filt.report()
+        logging.info(
+            f"🧹 Boilerplate in {file_path}: removed {r['lines_removed']} lines "
+            f"({r['toc_pages']} ToC pages), ~{r['tokens_removed']} of {r['tokens_before']} tokens "
+            f"({r['percent_removed']}%)"
+        )
+
+
+def extract_text_from_pdf(file_path: str, parallel: Optional[bool] = None, use_cache: bool = True) -> str:
     """
     Extract raw text from a PDF file using PyPDF2 with error handling.
     Returns cleaned text or empty string if extraction fails.
+
+    parallel=None picks the mode from the page count (PDF_PARALLEL_MIN_PAGES);
+    True/False forces the process pool or the serial loop. Results are cached
+    by the SHA-256 of the file, so re-uploads of the same PDF skip PyPDF2.
+    """
+    caching = PDF_CACHE_ENABLED and use_cache
+    if caching:
+        try:
+            digest = file_sha256(file_path)
+        except FileNotFoundError:
+            logging.error(f"❌ PDF file not found: {file_path}")
+            return ""
+        text_key = f"text:{CLEAN_TEXT_VERSION}:{digest}"
+        cached = _cache_get(text_key)
+        if cached is not None:
+            return cached
+        pages = _pages(file_path, digest, parallel)
+    else:
+        digest = None
+        pages = extract_pages(file_path, parallel=parallel, use_cache=False)
+
+    filt = BoilerplateFilter(_boilerplate_keys(file_path, digest, pages) if pages else frozenset())
+    text = clean_text("".join(filt.apply(page) + "\n" for page in pages if page))
+    _log_boilerplate(file_path, filt)
+    if caching and text:
+        _cache_set(text_key, text)
+    return text
+
+
+def extract_pages(file_path: str, parallel: Optional[bool] = None, use_cache: bool = True) -> List[str]:
+    """Raw text of every page, in page order ("" for pages without text)."""
+    if PDF_CACHE_ENABLED and use_cache:
+        try:
+            digest = file_sha256(file_path)
+        except FileNotFoundError:
+            logging.error(f"❌ PDF file not found: {file_path}")
+            return []
+        return _pages(file_path, digest, parallel)
+    return _read_pages(file_path, parallel)
+
+
+def _pages(file_path: str, digest: str, parallel: Optional[bool]) -> List[str]:
+    # Raw pages do not depend on clean_text(), so they survive a CLEAN_TEXT_VERSION bump
+    count = _cached_page_count(digest)
+    if count is not None:
+        pages = [_cache_get(f"page:{digest}:{i}") for i in range(count)]
+        if all(p is not None for p in pages):
+            return pages
+    pages = _read_pages(file_path, parallel)
+    if any(pages):
+        _cache_set_pages(digest, enumerate(pages))
+        _cache_set(f"meta:{digest}", json.dumps({"pages": len(pages)}))
+    return pages
+
+
+def iter_pdf_text(
+    file_path: str,
+    pages: Optional[Iterable[int]] = None,
+    max_tokens: Optional[int] = None,
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """
+    Yield cleaned text one page at a time, holding only the current page.
+    Boilerplate lines are removed first (see core.boilerplate).
+
+    pages selects 0-based page indices (e.g. range(2, 10)); out-of-range
+    indices are skipped. With max_tokens the generator stops once that many
+    (estimated) tokens have been yielded, truncating the last page, so
+    callers can bail out of huge PDFs early. Pages are read from and written
+    to the same content-hash cache as extract_text_from_pdf.
     """
-    text = ""
+    digest = None
+    if PDF_CACHE_ENABLED and use_cache:
+        try:
+            digest = file_sha256(file_path)
+        except FileNotFoundError:
+            logging.error(f"❌ PDF file not found: {file_path}")
+            return
+
+    filt = BoilerplateFilter(_boilerplate_keys(file_path, digest))
+    used = 0
+    try:
+        for raw in _iter_raw_pages(file_path, digest, pages):
+            text = clean_text(filt.apply(raw))
+            if not text:
+                continue
+            if max_tokens is not None:
+                remaining = max_tokens - used
+                if estimate_tokens(text) >= remaining:
+                    if remaining > 0:
+                        yield text[: remaining * CHARS_PER_TOKEN]
+                    return
+                used += estimate_tokens(text)
+            yield text
+    finally:
+        _log_boilerplate(file_path, filt)
+
+
+def iter_pdf_pages(file_path: str, use_cache: bool = True) -> Iterator[Tuple[int, str]]:
+    """Yield (0-based page index, cleaned text) for every page with text."""
+    digest = None
+    if PDF_CACHE_ENABLED and use_cache:
+        try:
+            digest = file_sha256(file_path)
+        except FileNotFoundError:
+            logging.error(f"❌ PDF file not found: {file_path}")
+            return
+    filt = BoilerplateFilter(_boilerplate_keys(file_path, digest))
+    try:
+        for i, raw in enumerate(_iter_raw_pages(file_path, digest, None)):
+            text = clean_text(filt.apply(raw))
+            if text:
+                yield i, text
+    finally:
+        _log_boilerplate(file_path, filt)
+
+
+def _iter_raw_pages(file_path: str, digest: Optional[str], pages: Optional[Iterable[int]]) -> Iterator[str]:
+    f = None
+    reader = None
+    pending: List[Tuple[int, str]] = []
+    try:
+        count = _cached_page_count(digest) if digest else None
+        if count is None:
+            f = open(file_path, "rb")
+            reader = PyPDF2.PdfReader(f)
+            count = len(reader.pages)
+            if not count:
+                logging.warning(f"⚠️ PDF {file_path} has no pages.")
+                return
+            if digest:
+                _cache_set(f"meta:{digest}", json.dumps({"pages": count}))
+
+            workers = max(1, PDF_EXTRACT_WORKERS)
+            if pages is None and workers > 1 and count >= PDF_PARALLEL_MIN_PAGES:
+                # Nothing cached yet: read ahead in the pool, still yielding in page order
+                for i, text in enumerate(_iter_parallel(file_path, reader, count, workers)):
+                    if digest:
+                        pending.append((i, text))
+                        if len(pending) >= 32:
+                            _cache_set_pages(digest, pending)
+                            pending = []
+                    yield text
+                return
+
+        indices = range(count) if pages is None else (i for i in pages if 0 <= i < count)
+        for i in indices:
+            text = _cache_get(f"page:{digest}:{i}") if digest else None
+            if text is None:
+                if reader is None:
+                    f = open(file_path, "rb")
+                    reader = PyPDF2.PdfReader(f)
+                text = _extract_from_reader(reader, file_path, i, i + 1)[0]
+                if digest:
+                    pending.append((i, text))
+                    if len(pending) >= 32:
+                        _cache_set_pages(digest, pending)
+                        pending = []
+            yield text
+
+    except FileNotFoundError:
+        logging.error(f"❌ PDF file not found: {file_path}")
+    except Exception as e:
+        logging.error(f"❌ Error reading PDF {file_path}: {e}")
+    finally:
+        if pending:
+            _cache_set_pages(digest, pending)
+        if f is not None:
+            f.close()
+
+
+def _read_pages(file_path: str, parallel: Optional[bool] = None) -> List[str]:
     try:
         with open(file_path, "rb") as f:
             reader = PyPDF2.PdfReader(f)
 
             if not reader.pages:
                 logging.warning(f"⚠️ PDF {file_path} has no pages.")
-                return ""
-
-            for i, page in enumerate(reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                    else:
-                        logging.warning(f"⚠️ Page {i} in {file_path} has no extractable text.")
-                except Exception as e:
-                    logging.error(f"❌ Failed to extract text from page {i} of {file_path}: {e}")
-                    continue
+                return []
+
+            page_count = len(reader.pages)
+            workers = max(1, PDF_EXTRACT_WORKERS)
+            if parallel is None:
+                parallel = workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES
+            if not parallel:
+                return _extract_from_reader(reader, file_path, 0, page_count)
 
     except FileNotFoundError:
         logging.error(f"❌ PDF file not found: {file_path}")
-        return ""
+        return []
     except Exception as e:
         logging.error(f"❌ Error reading PDF {file_path}: {e}")
-        return ""
+        return []
+
+    try:
+        return _extract_parallel(file_path, page_count, workers)
+    except (BrokenProcessPool, OSError) as e:
+        logging.warning(f"⚠️ Parallel extraction of {file_path} failed ({e}); retrying serially.")
+        return _read_pages(file_path, parallel=False)
+
+
+def _extract_from_reader(reader, file_path: str, start: int, stop: int) -> List[str]:
+    pages = []
+    for i in range(start, stop):
+        try:
+            page_text = reader.pages[i].extract_text()
+            if not page_text:
+                logging.warning(f"⚠️ Page {i} in {file_path} has no extractable text.")
+            pages.append(page_text or "")
+        except Exception as e:
+            logging.error(f"❌ Failed to extract text from page {i} of {file_path}: {e}")
+            pages.append("")
+    return pages
+
+
+def _iter_parallel(file_path: str, reader, count: int, workers: int) -> Iterator[str]:
+    # Small tasks and a bounded window keep memory flat and let an early stop cancel the rest
+    tasks = iter(range(0, count, PAGES_PER_TASK))
+    window: deque = deque()
+    next_page = 0
+    try:
+        pool = _get_pool(workers)
+        for start in islice(tasks, workers * 2):
+            window.append(pool.submit(_extract_page_range, file_path, start, min(start + PAGES_PER_TASK, count)))
+        while window:
+            part = window.popleft().result()
+            start = next(tasks, None)
+            if start is not None:
+                window.append(pool.submit(_extract_page_range, file_path, start, min(start + PAGES_PER_TASK, count)))
+            for text in part:
+                next_page += 1
+                yield text
+    except (BrokenProcessPool, OSError) as e:
+        logging.warning(f"⚠️ Parallel extraction of {file_path} failed ({e}); continuing serially.")
+        _reset_pool()
+        for i in range(next_page, count):
+            yield _extract_from_reader(reader, file_path, i, i + 1)[0]
+    finally:
+        for fut in window:
+            fut.cancel()
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    # Runs in a pool process: a PdfReader cannot be pickled, so each worker opens the file itself
+    with open(file_path, "rb") as f:
+        return _extract_from_reader(PyPDF2.PdfReader(f), file_path, start, stop)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # One pool per worker process; "spawn" because forking a threaded server is unsafe
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                _pool_pid = pid
+    return _pool
+
+
+def _reset_pool() -> None:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_pid = None
+
+
+def _extract_parallel(file_path: str, page_count: int, workers: int) -> List[str]:
+    # A few ranges per worker evens out pages that are much slower than others
+    n_ranges = min(page_count, workers * 4)
+    bounds = [page_count * i // n_ranges for i in range(n_ranges + 1)]
+    pool = _get_pool(workers)
+    try:
+        futures = [pool.submit(_extract_page_range, file_path, a, b) for a, b in zip(bounds, bounds[1:])]
+        pages: List[str] = []
+        for fut in futures:
+            pages.extend(fut.result())
+        return pages
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+
+
+def shutdown_pdf_pool() -> None:
+    """Stop the extraction worker processes (benchmarks, worker shutdown)."""
+    _reset_pool()
 
-    return clean_text(text)
 
 def clean_text(raw_text: str) -> str:
     """
@@ -53,4 +434,4 @@ def clean_text(raw_text: str) -> str:
     # Strip leading/trailing spaces
     text = text.strip()
 
-    return text
\ No newline at end of file
+    return text
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from core.config import (
+    CACHE_DIR,
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_BREAKER_FAILURES,
+    LLM_RATE_LIMIT_MAX_WAIT,
+    LLM_RATE_LIMIT_SHARED,
+    LLM_RATE_LIMITS,
+    LLM_RPM,
+    LLM_TPM,
+)
+from core.logger import logger
+
+
+class RateLimitExceeded(RuntimeError):
+    """The model's request/token budget did not free up within the allowed wait."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Upstream failed repeatedly for this model; calls fail fast until the cool-down ends."""
+
+
+class TokenBucket:
+    """In-process token bucket: `rate` units per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount: float) -> float:
+        """Take `amount` if available and return 0, else return seconds until it would be."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._level >= amount:
+                self._level -= amount
+                return 0.0
+            return (amount - self._level) / self.rate
+
+    def give(self, amount: float) -> None:
+        with self._lock:
+            self._level = min(self.capacity, self._level + amount)
+
+    def level(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._level
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in sqlite so every gunicorn worker on the
+    host draws from the same budget. Same interface as TokenBucket.
+    """
+
+    def __init__(self, path: str, name: str, rate: float, capacity: float):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                (name, capacity, time.time()),
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _update(self, fn) -> Any:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            level, updated = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            now = time.time()
+            level = min(self.capacity, level + max(0.0, now - updated) * self.rate)
+            level, result = fn(level)
+            conn.execute("UPDATE buckets SET level = ?, updated = ? WHERE name = ?", (level, now, self.name))
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def take(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+
+        def _take(level):
+            if level >= amount:
+                return level - amount, 0.0
+            return level, (amount - level) / self.rate
+
+        return self._update(_take)
+
+    def give(self, amount: float) -> None:
+        self._update(lambda level: (min(self.capacity, level + amount), None))
+
+    def level(self) -> float:
+        return self._update(lambda level: (level, level))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open -> half_open
+    after `cooldown` seconds, letting one trial call through; the trial's
+    outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Give back a half-open trial slot without judging upstream health."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit opened after %d failures (cool-down %.0fs)", self.failures, self.cooldown)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def rejecting(self) -> bool:
+        """True while allow() would refuse a call (cooling down, or the half-open trial is taken); no state change."""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at < self.cooldown
+            return self.state == self.HALF_OPEN and self._trial_in_flight
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+
+class ModelGuard:
+    """Request-per-minute and token-per-minute buckets plus a circuit breaker for one model."""
+
+    def __init__(self, model: str, rpm: float, tpm: float, shared_path: Optional[str] = None):
+        self.model = model
+        if shared_path:
+            self.requests = SharedTokenBucket(shared_path, f"{model}:requests", rpm / 60.0, rpm)
+            self.tokens = SharedTokenBucket(shared_path, f"{model}:tokens", tpm / 60.0, tpm)
+        else:
+            self.requests = TokenBucket(rpm / 60.0, rpm)
+            self.tokens = TokenBucket(tpm / 60.0, tpm)
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)
+        self.throttled = 0
+        self.rejected = 0
+
+    def _try_take(self, tokens: int) -> float:
+        wait = self.requests.take(1)
+        if wait:
+            return wait
+        wait = self.tokens.take(tokens)
+        if wait:
+            self.requests.give(1)
+        return wait
+
+    def _check_breaker(self) -> None:
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(
+                f"LLM circuit open for {self.model}; retry in {self.breaker.retry_after():.0f}s"
+            )
+
+    def acquire(self, tokens: int, max_wait: float = LLM_RATE_LIMIT_MAX_WAIT) -> None:
+        """Block until the call fits both budgets (or raise RateLimitExceeded)."""
+        self._check_breaker()
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self._try_take(tokens)
+            if not wait:
+                return
+            self.throttled += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.breaker.release()  # upstream was not at fault
+                raise RateLimitExceeded(f"LLM rate budget exhausted for {self.model}")
+            time.sleep(min(wait, remaining))
+
+    async def aacquire(self, tokens: int, max_wait: float = LLM_RATE_LIMIT_MAX_WAIT) -> None:
+        """Async acquire(); waits with asyncio.sleep so the event loop keeps running."""
+        self._check_breaker()
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self._try_take(tokens)
+            if not wait:
+                return
+            self.throttled += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.breaker.release()
+                raise RateLimitExceeded(f"LLM rate budget exhausted for {self.model}")
+            await asyncio.sleep(min(wait, remaining))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests_available": round(self.requests.level(), 2),
+            "requests_capacity": self.requests.capacity,
+            "tokens_available": round(self.tokens.level(), 1),
+            "tokens_capacity": self.tokens.capacity,
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "breaker_retry_after": round(self.breaker.retry_after(), 1),
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+
+_guards: Dict[str, ModelGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def _limits_for(model: str) -> Dict[str, float]:
+    overrides = {}
+    try:
+        overrides = json.loads(LLM_RATE_LIMITS or "{}").get(model) or {}
+    except (ValueError, AttributeError):
+        logger.warning("Ignoring malformed LLM_RATE_LIMITS")
+    return {"rpm": float(overrides.get("rpm", LLM_RPM)), "tpm": float(overrides.get("tpm", LLM_TPM))}
+
+
+def get_model_guard(model: str) -> ModelGuard:
+    guard = _guards.get(model)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.get(model)
+            if guard is None:
+                limits = _limits_for(model)
+                shared = os.path.join(CACHE_DIR, "rate_limits.sqlite") if LLM_RATE_LIMIT_SHARED else None
+                guard = ModelGuard(model, limits["rpm"], limits["tpm"], shared_path=shared)
+                _guards[model] = guard
+    return guard
+
+
+def limiter_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Bucket levels and breaker state for every model used by this worker."""
+    with _guards_lock:
+        guards = dict(_guards)
+    return {model: guard.snapshot() for model, guard in guards.items()}
@@ -0,0 +1,239 @@
+"""
+Targeted repair of generated JSON.
+
+When one item of a generated array is unusable (a week object that does not
+parse, a question without an answer), re-running the whole generation costs
+the full prompt (course material included) plus the full output again. Here
+the bad items are located, each one is sent back to the model on its own with
+the item schema, and the fixed item is spliced into the result. The report
+compares the tokens spent on repair with what a full retry would have cost.
+
+    salvaged = salvage(raw, "weekly_schedule", parse)      # parse failed
+    fragments = find_fragments(doc, "weekly_schedule", check, broken)
+    report = repair_fragments(doc, "weekly_schedule", fragments, ...)
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.chunker import estimate_tokens
+from core.config import REPAIR_MAX_FRAGMENTS
+from core.logger import logger
+from core.metrics import LLM_REPAIR_FRAGMENTS, LLM_REPAIR_TOKENS_SAVED, LLM_REPAIR_TOKENS_WASTED, current_agent
+
+# parse(raw) -> parsed value or None (the agents' tolerant JSON parsers)
+Parse = Callable[[str], Any]
+# check(item, index) -> description of what is wrong with item, or None
+Check = Callable[[Any, int], Optional[str]]
+
+REPAIR_SYSTEM_PROMPT = (
+    "You fix one item of a JSON document produced by another step.\n"
+    "Return ONLY the corrected JSON value for that item: no prose, no code fences, no markdown.\n"
+    "Keep everything that is already usable; only fix or fill in what the problem describes.\n"
+    "Use only double quotes."
+)
+
+
+@dataclass
+class Fragment:
+    index: int
+    text: str
+    problem: str
+
+
+def array_item_spans(raw: str, key: str) -> Optional[Tuple[int, int, List[Tuple[int, int]]]]:
+    """
+    Locate the top-level `key` array of the first JSON object in raw.
+    Returns (open_bracket, close_bracket, [(start, end) of each item]) or None
+    if the array is missing or never closed. Items only need balanced brackets,
+    not valid JSON, so a single malformed item does not hide its neighbours.
+    """
+    start = raw.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = escape = False
+    key_chars: List[str] = []
+    last_string = current_key = None
+    open_at = None
+    spans: List[Tuple[int, int]] = []
+    item_start = None
+    last_end = None  # end of the last non-space character of the current item
+
+    for i in range(start, len(raw)):
+        ch = raw[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if depth == 1 and open_at is None:
+                    last_string = "".join(key_chars)
+            elif depth == 1 and open_at is None:
+                key_chars.append(ch)
+            if item_start is not None:
+                last_end = i + 1
+            continue
+
+        if open_at is not None and depth == 2:
+            # Directly inside the target array: item boundaries
+            if ch in ",]":
+                if item_start is not None:
+                    spans.append((item_start, last_end))
+                    item_start = None
+                if ch == "]":
+                    return open_at, i, spans
+                continue
+            if not ch.isspace() and item_start is None:
+                item_start = i
+        if item_start is not None and not ch.isspace():
+            last_end = i + 1
+
+        if ch == '"':
+            in_string = True
+            if depth == 1 and open_at is None:
+                key_chars = []
+        elif ch == ":" and depth == 1:
+            current_key = last_string
+        elif ch == "," and depth == 1:
+            current_key = None
+        elif ch in "{[":
+            if ch == "[" and depth == 1 and open_at is None and current_key == key:
+                open_at = i
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth <= 0:
+                return None
+    return None
+
+
+def salvage(raw: str, key: str, parse: Parse) -> Optional[Tuple[dict, Dict[int, str]]]:
+    """
+    For output that does not parse as a whole: parse the `key` items one by
+    one and the rest of the document with the broken items replaced by null.
+    Returns (document, {index: raw text of each broken item}) or None when
+    the damage is outside the array (then only a full retry helps).
+    """
+    located = array_item_spans(raw, key)
+    if located is None:
+        return None
+    open_at, close_at, spans = located
+    texts = [raw[s:e] for s, e in spans]
+    parts, broken = [], {}
+    for i, text in enumerate(texts):
+        try:
+            json.loads(text)
+            parts.append(text)
+        except ValueError:
+            broken[i] = text
+            parts.append("null")
+    if not broken:
+        return None
+    frame = raw[: open_at + 1] + ",".join(parts) + raw[close_at:]
+    doc = parse(frame)
+    if not isinstance(doc, dict) or not isinstance(doc.get(key), list) or len(doc[key]) != len(texts):
+        return None
+    logger.info("Salvaged %s: %d of %d items need repair", key, len(broken), len(texts))
+    return doc, broken
+
+
+def find_fragments(doc: dict, key: str, check: Check, broken: Optional[Dict[int, str]] = None) -> List[Fragment]:
+    """Items of doc[key] to repair: the unparseable ones plus those check() rejects."""
+    broken = broken or {}
+    fragments = []
+    for i, item in enumerate(doc.get(key) or []):
+        if i in broken:
+            fragments.append(Fragment(i, broken[i], "The item is not valid JSON."))
+            continue
+        problem = check(item, i)
+        if problem:
+            fragments.append(Fragment(i, json.dumps(item, ensure_ascii=False), problem))
+    return fragments
+
+
+def messages_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m.get("content") or "") for m in messages)
+
+
+def repair_messages(key: str, item_schema: str, fragment: Fragment, context: str = "") -> list:
+    user = (
+        f"Schema of one `{key}` item:\n{item_schema}\n"
+        + (f"{context}\n" if context else "")
+        + f"Problem: {fragment.problem}\n\n"
+        f"Item #{fragment.index + 1}:\n{fragment.text}"
+    )
+    return [
+        {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+        {"role": "user", "content": user},
+    ]
+
+
+def repair_fragments(
+    doc: dict,
+    key: str,
+    fragments: List[Fragment],
+    item_schema: str,
+    call: Callable[[list], str],
+    parse: Parse,
+    check: Check,
+    full_retry_tokens: int,
+    context: str = "",
+) -> Dict[str, Any]:
+    """
+    Ask the model (call(messages) -> raw text) to fix each fragment and splice
+    the fixed items into doc[key] in place. Items that stay broken are dropped
+    (null placeholders) or kept as they were (parsed items). Returns the report
+    stored as "_repair" on the result. Tokens count as saved only when every
+    fragment was repaired; otherwise the repair tokens are extra cost.
+    """
+    items = doc[key]
+    repaired, used = 0, 0
+    todo = fragments[:REPAIR_MAX_FRAGMENTS]
+    for fragment in todo:
+        messages = repair_messages(key, item_schema, fragment, context)
+        try:
+            raw = call(messages)
+        except Exception as e:
+            logger.warning("Repair of %s #%d failed: %s", key, fragment.index + 1, e)
+            continue
+        used += messages_tokens(messages) + estimate_tokens(raw or "")
+        fixed = parse(raw or "")
+        problem = "not valid JSON" if fixed is None else check(fixed, fragment.index)
+        if problem:
+            logger.warning("Repaired %s #%d still invalid: %s", key, fragment.index + 1, problem)
+            continue
+        items[fragment.index] = fixed
+        repaired += 1
+
+    failed = len(fragments) - repaired
+    complete = failed == 0
+    doc[key] = [item for item in items if item is not None]
+    report = {
+        "fragments": len(fragments),
+        "repaired": repaired,
+        "failed": failed,
+        "repair_tokens": used,
+        "full_retry_tokens": full_retry_tokens,
+        # A partial repair did not replace the retry; what it spent is extra cost
+        "tokens_saved": max(0, full_retry_tokens - used) if complete else 0,
+        "tokens_wasted": 0 if complete else used,
+    }
+    agent = current_agent()
+    LLM_REPAIR_FRAGMENTS.inc({"agent": agent, "outcome": "repaired"}, repaired)
+    LLM_REPAIR_FRAGMENTS.inc({"agent": agent, "outcome": "failed"}, failed)
+    LLM_REPAIR_TOKENS_SAVED.inc({"agent": agent}, report["tokens_saved"])
+    LLM_REPAIR_TOKENS_WASTED.inc({"agent": agent}, report["tokens_wasted"])
+    if complete:
+        logger.info(
+            "Repaired %d/%d %s items with ~%d tokens instead of a ~%d token retry",
+            repaired, len(fragments), key, used, full_retry_tokens,
+        )
+    else:
+        logger.warning(
+            "Repaired only %d/%d %s items; ~%d repair tokens spent without avoiding a retry",
+            repaired, len(fragments), key, used,
+        )
+    return report
@@ -0,0 +1,278 @@
+"""
+Local BM25 index over course material, so prompts can carry only the
+passages relevant to a topic or a page range instead of the whole PDF.
+
+Each PDF is split into small page-tagged chunks and indexed once; the index
+(postings as NumPy arrays plus the chunk texts) is stored in CACHE_DIR keyed
+by the SHA-256 of the file, next to the extracted text cache.
+"""
+import io
+import json
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from core.chunker import chunk_text, estimate_tokens
+from core.config import (
+    CACHE_DIR,
+    PDF_CACHE_ENABLED,
+    RETRIEVAL_CACHE_MAX_BYTES,
+    RETRIEVAL_CHUNK_TOKENS,
+    RETRIEVAL_TOKEN_BUDGET,
+    RETRIEVAL_TOP_K,
+)
+from core.disk_cache import DiskCache
+from core.logger import logger
+from core.pdf_tool import CLEAN_TEXT_VERSION, file_sha256, iter_pdf_pages
+
+# Bump when tokenization or the stored layout changes
+INDEX_VERSION = "1"
+
+# Standard BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from has have how in into is it its of on "
+    "or that the their there these this those to was were what when where which who why will with "
+    "you your we our they them he she his her not no so than then also about".split()
+)
+
+
+
+class NoMatchingMaterial(ValueError):
+    """The requested pages hold no text in this document."""
+
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def _index_cache() -> DiskCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache(os.path.join(CACHE_DIR, "pdf_index.sqlite"), max_bytes=RETRIEVAL_CACHE_MAX_BYTES)
+    return _cache
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def parse_pages(spec) -> Optional[Set[int]]:
+    """
+    Teacher-facing 1-based page selection ("3-7, 10" or [3, 4, 5]) to a set of
+    0-based indices. Returns None when nothing usable was given.
+    """
+    if spec is None or spec == "":
+        return None
+    if isinstance(spec, int):
+        spec = [spec]
+    if isinstance(spec, str):
+        pages: Set[int] = set()
+        for part in spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            lo, _, hi = part.partition("-")
+            try:
+                a, b = int(lo), int(hi or lo)
+            except ValueError:
+                continue
+            pages.update(range(min(a, b) - 1, max(a, b)))
+    else:
+        pages = {int(p) - 1 for p in spec}
+    pages = {p for p in pages if p >= 0}
+    return pages or None
+
+
+def format_pages(pages: Iterable[int]) -> str:
+    """0-based indices back to teacher-facing 1-based ranges ("3-7, 10")."""
+    ranges: List[List[int]] = []
+    for p in sorted(set(pages)):
+        if ranges and p == ranges[-1][1] + 1:
+            ranges[-1][1] = p
+        else:
+            ranges.append([p, p])
+    return ", ".join(f"{a + 1}-{b + 1}" if b > a else str(a + 1) for a, b in ranges)
+
+
+class LexicalIndex:
+    """BM25 over a list of chunks; postings are stored per term in CSC layout."""
+
+    def __init__(
+        self,
+        chunks: List[str],
+        chunk_pages: np.ndarray,
+        vocab: dict,
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+    ):
+        self.chunks = chunks
+        self.chunk_pages = chunk_pages
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        n = len(chunks)
+        df = np.diff(indptr).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.avg_len = float(doc_len.mean()) if n else 0.0
+
+    @classmethod
+    def build(cls, pages: Iterable[Tuple[int, str]], chunk_tokens: int = RETRIEVAL_CHUNK_TOKENS) -> "LexicalIndex":
+        chunks: List[str] = []
+        chunk_pages: List[int] = []
+        vocab: dict = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_len: List[int] = []
+        for page, text in pages:
+            for chunk in chunk_text(text, chunk_tokens, overlap_tokens=chunk_tokens // 10):
+                doc = len(chunks)
+                chunks.append(chunk)
+                chunk_pages.append(page)
+                terms = tokenize(chunk)
+                doc_len.append(len(terms))
+                for term, tf in Counter(terms).items():
+                    tid = vocab.get(term)
+                    if tid is None:
+                        tid = vocab[term] = len(postings)
+                        postings.append([])
+                    postings[tid].append((doc, tf))
+
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        flat = [pair for p in postings for pair in p]
+        doc_ids = np.fromiter((d for d, _ in flat), dtype=np.int32, count=len(flat))
+        tfs = np.fromiter((tf for _, tf in flat), dtype=np.float32, count=len(flat))
+        return cls(
+            chunks,
+            np.asarray(chunk_pages, dtype=np.int32),
+            vocab,
+            indptr,
+            doc_ids,
+            tfs,
+            np.asarray(doc_len, dtype=np.float32),
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        if not self.chunks:
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / max(self.avg_len, 1e-9))
+        for term in set(tokenize(query)):
+            tid = self.vocab.get(term)
+            if tid is None:
+                continue
+            lo, hi = self.indptr[tid], self.indptr[tid + 1]
+            docs = self.doc_ids[lo:hi]
+            tf = self.tfs[lo:hi]
+            scores[docs] += self.idf[tid] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+    def select(
+        self,
+        topic: Optional[str] = None,
+        pages: Optional[Set[int]] = None,
+        top_k: int = RETRIEVAL_TOP_K,
+        token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+    ) -> List[int]:
+        """
+        Chunk positions to send, in document order. With a topic, the top_k
+        best BM25 matches (within `pages` if given); with pages only, every
+        chunk on those pages. A topic sharing no term with the material (a
+        synonym, a typo) falls back to the allowed chunks in document order.
+        Either way capped at token_budget tokens; empty only when `pages`
+        holds no chunk.
+        """
+        allowed = np.ones(len(self.chunks), dtype=bool)
+        if pages is not None:
+            allowed &= np.isin(self.chunk_pages, np.fromiter(pages, dtype=np.int32))
+
+        if topic and topic.strip():
+            scores = self.scores(topic)
+            scores[~allowed] = -1.0
+            ranked = np.argsort(-scores, kind="stable")
+            ranked = [int(i) for i in ranked if scores[i] > 0][:top_k]
+            if not ranked:
+                logger.info("No chunk matches topic %r; using the material in document order", topic)
+                ranked = [int(i) for i in np.flatnonzero(allowed)]
+        else:
+            ranked = [int(i) for i in np.flatnonzero(allowed)]
+
+        chosen: List[int] = []
+        used = 0
+        for i in ranked:
+            cost = estimate_tokens(self.chunks[i])
+            if chosen and used + cost > token_budget:
+                break
+            chosen.append(i)
+            used += cost
+        return sorted(chosen)
+
+    def passages(self, positions: Sequence[int]) -> str:
+        return "\n\n".join(f"[Page {int(self.chunk_pages[i]) + 1}] {self.chunks[i]}" for i in positions)
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez(
+            buf,
+            chunk_pages=self.chunk_pages,
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_len=self.doc_len,
+        )
+        header = json.dumps({"chunks": self.chunks, "vocab": list(self.vocab)}).encode("utf-8")
+        return zlib.compress(len(header).to_bytes(8, "big") + header + buf.getvalue(), 1)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "LexicalIndex":
+        raw = zlib.decompress(blob)
+        size = int.from_bytes(raw[:8], "big")
+        header = json.loads(raw[8 : 8 + size])
+        arrays = np.load(io.BytesIO(raw[8 + size :]))
+        return cls(
+            header["chunks"],
+            arrays["chunk_pages"],
+            {term: i for i, term in enumerate(header["vocab"])},
+            arrays["indptr"],
+            arrays["doc_ids"],
+            arrays["tfs"],
+            arrays["doc_len"],
+        )
+
+
+def pdf_index(file_path: str, chunk_tokens: int = RETRIEVAL_CHUNK_TOKENS) -> LexicalIndex:
+    """Index of a PDF, built on first use and cached by content hash."""
+    if not PDF_CACHE_ENABLED:
+        return LexicalIndex.build(iter_pdf_pages(file_path, use_cache=False), chunk_tokens)
+
+    key = f"bm25:{INDEX_VERSION}:{CLEAN_TEXT_VERSION}:{chunk_tokens}:{file_sha256(file_path)}"
+    blob = _index_cache().get(key)
+    if blob is not None:
+        try:
+            return LexicalIndex.from_bytes(blob)
+        except (ValueError, KeyError, zlib.error) as e:
+            logger.warning("Discarding unreadable retrieval index for %s: %s", file_path, e)
+
+    index = LexicalIndex.build(iter_pdf_pages(file_path), chunk_tokens)
+    if index.chunks:
+        _index_cache().set(key, index.to_bytes())
+    return index
+
+
+def text_index(text: str, chunk_tokens: int = RETRIEVAL_CHUNK_TOKENS) -> LexicalIndex:
+    """Throwaway index over raw text (treated as a single page)."""
+    return LexicalIndex.build([(0, text)], chunk_tokens)
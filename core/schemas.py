@@ -0,0 +1,235 @@
+"""
+JSON schemas for agent outputs, compiled once with fastjsonschema.
+
+One registry backs every check on generated documents: the agents (defaults
+and the items sent to core.repair), the routes (requests that carry a plan or
+an assessment) and the Orchestrator validators.
+
+    err = schema_error("assessment", doc)   # None, or SchemaError(path, message, rule)
+    if err:
+        return {"error": err.describe()}
+
+Errors carry the path of the offending value, e.g. ("weekly_schedule", 3,
+"sections"), so callers can point at (or repair) just that part.
+"""
+import copy
+import functools
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import fastjsonschema
+
+STRINGS = {"type": "array", "items": {"type": "string"}}
+
+LESSON_WEEK = {
+    "type": "object",
+    "required": ["week", "topic"],
+    "properties": {
+        "week": {"type": ["integer", "string"]},
+        "topic": {"type": "string", "minLength": 1},
+        "learning_objectives": STRINGS,
+        "vocabulary": STRINGS,
+        "activities": {"type": "array"},
+        "timeline": {"type": "array"},
+        "materials": STRINGS,
+        "differentiation": {"type": "object"},
+        "assessment": {"type": ["object", "string"]},
+        "homework": {"type": ["object", "string"]},
+        "sections": {"type": "array", "items": {"type": "object"}},
+    },
+}
+
+LESSON_PLAN = {
+    "type": "object",
+    "required": ["weekly_schedule", "total_duration", "sections_per_week"],
+    "properties": {
+        "title": {"type": "string", "default": "Lesson Plan"},
+        "total_duration": {"type": "integer"},
+        "class_size": {"type": "integer"},
+        "sections_per_week": {"type": "integer"},
+        "weekly_schedule": {"type": "array", "minItems": 1, "items": LESSON_WEEK, "default": []},
+        "external_resources": {"type": "array", "default": []},
+    },
+}
+
+# What POST /lesson-plans/api accepts: plans saved before validation existed (and plans
+# edited by hand) may lack the totals, spell them as text or have no weeks yet
+LESSON_PLAN_SAVED = {
+    "type": "object",
+    "properties": {
+        **LESSON_PLAN["properties"],
+        "total_duration": {"type": ["integer", "string"]},
+        "class_size": {"type": ["integer", "string"]},
+        "sections_per_week": {"type": ["integer", "string"]},
+        "weekly_schedule": {"type": "array", "items": LESSON_WEEK, "default": []},
+    },
+}
+
+QUESTION = {
+    "type": "object",
+    "required": ["q", "answer"],
+    "properties": {
+        "q": {"type": "string", "minLength": 1},
+        "options": STRINGS,
+        "answer": {"type": ["string", "number", "array"], "minLength": 1, "minItems": 1},
+    },
+}
+
+QUESTION_MCQ = {
+    **QUESTION,
+    "required": ["q", "options", "answer"],
+    "properties": {**QUESTION["properties"], "options": {**STRINGS, "minItems": 2}},
+}
+
+ASSESSMENT = {
+    "type": "object",
+    "required": ["questions"],
+    "properties": {
+        "title": {"type": "string", "default": "Assessment"},
+        "type": {"type": "string"},
+        "difficulty": {"type": "string"},
+        # Saved and edited assessments may lack answers (e.g. projects); generation checks QUESTION
+        "questions": {
+            "type": "array",
+            "items": {"type": "object", "required": ["q"], "properties": {"q": {"type": "string"}}},
+            "default": [],
+        },
+        "rubric": {"type": "array"},
+    },
+}
+
+TIMETABLE = {
+    "type": "object",
+    "required": ["suggested_slots"],
+    "properties": {
+        "suggested_slots": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["start", "end", "title"],
+                "properties": {
+                    "start": {"type": "string", "minLength": 1},
+                    "end": {"type": "string", "minLength": 1},
+                    "title": {"type": "string", "minLength": 1},
+                },
+            },
+        },
+        "metadata": {"type": "object"},
+    },
+}
+
+EMAIL_DRAFT = {
+    "type": "object",
+    "required": ["subject"],
+    "properties": {
+        "subject": {"type": "string"},
+        "plain": {"type": "string"},
+        "html": {"type": "string"},
+    },
+}
+
+SCHEMAS: Dict[str, dict] = {
+    "lesson_plan": LESSON_PLAN,
+    "lesson_plan_saved": LESSON_PLAN_SAVED,
+    "lesson_week": LESSON_WEEK,
+    "assessment": ASSESSMENT,
+    "question": QUESTION,
+    "question_mcq": QUESTION_MCQ,
+    "timetable": TIMETABLE,
+    "email_draft": EMAIL_DRAFT,
+}
+
+# Compiled at import, i.e. once per worker at startup
+_VALIDATORS = {name: fastjsonschema.compile(schema) for name, schema in SCHEMAS.items()}
+
+
+@dataclass(frozen=True)
+class SchemaError:
+    schema: str
+    path: Tuple[Any, ...]
+    message: str
+    rule: str
+
+    def describe(self) -> str:
+        where = "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in self.path).lstrip(".")
+        return f"{where or 'document'}: {self.message}"
+
+    def to_dict(self) -> dict:
+        return {"schema": self.schema, "path": list(self.path), "message": self.message, "rule": self.rule}
+
+
+@functools.lru_cache(maxsize=16)
+def week_validator(sections_per_week: int):
+    """lesson_week with exactly sections_per_week sections (the prompt asks for that many)."""
+    schema = copy.deepcopy(LESSON_WEEK)
+    schema["required"] = schema["required"] + ["sections"]
+    schema["properties"]["sections"].update(minItems=sections_per_week, maxItems=sections_per_week)
+    return fastjsonschema.compile(schema)
+
+
+def _error(name: str, validate, doc) -> Optional[SchemaError]:
+    try:
+        validate(doc)
+        return None
+    except fastjsonschema.JsonSchemaValueException as e:
+        # e.path starts with the root name ("data")
+        message = e.message[len(e.name):].strip() if e.name and e.message.startswith(e.name) else e.message
+        path = tuple(int(p) if isinstance(p, str) and p.isdigit() else p for p in e.path[1:])
+        return SchemaError(name, path, message, e.rule or "")
+
+
+def schema_error(name: str, doc: Any) -> Optional[SchemaError]:
+    """First violation of schema `name` in doc, or None if doc is valid."""
+    return _error(name, _VALIDATORS[name], doc)
+
+
+def is_valid(name: str, doc: Any) -> bool:
+    try:
+        _VALIDATORS[name](doc)
+        return True
+    except fastjsonschema.JsonSchemaValueException:
+        return False
+
+
+def week_error(entry: Any, sections_per_week: int) -> Optional[SchemaError]:
+    try:
+        validate = week_validator(int(sections_per_week))
+    except (TypeError, ValueError):
+        validate = _VALIDATORS["lesson_week"]
+    return _error("lesson_week", validate, entry)
+
+
+_LEADING_INT = re.compile(r"\s*(\d+)")
+
+
+def coerce_integers(name: str, doc: dict) -> dict:
+    """
+    Turn top-level values that schema `name` types as integer but that arrive as
+    text or floats ("16 weeks", "30", 2.0) into ints, in place. Anything else is
+    left for validation to report.
+    """
+    for key, prop in SCHEMAS[name].get("properties", {}).items():
+        if prop.get("type") != "integer" or key not in doc:
+            continue
+        value = doc[key]
+        if isinstance(value, float) and value.is_integer():
+            doc[key] = int(value)
+        elif isinstance(value, str):
+            m = _LEADING_INT.match(value)
+            if m:
+                doc[key] = int(m.group(1))
+    return doc
+
+
+def fill_defaults(name: str, doc: dict, **values) -> dict:
+    """
+    Set missing top-level keys of doc: first from values (defaults that depend
+    on the request, e.g. total_duration), then from the schema's "default"s.
+    """
+    for key, value in values.items():
+        doc.setdefault(key, value)
+    for key, prop in SCHEMAS[name].get("properties", {}).items():
+        if key not in doc and "default" in prop:
+            doc[key] = copy.deepcopy(prop["default"])
+    return doc
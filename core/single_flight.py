@@ -0,0 +1,231 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.config import CACHE_DIR, LLM_SINGLE_FLIGHT_LEASE_SECONDS, LLM_SINGLE_FLIGHT_SHARED
+from core.logger import logger
+
+# How often a waiting worker looks for the lease holder's result
+PEER_POLL_SECONDS = 0.25
+
+
+class SqliteLease:
+    """
+    Per-key leases in a sqlite file shared by every worker on the host.
+    A lease expires after `ttl` seconds so a crashed holder cannot block a key forever.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        return conn
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        """Take the lease unless another worker holds an unexpired one."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] != self.owner and row[1] > now:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                (key, self.owner, now + ttl),
+            )
+            conn.execute("COMMIT")
+            return True
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Coordination is an optimisation; never fail the call over it
+            logger.warning("Lease acquire failed (%s): %s", self.path, e)
+            return True
+
+    def held_by_peer(self, key: str) -> bool:
+        try:
+            row = self._connect().execute("SELECT owner, expires FROM leases WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None and row[0] != self.owner and row[1] > time.time()
+
+    def release(self, key: str) -> None:
+        try:
+            self._connect().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error as e:
+            logger.warning("Lease release failed (%s): %s", self.path, e)
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+
+    Within a process, the first caller for a key (the leader) runs the call and
+    every concurrent caller with the same key waits on the leader's Future.
+    When a lease store is configured, the leader also takes a cross-worker lease;
+    a leader in another worker that finds the lease taken polls `lookup` (the
+    shared response cache) for the holder's result instead of calling upstream.
+    """
+
+    def __init__(self, lease: Optional[SqliteLease] = None, lease_ttl: float = 300.0):
+        self.lease = lease
+        self.lease_ttl = lease_ttl
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "joined": 0, "peer_waits": 0, "peer_hits": 0}
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """Return (future, is_leader). The leader must call resolve() exactly once."""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self._stats["joined"] += 1
+                return fut, False
+            fut = Future()
+            fut.set_running_or_notify_cancel()  # a cancelled follower must not cancel the shared call
+            self._calls[key] = fut
+            self._stats["leaders"] += 1
+            return fut, True
+
+    def resolve(self, key: str, fut: Future, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def peer_result(self, key: str, lookup: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """
+        Take the cross-worker lease, or wait for the worker holding it.
+        Returns the peer's result, or None when the caller should make the call
+        itself (and release() afterwards).
+        """
+        if self.lease is None or self.lease.acquire(key, self.lease_ttl):
+            return None
+        self._count("peer_waits")
+        deadline = time.monotonic() + self.lease_ttl
+        while time.monotonic() < deadline:
+            time.sleep(PEER_POLL_SECONDS)
+            value = lookup()
+            if value is not None:
+                self._count("peer_hits")
+                return value
+            if not self.lease.held_by_peer(key):
+                break
+        value = lookup()
+        if value is not None:
+            self._count("peer_hits")
+            return value
+        self.lease.acquire(key, self.lease_ttl)
+        return None
+
+    async def apeer_result(self, key: str, lookup: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """
+        Async peer_result(); polls with asyncio.sleep so the event loop keeps running.
+        The sqlite lease and the lookup (the disk cache) run in worker threads.
+        """
+        if self.lease is None or await asyncio.to_thread(self.lease.acquire, key, self.lease_ttl):
+            return None
+        self._count("peer_waits")
+        deadline = time.monotonic() + self.lease_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(PEER_POLL_SECONDS)
+            value = await asyncio.to_thread(lookup)
+            if value is not None:
+                self._count("peer_hits")
+                return value
+            if not await asyncio.to_thread(self.lease.held_by_peer, key):
+                break
+        value = await asyncio.to_thread(lookup)
+        if value is not None:
+            self._count("peer_hits")
+            return value
+        await asyncio.to_thread(self.lease.acquire, key, self.lease_ttl)
+        return None
+
+    def release(self, key: str) -> None:
+        if self.lease is not None:
+            self.lease.release(key)
+
+    def do(self, key: str, fn: Callable[[], Any], lookup: Optional[Callable[[], Optional[Any]]] = None) -> Any:
+        """Run fn() once per key across concurrent callers and return its result to all of them."""
+        fut, leader = self.claim(key)
+        if not leader:
+            return fut.result()
+        try:
+            result = self.peer_result(key, lookup) if lookup is not None else None
+            if result is None:
+                try:
+                    result = fn()
+                finally:
+                    if lookup is not None:
+                        self.release(key)
+        except BaseException as e:
+            self.resolve(key, fut, exc=e)
+            raise
+        self.resolve(key, fut, result)
+        return result
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]], lookup: Optional[Callable[[], Optional[Any]]] = None) -> Any:
+        """Async do(); followers may live on other threads or event loops."""
+        fut, leader = self.claim(key)
+        if not leader:
+            return await asyncio.wrap_future(fut)
+        try:
+            result = await self.apeer_result(key, lookup) if lookup is not None else None
+            if result is None:
+                try:
+                    result = await fn()
+                finally:
+                    if lookup is not None:
+                        await asyncio.to_thread(self.release, key)
+        except BaseException as e:
+            self.resolve(key, fut, exc=e)
+            raise
+        self.resolve(key, fut, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = len(self._calls)
+        return out
+
+
+_flight: Optional[SingleFlight] = None
+_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    global _flight
+    if _flight is None:
+        with _flight_lock:
+            if _flight is None:
+                lease = SqliteLease(os.path.join(CACHE_DIR, "inflight.sqlite")) if LLM_SINGLE_FLIGHT_SHARED else None
+                _flight = SingleFlight(lease, lease_ttl=LLM_SINGLE_FLIGHT_LEASE_SECONDS)
+    return _flight
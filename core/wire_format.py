@@ -0,0 +1,120 @@
+"""
+Compact wire formats for generated JSON.
+
+Output tokens dominate generation time, and in a long lesson plan much of the
+output is the same verbose keys ("support_strategies",
+"estimated_time_minutes", ...) repeated for every week. A WireFormat maps each
+field to a short key, and arrays of small records to positional arrays, so the
+model can write less; expand() restores the full shape locally before anything
+else (repair, schemas, md_render, templates) sees the document.
+
+    LESSON_WEEK_WIRE.legend()        # key table for the prompt
+    week = LESSON_WEEK_WIRE.expand({"w": 1, "t": "Cells", "a": [["Lab", 30, "Hands-on"]]})
+    # {"week": 1, "topic": "Cells", "activities": [{"name": "Lab", "duration_minutes": 30, "type": "Hands-on"}]}
+
+Expansion is tolerant: keys that are already full names (or unknown) pass
+through, and records that are already objects are kept as they are.
+"""
+from typing import Any, Dict, Optional, Tuple, Union
+
+# A field maps to its short key, optionally with how its value is written:
+#   "w"                                 plain value
+#   ("d", {...})                        object (or array of objects) with short keys of its own
+#   ("a", ("name", "duration_minutes"))  array of positional records, in this field order
+FieldSpec = Union[str, Tuple[str, Any]]
+
+
+class WireFormat:
+    def __init__(self, fields: Dict[str, FieldSpec]):
+        self.fields: Dict[str, Tuple[str, Any]] = {}
+        for full, spec in fields.items():
+            short, sub = (spec, None) if isinstance(spec, str) else spec
+            if isinstance(sub, dict):
+                sub = WireFormat(sub)
+            self.fields[full] = (short, sub)
+        self._by_short = {short: (full, sub) for full, (short, sub) in self.fields.items()}
+        # A short key must name one field only, and never another field's full name
+        clash = [s for s, (full, _) in self._by_short.items() if s in self.fields and s != full]
+        if len(self._by_short) != len(self.fields) or clash:
+            raise ValueError(f"Ambiguous short keys in wire format: {clash or list(fields)}")
+
+    def expand(self, obj: Any) -> Any:
+        """obj (an object or array of objects) with full keys and positional records as objects."""
+        if isinstance(obj, list):
+            return [self.expand(item) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        out = {}
+        for key, value in obj.items():
+            full, sub = self._by_short.get(key) or (key, self.fields.get(key, (None, None))[1])
+            out[full] = _expand_value(value, sub)
+        return out
+
+    def compact(self, obj: Any) -> Any:
+        """Inverse of expand: what the model is asked to write."""
+        if isinstance(obj, list):
+            return [self.compact(item) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        out = {}
+        for key, value in obj.items():
+            short, sub = self.fields.get(key) or (key, None)
+            out[short] = _compact_value(value, sub)
+        return out
+
+    def legend(self, indent: str = "    ") -> str:
+        """One "short = field" line per field, nested formats indented under their field."""
+        lines = []
+        for full, (short, sub) in self.fields.items():
+            if isinstance(sub, WireFormat):
+                lines.append(f"{indent}{short} = {full}, with keys:\n" + sub.legend(indent + "  "))
+            elif sub:
+                lines.append(f"{indent}{short} = {full}, as an array of [{', '.join(sub)}] arrays\n")
+            else:
+                lines.append(f"{indent}{short} = {full}\n")
+        return "".join(lines)
+
+
+def _expand_value(value: Any, sub: Optional[Any]) -> Any:
+    if isinstance(sub, WireFormat):
+        return sub.expand(value)
+    if sub and isinstance(value, list):
+        return [dict(zip(sub, record)) if isinstance(record, list) else record for record in value]
+    return value
+
+
+def _compact_value(value: Any, sub: Optional[Any]) -> Any:
+    if isinstance(sub, WireFormat):
+        return sub.compact(value)
+    if sub and isinstance(value, list):
+        return [[record.get(name) for name in sub] if isinstance(record, dict) else record for record in value]
+    return value
+
+
+# One weekly_schedule entry of a lesson plan (agents.lesson_plan_agent.WEEK_FIELDS)
+LESSON_WEEK_WIRE = WireFormat({
+    "week": "w",
+    "topic": "t",
+    "learning_objectives": "o",
+    "vocabulary": "v",
+    "activities": ("a", ("name", "duration_minutes", "type")),
+    "timeline": ("tl", ("time_range", "activity", "instructor_notes")),
+    "materials": "m",
+    "differentiation": ("d", {
+        "support_strategies": "s",
+        "challenge_strategies": "c",
+        "accommodations": "ac",
+    }),
+    "assessment": ("as", {
+        "type": "k",
+        "questions_or_tasks": "q",
+        "rubric": "r",
+        "duration_minutes": "min",
+    }),
+    "homework": ("h", {
+        "tasks": "t",
+        "estimated_time_minutes": "min",
+        "due_date_offset_days": "due",
+    }),
+    "sections": ("s", ("section_number", "title", "activities", "materials", "assessment")),
+})
@@ -0,0 +1,45 @@
+-- ================================================
+-- PATCH ONE WEEK OF A SAVED LESSON PLAN
+-- Used by POST /lesson-plans/api/<id>/weeks/<n>/regenerate:
+-- replaces result.weekly_schedule[week_index] (and the stored
+-- _markdown, if given) in place instead of rewriting the whole plan.
+-- Returns the number of rows updated: 0 when the plan is gone (or
+-- not visible to the caller) or when the entry at week_index is no
+-- longer week expected_week.
+-- ================================================
+
+-- The return type changed from void; CREATE OR REPLACE cannot change it
+DROP FUNCTION IF EXISTS public.patch_lesson_plan_week(UUID, INT, JSONB, TEXT);
+
+CREATE OR REPLACE FUNCTION public.patch_lesson_plan_week(
+    plan_id UUID,
+    week_index INT,
+    week JSONB,
+    markdown TEXT DEFAULT NULL,
+    expected_week INT DEFAULT NULL
+)
+RETURNS INT AS $$
+DECLARE
+    updated INT;
+BEGIN
+    -- SECURITY INVOKER: the lesson_plans RLS policies still apply
+    UPDATE public.lesson_plans
+    SET result = CASE
+        WHEN markdown IS NULL
+            THEN jsonb_set(result, ARRAY['weekly_schedule', week_index::TEXT], week)
+        ELSE jsonb_set(
+            jsonb_set(result, ARRAY['weekly_schedule', week_index::TEXT], week),
+            '{_markdown}', to_jsonb(markdown)
+        )
+    END
+    WHERE id = plan_id
+      AND jsonb_typeof(result -> 'weekly_schedule' -> week_index) = 'object'
+      AND (expected_week IS NULL
+           OR result -> 'weekly_schedule' -> week_index ->> 'week' = expected_week::TEXT);
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Grant execute permission to authenticated users
+GRANT EXECUTE ON FUNCTION public.patch_lesson_plan_week(UUID, INT, JSONB, TEXT, INT) TO anon, authenticated;
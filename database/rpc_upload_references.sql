@@ -0,0 +1,23 @@
+-- ================================================
+-- FILE NAMES OF EVERY SAVED UPLOAD
+-- Used by the upload janitor (utils/upload_janitor.py), which runs
+-- outside any request and so has no user context: it must see the
+-- pdf_path of every user's assessments and lesson plans, or it would
+-- delete files that other users' rows still point at
+-- ================================================
+
+CREATE OR REPLACE FUNCTION public.upload_reference_names()
+RETURNS TEXT[] AS $$
+    -- SECURITY DEFINER: bypasses the per-user RLS policies.
+    -- Only file names (content hashes) leave the function, never rows.
+    -- One array rather than a set of rows, so no max-rows page limit applies
+    SELECT COALESCE(array_agg(DISTINCT regexp_replace(pdf_path, '^.*[/\\]', '')), ARRAY[]::TEXT[])
+    FROM (
+        SELECT pdf_path FROM public.assessments WHERE pdf_path IS NOT NULL AND pdf_path <> ''
+        UNION ALL
+        SELECT pdf_path FROM public.lesson_plans WHERE pdf_path IS NOT NULL AND pdf_path <> ''
+    ) refs;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Grant execute permission to the app's roles
+GRANT EXECUTE ON FUNCTION public.upload_reference_names() TO anon, authenticated;
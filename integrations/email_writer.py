@@ -4,13 +4,15 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import json
 import re
 from typing import Dict, Any
-from core.ai_client import chat_completion
+from core.ai_client import chat_completion, achat_completion, route_model
+from core.json_extract import parse_json_object
 from core.logger import logger
+from core.metrics import llm_agent
 
 
+@llm_agent("email")
 def parse_prompt_to_fields(prompt: str) -> Dict[str, str]:
     """
     Parse user prompt to extract email fields using AI.
@@ -27,55 +29,88 @@ def parse_prompt_to_fields(prompt: str) -> Dict[str, str]:
     try:
         logger.debug("Parsing email prompt: %s", prompt[:100] + "..." if len(prompt) > 100 else prompt)
         
-        system_prompt = (
-            "Extract email-send intent from a single user instruction. "
-            "Return compact JSON with keys: to_email, to_name, tone, cc, bcc, action, subject_override, notes. "
-            "cc/bcc must be comma-separated strings or empty. "
-            "If an item is missing, set it to an empty string. DO NOT invent emails."
-        )
-
+        model, max_tokens = route_model("field_extraction")
         response = chat_completion(
-            model="openai/gpt-5-chat-latest",
-            messages=[
-                {"role": "system", "content": system_prompt}, 
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
+            model=model,
+            messages=_parse_messages(prompt),
+            temperature=0,
+            max_tokens=max_tokens,
+            cache_if=_json_object
         )
-        
-        try:
-            data = json.loads(response)
-            logger.debug("AI parsing successful: %s", data)
-        except json.JSONDecodeError as e:
-            logger.error("Failed to parse AI response as JSON: %s", e)
-            raise ValueError(f"AI response parsing failed: {e}")
-
-        # Fallback: regex email extraction if AI missed it
-        if not data.get("to_email"):
-            logger.warning("AI did not extract email, attempting regex fallback")
-            email_match = re.search(r"[\w\.-]+@[\w\.-]+\.\w+", prompt)
-            if email_match:
-                data["to_email"] = email_match.group(0)
-                logger.info("Email extracted via regex: %s", data["to_email"])
-            else:
-                logger.warning("No email found in prompt via AI or regex")
-
-        # Normalize and validate data
-        data["action"] = (data.get("action") or "send").lower()
-        data["tone"] = data.get("tone") or "professional, friendly"
-        
-        # Ensure all fields are strings
-        for key in ("cc", "bcc", "to_name", "subject_override", "notes"):
-            data[key] = (data.get(key) or "").strip()
-            
-        logger.info("Email fields parsed successfully: %s", list(data.keys()))
-        return data
+        return _normalize_fields(response, prompt)
         
     except Exception as e:
         logger.error("Failed to parse email prompt: %s", e, exc_info=True)
         raise RuntimeError(f"Email prompt parsing failed: {e}")
 
 
+@llm_agent("email")
+async def aparse_prompt_to_fields(prompt: str) -> Dict[str, str]:
+    """Async variant of parse_prompt_to_fields."""
+    try:
+        logger.debug("Parsing email prompt (async): %s", prompt[:100] + "..." if len(prompt) > 100 else prompt)
+        model, max_tokens = route_model("field_extraction")
+        response = await achat_completion(
+            model=model,
+            messages=_parse_messages(prompt),
+            temperature=0,
+            max_tokens=max_tokens,
+            cache_if=_json_object
+        )
+        return _normalize_fields(response, prompt)
+
+    except Exception as e:
+        logger.error("Failed to parse email prompt: %s", e, exc_info=True)
+        raise RuntimeError(f"Email prompt parsing failed: {e}")
+
+
+def _json_object(response: str) -> bool:
+    # cache_if for the calls below: only responses the normalizers can parse are cached
+    return parse_json_object(response, log=False) is not None
+
+
+def _parse_messages(prompt: str) -> list:
+    system_prompt = (
+        "Extract email-send intent from a single user instruction. "
+        "Return compact JSON with keys: to_email, to_name, tone, cc, bcc, action, subject_override, notes. "
+        "cc/bcc must be comma-separated strings or empty. "
+        "If an item is missing, set it to an empty string. DO NOT invent emails."
+    )
+    return [
+        {"role": "system", "content": system_prompt}, 
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _normalize_fields(response: str, prompt: str) -> Dict[str, str]:
+    data = parse_json_object(response)
+    if data is None:
+        raise ValueError("AI response parsing failed: no JSON object in the response")
+    logger.debug("AI parsing successful: %s", data)
+
+    # Fallback: regex email extraction if AI missed it
+    if not data.get("to_email"):
+        logger.warning("AI did not extract email, attempting regex fallback")
+        email_match = re.search(r"[\w\.-]+@[\w\.-]+\.\w+", prompt)
+        if email_match:
+            data["to_email"] = email_match.group(0)
+            logger.info("Email extracted via regex: %s", data["to_email"])
+        else:
+            logger.warning("No email found in prompt via AI or regex")
+
+    # Normalize and validate data
+    data["action"] = (data.get("action") or "send").lower()
+    data["tone"] = data.get("tone") or "professional, friendly"
+    
+    # Ensure all fields are strings
+    for key in ("cc", "bcc", "to_name", "subject_override", "notes"):
+        data[key] = (data.get(key) or "").strip()
+        
+    logger.info("Email fields parsed successfully: %s", list(data.keys()))
+    return data
+
+
+@llm_agent("email")
 def draft_email(to_name: str, instruction: str, tone: str = "professional, friendly") -> Dict[str, str]:
     """
     Generate email content using AI.
@@ -94,57 +129,86 @@ def draft_email(to_name: str, instruction: str, tone: str = "professional, frien
     try:
         logger.debug("Drafting email for %s with instruction: %s", to_name, instruction[:100] + "..." if len(instruction) > 100 else instruction)
         
-        system_prompt = (
-            "You write concise, polite emails. "
-            "Return JSON with keys: subject, plain, html. "
-            "Keep emails professional and to the point."
+        model, max_tokens = route_model("email_draft")
+        response = chat_completion(
+            model=model,
+            messages=_draft_messages(to_name, instruction, tone),
+            temperature=0.4,
+            max_tokens=max_tokens,
+            cache_if=_json_object
         )
+        return _normalize_draft(response, to_name, instruction)
         
-        user_prompt = f"""
+    except Exception as e:
+        logger.error("Failed to draft email: %s", e, exc_info=True)
+        raise RuntimeError(f"Email drafting failed: {e}")
+
+
+@llm_agent("email")
+async def adraft_email(to_name: str, instruction: str, tone: str = "professional, friendly") -> Dict[str, str]:
+    """
+    Async variant of draft_email, for fanning out many drafts with asyncio.gather.
+    """
+    try:
+        logger.debug("Drafting email (async) for %s", to_name)
+        model, max_tokens = route_model("email_draft")
+        response = await achat_completion(
+            model=model,
+            messages=_draft_messages(to_name, instruction, tone),
+            temperature=0.4,
+            max_tokens=max_tokens,
+            cache_if=_json_object
+        )
+        return _normalize_draft(response, to_name, instruction)
+
+    except Exception as e:
+        logger.error("Failed to draft email: %s", e, exc_info=True)
+        raise RuntimeError(f"Email drafting failed: {e}")
+
+
+def _draft_messages(to_name: str, instruction: str, tone: str) -> list:
+    system_prompt = (
+        "You write concise, polite emails. "
+        "Return JSON with keys: subject, plain, html. "
+        "Keep emails professional and to the point."
+    )
+    
+    user_prompt = f"""
 Recipient name: {to_name or 'there'}
 Instruction / purpose: {instruction}
 Tone: {tone}
 Length: 120-180 words. Avoid flowery language.
 """
+    return [
+        {"role": "system", "content": system_prompt}, 
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _normalize_draft(response: str, to_name: str, instruction: str) -> Dict[str, str]:
+    data = parse_json_object(response)
+    if data is None:
+        raise ValueError("AI email response parsing failed: no JSON object in the response")
+    logger.debug("AI email drafting successful")
+
+    # Ensure all required fields are present with fallbacks
+    result = {
+        "subject": data.get("subject", "Hello"),
+        "plain": data.get("plain") or data.get("body", ""),
+        "html": data.get("html", ""),
+    }
+    
+    # Validate content
+    if not result["plain"].strip():
+        logger.warning("AI generated empty plain text, using fallback")
+        result["plain"] = f"Hello {to_name or 'there'},\n\n{instruction}\n\nBest regards"
         
-        response = chat_completion(
-            model="openai/gpt-5-chat-latest",
-            messages=[
-                {"role": "system", "content": system_prompt}, 
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.4
-        )
-        
-        try:
-            data = json.loads(response)
-            logger.debug("AI email drafting successful")
-        except json.JSONDecodeError as e:
-            logger.error("Failed to parse AI email response as JSON: %s", e)
-            raise ValueError(f"AI email response parsing failed: {e}")
-
-        # Ensure all required fields are present with fallbacks
-        result = {
-            "subject": data.get("subject", "Hello"),
-            "plain": data.get("plain") or data.get("body", ""),
-            "html": data.get("html", ""),
-        }
-        
-        # Validate content
-        if not result["plain"].strip():
-            logger.warning("AI generated empty plain text, using fallback")
-            result["plain"] = f"Hello {to_name or 'there'},\n\n{instruction}\n\nBest regards"
-            
-        if not result["subject"].strip():
-            logger.warning("AI generated empty subject, using fallback")
-            result["subject"] = "Message from AI Teaching Companion"
-            
-        logger.info("Email content drafted successfully with subject: %s", result["subject"])
-        return result
+    if not result["subject"].strip():
+        logger.warning("AI generated empty subject, using fallback")
+        result["subject"] = "Message from AI Teaching Companion"
         
-    except Exception as e:
-        logger.error("Failed to draft email: %s", e, exc_info=True)
-        raise RuntimeError(f"Email drafting failed: {e}")
+    logger.info("Email content drafted successfully with subject: %s", result["subject"])
+    return result
 
 
 # Test code - only run if this file is executed directly
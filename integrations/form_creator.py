@@ -6,6 +6,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from googleapiclient.errors import HttpError
 from core.google_client import get_google_service
+from core.json_extract import parse_json
+from core.schemas import schema_error
 from core.logger import logger
 import json, re
 
@@ -25,9 +27,10 @@ def create_google_form(assessment_json, title="Auto Assessment"):
             if isinstance(assessment_json, dict) and assessment_json.get("error"):
                 return assessment_json
 
-        if not isinstance(assessment_json, dict) or "questions" not in assessment_json:
-            logger.warning("Invalid assessment JSON: %s", assessment_json)
-            return {"success": False, "error": "Invalid assessment JSON. Missing 'questions'."}
+        err = schema_error("assessment", assessment_json)
+        if err:
+            logger.warning("Invalid assessment JSON (%s): %s", err.describe(), assessment_json)
+            return {"success": False, "error": f"Invalid assessment JSON ({err.describe()})."}
 
         form_title = assessment_json.get("title", title)
         default_points = _default_points_from_rubric(assessment_json.get("rubric", []))
@@ -193,19 +196,11 @@ def create_google_form(assessment_json, title="Auto Assessment"):
 
 # helpers (same as before)
 def _safe_parse_json_string(s: str):
-    try:
-        cleaned = s.strip()
-        m = re.search(r"```(?:json)?\s*([\s\S]*?)```", cleaned, re.IGNORECASE)
-        if m:
-            cleaned = m.group(1).strip()
-        if not cleaned.startswith("{"):
-            start, end = cleaned.find("{"), cleaned.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                cleaned = cleaned[start:end+1]
-        return json.loads(cleaned)
-    except Exception as e:
-        logger.error("Failed to parse assessment_json string: %s", e)
-        return {"error": f"Invalid assessment JSON string: {e}"}
+    parsed = parse_json(s, log=False)
+    if parsed is None:
+        logger.error("Failed to parse assessment_json string: %s", s[:500])
+        return {"error": "Invalid assessment JSON string"}
+    return parsed
 
 def _default_points_from_rubric(rubric):
     try:
@@ -4,10 +4,13 @@ Assessment Routes with RPC User Isolation
 Database automatically filters data via RLS
 """
 import json
-from flask import Blueprint, request, render_template, abort, jsonify, current_app, g
+from flask import Blueprint, request, render_template, abort, jsonify, current_app, g, url_for
 
 from agents.assessment_agent import AssessmentAgent
+from core.config import JOBS_ENABLED
+from core.jobs import JobError, get_job_queue, job_handler
 from core.md_render import render_assessment_markdown
+from core.schemas import schema_error
 from integrations.form_creator import create_google_form
 from integrations.form_response import get_form_full_info
 from utils.db import get_supabase_client, get_current_user_id
@@ -46,10 +49,36 @@ def assessment_page():
     return render_template("assessments.html", user=g.current_user)
 
 
+def _render_assessment(assessment):
+    """Assessment dict plus its rendered Markdown under _markdown."""
+    try:
+        assessment_with_md = dict(assessment)
+        assessment_with_md["_markdown"] = render_assessment_markdown(assessment)
+        return assessment_with_md
+    except Exception:
+        return assessment
+
+
+@job_handler("assessment")
+def run_assessment_job(payload, emit):
+    """Background runner for /generate."""
+    assessment = AssessmentAgent().generate_assessment(
+        payload["pdf_path"], payload["options"], force=payload.get("force", False)
+    )
+    err = schema_error("assessment", assessment)
+    if err:
+        raise JobError((assessment if isinstance(assessment, dict) else {}).get("error") or f"Invalid assessment result ({err.describe()})")
+    return _render_assessment(assessment)
+
+
 @assessment_bp.route("/generate", methods=["POST"])
 @login_required  # ✅ Added: Require login
 def generate_assessment():
-    """Generate assessment from uploaded PDF"""
+    """
+    Generate assessment from uploaded PDF.
+    With JOBS_ENABLED the assessment is generated by a background worker: the
+    response is 202 with a job id to poll (/jobs/<id>) or follow (/jobs/<id>/events).
+    """
     if "pdf" not in request.files:
         abort(400, description="Missing file field 'pdf'")
 
@@ -72,34 +101,56 @@ def generate_assessment():
     except ValueError:
         count = 5
     rubric = request.form.get("rubric") is not None
+    # Ask the model again instead of reusing the cached response for the same PDF and options
+    force = request.form.get("force") is not None
+    # Optional: restrict the material to a topic and/or pages ("3-7, 10")
+    topic = (request.form.get("topic") or "").strip()
+    pages = (request.form.get("pages") or "").strip()
+
+    options = {"type": asmt_type, "difficulty": difficulty, "count": count, "rubric": rubric}
+    if topic:
+        options["topic"] = topic
+    if pages:
+        options["pages"] = pages
+
+    if JOBS_ENABLED:
+        user_id = get_current_user_id()
+        job_id = get_job_queue().enqueue(
+            "assessment", {"pdf_path": dest.as_posix(), "options": options, "force": force}, user_id=user_id
+        )
+        return (
+            jsonify(
+                {
+                    "ok": True,
+                    "job_id": job_id,
+                    "status_url": url_for("jobs.job_status", job_id=job_id),
+                    "events_url": url_for("jobs.job_events", job_id=job_id),
+                    "pdf_path": dest.as_posix(),
+                }
+            ),
+            202,
+        )
 
     # Generate assessment
     agent = AssessmentAgent()
-    assessment = agent.generate_assessment(
-        dest.as_posix(),
-        {"type": asmt_type, "difficulty": difficulty, "count": count, "rubric": rubric},
-    )
+    assessment = agent.generate_assessment(dest.as_posix(), options, force=force)
 
-    if not isinstance(assessment, dict) or "questions" not in assessment:
+    err = schema_error("assessment", assessment)
+    if err:
         return (
             jsonify(
                 {
                     "ok": False,
-                    "error": assessment.get("error", "Invalid assessment result"),
+                    "error": (assessment if isinstance(assessment, dict) else {}).get("error")
+                    or f"Invalid assessment result ({err.describe()})",
+                    "schema_error": err.to_dict(),
                 }
             ),
             400,
         )
 
     # Add rendered Markdown
-    try:
-        assessment_md = render_assessment_markdown(assessment)
-        assessment_with_md = dict(assessment)
-        assessment_with_md["_markdown"] = assessment_md
-    except Exception:
-        assessment_with_md = assessment
-
-    return jsonify(assessment_with_md), 200
+    return jsonify(_render_assessment(assessment)), 200
 
 
 @assessment_bp.route("/api", methods=["POST"])
@@ -115,10 +166,11 @@ def save_assessment():
         payload = request.get_json(silent=True) or {}
         result = payload.get("result")
 
-        if not isinstance(result, dict) or "questions" not in result:
+        err = schema_error("assessment", result)
+        if err:
             return (
                 jsonify(
-                    {"ok": False, "error": "Invalid payload: missing result.questions"}
+                    {"ok": False, "error": f"Invalid payload: result is not a valid assessment ({err.describe()})", "schema_error": err.to_dict()}
                 ),
                 400,
             )
@@ -235,9 +287,10 @@ def create_form_for_assessment(id):
             return jsonify({"ok": False, "error": "Assessment not found"}), 404
 
         assessment = row.get("result")
-        if not isinstance(assessment, dict) or "questions" not in assessment:
+        err = schema_error("assessment", assessment)
+        if err:
             return (
-                jsonify({"ok": False, "error": "Row has no valid assessment JSON"}),
+                jsonify({"ok": False, "error": f"Row has no valid assessment JSON ({err.describe()})"}),
                 400,
             )
 
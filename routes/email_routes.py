@@ -3,14 +3,21 @@
 Email Routes with RPC User Isolation
 Database automatically filters data via RLS
 """
+import asyncio
+import os
+
 from flask import Blueprint, request, render_template, jsonify, g
 
 from agents.email_agent import EmailAgent
+from core.ai_client import run_async
 from utils.db import get_supabase_client
 from utils.supabase_auth import login_required, require_user_owns_resource
 
 email_bp = Blueprint("email", __name__)
 
+# Max students whose drafts are generated at the same time in a batch send
+EMAIL_BATCH_CONCURRENCY = int(os.environ.get("EMAIL_BATCH_CONCURRENCY", "8"))
+
 
 @email_bp.route("/", methods=["GET"])
 @login_required  # ✅ Added: Require login
@@ -137,6 +144,8 @@ def api_email_send_batch():
         agent = EmailAgent()
         results, sent, drafted, failed = [], 0, 0, 0
 
+        # Build prompts first; students without an email are reported, not drafted
+        pending = []
         for s in students:
             student_id = s.get("student_id")
             name = (s.get("name") or "").strip()
@@ -161,9 +170,23 @@ tone: {tone}
 action: {action}
 notes: {notes}
 """
+            pending.append((student_id, name, email, prompt))
+
+        # LLM work (parse + draft per student) runs concurrently; Gmail calls stay sequential
+        async def _prepare_all():
+            sem = asyncio.Semaphore(EMAIL_BATCH_CONCURRENCY)
+
+            async def _one(prompt):
+                async with sem:
+                    return await agent.aprepare(prompt)
+
+            return await asyncio.gather(*(_one(p[3]) for p in pending))
+
+        prepared_all = run_async(_prepare_all()) if pending else []
 
+        for (student_id, name, email, _prompt), prepared in zip(pending, prepared_all):
             try:
-                r = agent.run(prompt, default_use_html=True)
+                r = agent.deliver(prepared, default_use_html=True)
                 ok = r.get("ok", False)
                 results.append(
                     {
@@ -0,0 +1,96 @@
+# routes/job_routes.py
+"""
+Status of background generation jobs (see core.jobs)
+Only the user who started a job can read it
+"""
+import json
+import time
+from flask import Blueprint, Response, abort, jsonify, request, stream_with_context
+
+from core.config import JOB_SSE_MAX_SECONDS
+from core.jobs import FINISHED, get_job_queue, public_job
+from utils.supabase_auth import get_current_user_id, login_required
+
+job_bp = Blueprint("jobs", __name__)
+
+# How often an SSE response looks for new events, and sends a comment to keep proxies from timing out
+SSE_POLL_SECONDS = 0.5
+SSE_KEEPALIVE_SECONDS = 10
+
+
+def _owned_job(job_id):
+    job = get_job_queue().store.get(job_id)
+    if job is None or job.get("user_id") != get_current_user_id():
+        abort(404, description="Job not found")
+    return job
+
+
+@job_bp.route("/<job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    """
+    Poll a job: status is queued | running | succeeded | failed; result holds the
+    generated plan/assessment once it succeeded. ?after=<seq> also returns the
+    progress events recorded after that sequence number.
+    """
+    job = _owned_job(job_id)
+    body = {"ok": True, "job": public_job(job)}
+    if "after" in request.args:
+        try:
+            after = int(request.args.get("after") or 0)
+        except ValueError:
+            after = 0
+        body["events"] = get_job_queue().store.events(job_id, after)
+    return jsonify(body), 200
+
+
+@job_bp.route("/<job_id>/events", methods=["GET"])
+@login_required
+def job_events(job_id):
+    """
+    Server-sent events for a job: every progress event the handler emitted
+    (e.g. event: week), then event: done with the finished job. The response
+    ends after JOB_SSE_MAX_SECONDS; EventSource reconnects on its own and
+    resumes from Last-Event-ID. With gunicorn's default sync workers an open
+    stream still holds a worker for that long, so static/js/jobs.js polls
+    /jobs/<id> unless the deployment opts in (threaded or async workers).
+    """
+    _owned_job(job_id)
+    store = get_job_queue().store
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        after = 0
+
+    def _sse(seq, event, data):
+        return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+    def _events():
+        nonlocal after
+        deadline = time.monotonic() + JOB_SSE_MAX_SECONDS
+        last_sent = time.monotonic()
+        # Tell EventSource to come back quickly when this response ends
+        yield "retry: 1000\n\n"
+        while True:
+            for ev in store.events(job_id, after):
+                last_sent = time.monotonic()
+                after = ev["seq"]
+                if ev["event"] == "done":
+                    job = store.get(job_id)
+                    if job and job["status"] in FINISHED:
+                        yield _sse(after, "done", public_job(job))
+                        return
+                    continue
+                yield _sse(after, ev["event"], ev["data"])
+            if time.monotonic() > deadline:
+                return
+            time.sleep(SSE_POLL_SECONDS)
+            if time.monotonic() - last_sent > SSE_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(_events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
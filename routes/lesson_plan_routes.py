@@ -4,10 +4,17 @@ Lesson Plan Routes with RPC User Isolation
 Database automatically filters data via RLS
 """
 import json
-from flask import Blueprint, request, render_template, abort, jsonify, current_app, g
-
-from agents.lesson_plan_agent import LessonPlanAgent
-from core.md_render import render_lesson_plan_markdown
+from flask import (
+    Blueprint, request, render_template, abort, jsonify, current_app, g,
+    Response, stream_with_context, url_for,
+)
+from postgrest.exceptions import APIError
+
+from agents.lesson_plan_agent import LessonPlanAgent, week_index
+from core.config import JOBS_ENABLED
+from core.jobs import JobError, get_job_queue, job_handler
+from core.md_render import render_lesson_plan_markdown, render_week_markdown, replace_week_markdown
+from core.schemas import coerce_integers, schema_error
 from utils.db import get_supabase_client, get_current_user_id
 from utils.file_helper import allowed_file, save_uploaded_file
 from utils.supabase_auth import login_required, require_user_owns_resource
@@ -61,13 +68,11 @@ def lesson_generator_page():
     return render_template("lesson_generator.html", user=g.current_user, credits=current_credits)
 
 
-@lesson_plan_bp.route("/generate", methods=["POST"])
-@login_required 
-def generate_lesson_plan():
-    """Generate lesson plan from course outline"""
-    COST = 0
-
-    # --- 1. CREDIT CHECK ---
+def _check_credits(cost):
+    """
+    Load the current user's credit balance.
+    Returns (user_id, supabase, current_credits, error_response_or_None).
+    """
     try:
         user_id = get_current_user_id()
         supabase = get_supabase_client()
@@ -78,16 +83,32 @@ def generate_lesson_plan():
         
         current_credits = profile.get("credits", 0) if profile else 0
 
-        if current_credits < COST:
-            return jsonify({
+        if current_credits < cost:
+            return user_id, supabase, current_credits, (jsonify({
                 "ok": False, 
-                "error": f"Insufficient credits. You have {current_credits}, but need {COST}."
-            }), 402  # 402 Payment Required
+                "error": f"Insufficient credits. You have {current_credits}, but need {cost}."
+            }), 402)  # 402 Payment Required
+
+        return user_id, supabase, current_credits, None
 
     except Exception as e:
-        return jsonify({"ok": False, "error": f"Failed to check credits: {str(e)}"}), 500
-    
-    # --- 2. VALIDATION & FILE SAVING ---
+        return None, None, 0, (jsonify({"ok": False, "error": f"Failed to check credits: {str(e)}"}), 500)
+
+
+def _deduct_credits(supabase, user_id, current_credits, cost):
+    """Persist the new balance; returns it, or None if the update failed."""
+    try:
+        new_balance = current_credits - cost
+        # Update the database
+        supabase.table("users").update({"credits": new_balance}).eq("id", user_id).execute()
+        return new_balance
+    except Exception as e:
+        current_app.logger.error(f"Failed to deduct credits for user {user_id}: {e}")
+        return None
+
+
+def _read_generation_request():
+    """Validate and save the uploaded outline, parse options. Aborts with 400 on bad input."""
     if "course_outline" not in request.files:
         abort(400, description="Missing file field 'course_outline'")
 
@@ -114,24 +135,129 @@ def generate_lesson_plan():
     weeks = _int_param("weeks", 8)
     num_stu = _int_param("students", 20)
     section_per_week = _int_param("sections", 1)
+    return dest, weeks, num_stu, section_per_week
 
-    # --- 3. AI GENERATION ---
+
+def _force_requested():
+    """force=1 (form, JSON or query string) regenerates instead of reusing a cached plan."""
+    data = request.form or request.get_json(silent=True) or {}
+    raw = data.get("force", request.args.get("force"))
+    return str(raw).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _cache_hit(plan):
+    """True for a plan served from the lesson plan result cache (no credits are charged)."""
+    return isinstance(plan, dict) and bool((plan.get("_cache") or {}).get("hit"))
+
+
+def _charge_job_credits(user_id, cost):
+    """Deduct credits from a job worker (no request context): re-read the balance first."""
+    if not cost:
+        return None
+    supabase = get_supabase_client()
+    supabase.rpc("set_user_context", {"user_id": user_id}).execute()
+    res = supabase.table("users").select("credits").eq("id", user_id).single().execute()
+    return _deduct_credits(supabase, user_id, (res.data or {}).get("credits", 0), cost)
+
+
+@job_handler("lesson_plan")
+def run_lesson_plan_job(payload, emit):
+    """Background runner for /generate: emits a "week" event per finished week."""
     lp_agent = LessonPlanAgent()
-    plan = lp_agent.generate_plan(
-        {"course_outline": dest.as_posix()}, weeks, num_stu, section_per_week
-    )
+    plan = None
+    for event, data in lp_agent.stream_plan(
+        {"course_outline": payload["pdf_path"]}, payload["weeks"], payload["students"], payload["sections"],
+        force=payload.get("force", False),
+    ):
+        if event == "week":
+            week_no = data.get("week") if isinstance(data, dict) else None
+            emit("week", {"week": week_no, "markdown": render_week_markdown(data)})
+        else:
+            plan = data
+
+    if not isinstance(plan, dict) or plan.get("error"):
+        raise JobError((plan or {}).get("error", "Lesson plan generation failed"))
+
+    if not _cache_hit(plan):
+        new_balance = _charge_job_credits(payload["user_id"], payload.get("cost", 0))
+        if new_balance is not None:
+            plan["new_credit_balance"] = new_balance
+    try:
+        plan["_markdown"] = render_lesson_plan_markdown(plan)
+    except Exception:
+        pass
+    return plan
+
+
+def _job_accepted(job_id, **extra):
+    """202 body pointing the client at the job's poll and SSE URLs."""
+    body = {
+        "ok": True,
+        "job_id": job_id,
+        "status_url": url_for("jobs.job_status", job_id=job_id),
+        "events_url": url_for("jobs.job_events", job_id=job_id),
+    }
+    body.update(extra)
+    return jsonify(body), 202
+
+
+@lesson_plan_bp.route("/generate", methods=["POST"])
+@login_required 
+def generate_lesson_plan():
+    """
+    Generate lesson plan from course outline.
+    With JOBS_ENABLED the plan is generated by a background worker: the
+    response is 202 with a job id to poll (/jobs/<id>) or follow (/jobs/<id>/events).
+    A plan generated before for the same PDF and options is returned at once
+    (200, _cache.hit true, no credits charged) unless force=1.
+    """
+    COST = 0
+
+    # --- 1. CREDIT CHECK ---
+    user_id, supabase, current_credits, error = _check_credits(COST)
+    if error:
+        return error
+    
+    # --- 2. VALIDATION & FILE SAVING ---
+    dest, weeks, num_stu, section_per_week = _read_generation_request()
+    force = _force_requested()
+    lp_agent = LessonPlanAgent()
+    inputs = {"course_outline": dest.as_posix()}
+
+    if JOBS_ENABLED:
+        cached = None if force else lp_agent.cached_plan(inputs, weeks, num_stu, section_per_week)
+        if cached is not None:
+            try:
+                cached["_markdown"] = render_lesson_plan_markdown(cached)
+            except Exception:
+                pass
+            return jsonify(cached), 200
+
+        job_id = get_job_queue().enqueue(
+            "lesson_plan",
+            {
+                "pdf_path": dest.as_posix(),
+                "weeks": weeks,
+                "students": num_stu,
+                "sections": section_per_week,
+                "user_id": user_id,
+                "cost": COST,
+                "force": force,
+            },
+            user_id=user_id,
+        )
+        return _job_accepted(job_id, pdf_path=dest.as_posix(), weeks=weeks)
+
+    # --- 3. AI GENERATION ---
+    plan = lp_agent.generate_plan(inputs, weeks, num_stu, section_per_week, force=force)
 
     # --- 4. DEDUCT CREDITS ---
-    # Only deduct if generation was successful
-    if isinstance(plan, dict) and not plan.get("error"):
-        try:
-            new_balance = current_credits - COST
-            # Update the database
-            supabase.table("users").update({"credits": new_balance}).eq("id", user_id).execute()
+    # Only deduct if generation was successful (and not served from the cache)
+    if isinstance(plan, dict) and not plan.get("error") and not _cache_hit(plan):
+        new_balance = _deduct_credits(supabase, user_id, current_credits, COST)
+        if new_balance is not None:
             # Send new balance to frontend for instant update
             plan["new_credit_balance"] = new_balance
-        except Exception as e:
-            current_app.logger.error(f"Failed to deduct credits for user {user_id}: {e}")
 
     # --- 5. RENDER MARKDOWN ---
     try:
@@ -149,6 +275,60 @@ def generate_lesson_plan():
     return jsonify(plan_with_md), 200
 
 
+@lesson_plan_bp.route("/generate/stream", methods=["POST"])
+@login_required
+def generate_lesson_plan_stream():
+    """
+    Same inputs as /generate, answered as server-sent events:
+    - event: week  -> {"week": n, "markdown": "..."} as soon as each week is generated
+    - event: plan  -> full plan JSON with _markdown (same body as /generate)
+    - event: error -> {"error": "..."}
+    """
+    COST = 0
+
+    user_id, supabase, current_credits, error = _check_credits(COST)
+    if error:
+        return error
+
+    dest, weeks, num_stu, section_per_week = _read_generation_request()
+    force = _force_requested()
+    lp_agent = LessonPlanAgent()
+
+    def _sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def _events():
+        yield _sse("start", {"pdf_path": dest.as_posix(), "weeks": weeks})
+        for event, data in lp_agent.stream_plan(
+            {"course_outline": dest.as_posix()}, weeks, num_stu, section_per_week, force=force
+        ):
+            if event == "week":
+                week_no = data.get("week") if isinstance(data, dict) else None
+                yield _sse("week", {"week": week_no, "markdown": render_week_markdown(data)})
+                continue
+
+            plan = data
+            if not isinstance(plan, dict) or plan.get("error"):
+                yield _sse("error", {"error": (plan or {}).get("error", "Lesson plan generation failed")})
+                return
+
+            if not _cache_hit(plan):
+                new_balance = _deduct_credits(supabase, user_id, current_credits, COST)
+                if new_balance is not None:
+                    plan["new_credit_balance"] = new_balance
+            try:
+                plan["_markdown"] = render_lesson_plan_markdown(plan)
+            except Exception:
+                pass
+            yield _sse("plan", plan)
+
+    return Response(
+        stream_with_context(_events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @lesson_plan_bp.route("/api", methods=["POST"])
 @login_required 
 def save_lesson_plan():
@@ -169,6 +349,17 @@ def save_lesson_plan():
                 ),
                 400,
             )
+        # Store "16 weeks" as 16; older plans (no totals, no weeks yet) still save
+        coerce_integers("lesson_plan", result)
+        err = schema_error("lesson_plan_saved", result)
+        if err:
+            return (
+                jsonify(
+                    {"ok": False, "error": f"Invalid payload: result is not a valid lesson plan ({err.describe()})",
+                     "schema_error": err.to_dict()}
+                ),
+                400,
+            )
 
         row = {
             "user_id": user_id, 
@@ -298,6 +489,94 @@ def lesson_plan_markdown(id):
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+# PostgREST codes for "no such function" (schema cache miss, and Postgres' own)
+_MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+def _patch_week(supabase, plan_id, result, index, week, entry, markdown) -> int:
+    """
+    Write one weekly_schedule entry (and the stored _markdown, if given) back in place with
+    the patch_lesson_plan_week RPC (database/rpc_lesson_plan_week.sql) and return the number
+    of rows updated; 0 means the plan is gone or its week `week` moved. Only databases without
+    the function get the whole result rewritten; any other error propagates.
+    """
+    try:
+        res = supabase.rpc("patch_lesson_plan_week", {
+            "plan_id": str(plan_id), "week_index": index, "week": entry, "markdown": markdown,
+            "expected_week": week,
+        }).execute()
+        return int(res.data or 0)
+    except APIError as e:
+        if e.code not in _MISSING_FUNCTION_CODES:
+            raise
+        current_app.logger.warning(f"patch_lesson_plan_week is missing ({e.code}); updating the full result")
+    result["weekly_schedule"][index] = entry
+    if markdown is not None:
+        result["_markdown"] = markdown
+    res = supabase.table("lesson_plans").update({"result": result}).eq("id", str(plan_id)).execute()
+    return len(res.data or [])
+
+
+@lesson_plan_bp.route("/api/<uuid:id>/weeks/<int:week>/regenerate", methods=["POST"])
+@login_required
+@require_user_owns_resource('lesson_plans', 'id')
+def regenerate_lesson_plan_week(id, week):
+    """
+    Regenerate one week of a saved lesson plan.
+    Only the plan's outline and the current week go to the model (not the course PDF).
+    The new entry replaces result.weekly_schedule for that week in place, and only that
+    week's markdown is re-rendered (and spliced into an edited _markdown, if there is one).
+    Optional JSON body: {"instructions": "..."}
+    """
+    COST = 0
+
+    user_id, supabase, current_credits, error = _check_credits(COST)
+    if error:
+        return error
+
+    try:
+        sel = (
+            supabase.table("lesson_plans")
+            .select("result")
+            .eq("id", str(id))
+            .single()
+            .execute()
+        )
+        result = (sel.data or {}).get("result")
+        if not isinstance(result, dict):
+            return jsonify({"ok": False, "error": "Lesson plan not found or invalid JSON"}), 404
+
+        index = week_index(result, week)
+        if index is None:
+            return jsonify({"ok": False, "error": f"Week {week} is not in this lesson plan"}), 404
+
+        data = request.get_json(silent=True) or {}
+        instructions = str(data.get("instructions") or "").strip()[:2000]
+
+        entry = LessonPlanAgent().regenerate_week(result, week, instructions)
+        if entry.get("error"):
+            return jsonify({"ok": False, "error": entry["error"]}), 502
+
+        week_md = render_week_markdown(entry)
+        # An edited _markdown without this week's heading is left as the teacher wrote it
+        markdown = replace_week_markdown(result["_markdown"], week, week_md) if result.get("_markdown") else None
+        if not _patch_week(supabase, id, result, index, week, entry, markdown):
+            still_there = supabase.table("lesson_plans").select("id").eq("id", str(id)).execute()
+            if not still_there.data:
+                return jsonify({"ok": False, "error": "Lesson plan not found"}), 404
+            return jsonify({"ok": False, "error": f"Week {week} changed while it was being regenerated; "
+                                                  "reload the plan and try again"}), 409
+
+        body = {"ok": True, "week": week, "entry": entry, "markdown": week_md,
+                "markdown_updated": markdown is not None}
+        new_balance = _deduct_credits(supabase, user_id, current_credits, COST)
+        if new_balance is not None:
+            body["new_credit_balance"] = new_balance
+        return jsonify(body), 200
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
 @lesson_plan_bp.route("/api/<uuid:id>", methods=["DELETE"])
 @login_required 
 @require_user_owns_resource('lesson_plans', 'id') 
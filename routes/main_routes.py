@@ -3,6 +3,9 @@ from utils.db import test_user_context, get_supabase_client
 from utils.supabase_auth import verify_rls_working, login_required
 from utils.supabase_auth import get_current_user
 from utils.dashboard_service import get_dashboard_counts, get_recent_activities
+from core.ai_client import cache_stats, limiter_stats, routing_stats
+from core.config import METRICS_TOKEN
+from core.metrics import render_prometheus
 
 main_bp = Blueprint('main', __name__)
 
@@ -100,4 +103,51 @@ def test_rls():
         "database_test": db_test,
         "auth_test": auth_test,
         "instructions": "If both tests show success, RLS with RPC is working!"
-    })
\ No newline at end of file
+    })
+
+@main_bp.route('/api/llm-cache/stats')
+@login_required
+def llm_cache_stats():
+    """
+    Hit/miss counters of the LLM response cache for this worker process
+    """
+    from flask import jsonify
+
+    return jsonify({"ok": True, "stats": cache_stats()})
+
+
+@main_bp.route('/api/llm/limits')
+@login_required
+def llm_limits():
+    """
+    Rate-limit budgets, circuit-breaker state and model routing health for this worker process
+    """
+    from flask import jsonify
+
+    return jsonify({"ok": True, "limits": limiter_stats(), "routing": routing_stats()})
+
+
+@main_bp.route('/api/uploads/janitor')
+@login_required
+def upload_janitor_report():
+    """
+    Outcome of the last upload directory clean-up run by this worker process
+    """
+    from flask import current_app, jsonify
+    from utils.upload_janitor import get_upload_janitor
+
+    report = get_upload_janitor(current_app.config["UPLOAD_DIR"]).last_report
+    return jsonify({"ok": True, "report": report.to_dict() if report else None})
+
+
+@main_bp.route('/metrics')
+def metrics():
+    """
+    LLM call histograms (latency, tokens, payload bytes per model and agent) for
+    this worker process, in Prometheus text format
+    """
+    from flask import Response, request
+
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
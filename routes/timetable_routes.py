@@ -6,6 +6,7 @@ Uses authenticated user's Google Calendar credentials
 from flask import Blueprint, request, jsonify, g
 
 from agents.timetable_agent import TimetableAgent
+from core.schemas import schema_error
 from integrations.calendar_orchestrator import schedule_from_timetable
 from utils.db import get_supabase_client, get_current_user_id
 from utils.supabase_auth import login_required, require_user_owns_resource
@@ -96,10 +97,12 @@ def api_timetable_schedule():
         tt = data.get("timetable")
         lesson_plan_id = data.get("lesson_plan_id")  # ✅ Added: Optional lesson plan ID
         
-        if not isinstance(tt, dict) or "suggested_slots" not in tt:
+        err = schema_error("timetable", tt)
+        if err:
             return jsonify({
                 "ok": False, 
-                "error": "Missing timetable.suggested_slots"
+                "error": f"Invalid timetable ({err.describe()})",
+                "schema_error": err.to_dict(),
             }), 400
 
         # ✅ Added: If lesson_plan_id provided, verify ownership
@@ -0,0 +1,95 @@
+// static/js/jobs.js
+/**
+ * Follow a background generation job (see routes/job_routes.py).
+ *
+ *   const job = await followJob(body.events_url, (event, data) => { ... });
+ *
+ * Calls onEvent for every progress event (e.g. "week", "retry") and resolves
+ * with the finished job ({status, result, error}).
+ *
+ * Polls the job's status URL by default: the Procfile runs gunicorn with sync
+ * workers, and an open server-sent events response holds one of them for up
+ * to JOB_SSE_MAX_SECONDS. Pass {stream: true} (or set window.JOBS_USE_SSE)
+ * when the app runs on threaded or async workers to use EventSource instead.
+ *
+ * A failed status poll (network error, worker restart, 5xx) is retried with
+ * backoff; the promise only rejects once the job is reported missing (404)
+ * or JOB_POLL_RETRIES polls in a row have failed.
+ */
+const JOB_POLL_MS = 1500;
+const JOB_POLL_RETRIES = 6;
+const JOB_POLL_MAX_DELAY_MS = 20000;
+
+function followJob(eventsUrl, onEvent, options = {}) {
+  const statusUrl = eventsUrl.replace(/\/events$/, "");
+  const stream = options.stream ?? window.JOBS_USE_SSE === true;
+
+  if (!stream || typeof EventSource === "undefined") {
+    return new Promise((resolve, reject) => {
+      let after = 0;
+      let failures = 0;
+      const poll = async () => {
+        let res, body;
+        try {
+          res = await fetch(`${statusUrl}?after=${after}`);
+          body = await res.json().catch(() => ({}));
+        } catch (err) {
+          res = null;
+          body = { error: err.message };
+        }
+        if (res && res.status === 404) {
+          reject(new Error(body.error || "Job not found"));
+          return;
+        }
+        if (!res || !res.ok || !body.job) {
+          // Transient: the job keeps running on the server, so keep asking
+          failures += 1;
+          if (failures > JOB_POLL_RETRIES) {
+            reject(new Error(body.error || `HTTP ${res ? res.status : "error"}`));
+            return;
+          }
+          setTimeout(poll, Math.min(JOB_POLL_MS * 2 ** failures, JOB_POLL_MAX_DELAY_MS));
+          return;
+        }
+        failures = 0;
+        try {
+          (body.events || []).forEach((ev) => {
+            after = ev.seq;
+            if (ev.event !== "done" && onEvent) onEvent(ev.event, ev.data);
+          });
+        } catch (err) {
+          reject(err);
+          return;
+        }
+        if (body.job.status === "succeeded" || body.job.status === "failed") resolve(body.job);
+        else setTimeout(poll, JOB_POLL_MS);
+      };
+      poll();
+    });
+  }
+
+  return new Promise((resolve, reject) => {
+    const es = new EventSource(eventsUrl);
+    const forward = (name) =>
+      es.addEventListener(name, (e) => onEvent && onEvent(name, JSON.parse(e.data)));
+    ["week", "retry", "progress"].forEach(forward);
+    es.addEventListener("done", (e) => {
+      es.close();
+      resolve(JSON.parse(e.data));
+    });
+    es.onerror = async () => {
+      // The server ends each response after a while and EventSource reconnects;
+      // only give up if the job itself is gone.
+      if (es.readyState !== EventSource.CLOSED) return;
+      try {
+        const res = await fetch(statusUrl);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const body = await res.json();
+        if (body.job && (body.job.status === "succeeded" || body.job.status === "failed")) resolve(body.job);
+        else resolve(await followJob(eventsUrl, onEvent, options));
+      } catch (err) {
+        reject(err);
+      }
+    };
+  });
+}
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# core.config reads these at import time; the tests never reach the real services
+os.environ.setdefault("AI_ML_API_KEY", "test-key")
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="ai_teacher_test_cache_"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
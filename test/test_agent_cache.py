@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import uuid
+
+import pytest
+
+from agents import assessment_agent, lesson_plan_agent
+from agents.assessment_agent import AssessmentAgent
+from agents.lesson_plan_agent import LessonPlanAgent, _cached_plan, _plan_cache, _remember_plan
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from synthetic_pdf import write_synthetic_pdf  # noqa: E402
+
+PLAN = {"title": "Biology", "weekly_schedule": [{"week": 1, "topic": "Cells"}]}
+ASSESSMENT = {"title": "Quiz", "type": "MCQ", "difficulty": "Medium",
+              "questions": [{"q": "2+2?", "options": ["3", "4"], "answer": "4"}], "rubric": []}
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "outline.pdf"
+    write_synthetic_pdf(str(path), pages=2, seed=uuid.uuid4().int % 1000)
+    return str(path)
+
+
+def _record(monkeypatch, module, reply):
+    calls = []
+
+    def chat_completion(**kwargs):
+        calls.append(kwargs["use_cache"])
+        return json.dumps(reply)
+
+    monkeypatch.setattr(module, "chat_completion", chat_completion)
+    return calls
+
+
+def test_cached_plan_drops_the_repair_report():
+    key = uuid.uuid4().hex
+    plan = dict(PLAN, _repair={"repaired": 1, "tokens_saved": 900})
+    assert _remember_plan(key, plan)["_repair"]["repaired"] == 1
+    cached = _cached_plan(key)
+    assert "_repair" not in cached
+    assert cached["_cache"]["hit"] is True
+
+
+def test_cached_plan_drops_a_repair_report_stored_earlier():
+    key = uuid.uuid4().hex
+    entry = {"plan": dict(PLAN, _repair={"repaired": 1}), "cached_at": "2026-01-01T00:00:00+00:00"}
+    _plan_cache().set(key, json.dumps(entry).encode("utf-8"))
+    assert "_repair" not in _cached_plan(key)
+
+
+def test_force_skips_the_llm_cache_for_that_call_only(pdf, monkeypatch):
+    calls = _record(monkeypatch, lesson_plan_agent, PLAN)
+    agent = LessonPlanAgent(model="test-model", compact_output=False)
+    # The one-week plan fails the lesson_week schema, so repair calls follow the plan call
+    agent.generate_plan({"course_outline": pdf}, 1, 20, 1, force=True)
+    assert len(calls) > 1 and set(calls) == {False}
+    calls.clear()
+    agent.generate_plan({"course_outline": pdf}, 2, 20, 1)
+    assert calls and set(calls) == {True}
+    assert not hasattr(agent, "_use_llm_cache")
+
+
+def test_forced_stream_does_not_leak_into_other_calls(pdf, monkeypatch):
+    calls = []
+
+    def chat_completion_stream(**kwargs):
+        calls.append(kwargs["use_cache"])
+        yield json.dumps(PLAN)
+
+    monkeypatch.setattr(lesson_plan_agent, "chat_completion_stream", chat_completion_stream)
+    record = _record(monkeypatch, lesson_plan_agent, PLAN)
+    agent = LessonPlanAgent(model="test-model", compact_output=False)
+    stream = agent.stream_plan({"course_outline": pdf}, 1, 20, 1, force=True)
+    next(stream)  # suspended after the first week, still forced
+    agent.generate_plan({"course_outline": pdf}, 3, 20, 1)
+    assert calls == [False]
+    assert record and set(record) == {True}
+    record.clear()
+    list(stream)  # the stream's own repair calls are still forced
+    assert record and set(record) == {False}
+
+
+def test_assessment_force_skips_the_llm_cache(monkeypatch):
+    calls = _record(monkeypatch, assessment_agent, ASSESSMENT)
+    agent = AssessmentAgent(model="test-model")
+    assert agent.generate_assessment("Cells are small.", {}, force=True)["title"] == "Quiz"
+    agent.generate_assessment("Cells are small.", {})
+    assert calls == [False, True]
@@ -0,0 +1,83 @@
+import pytest
+
+from core import ai_client, rate_limit
+from core.ai_client import ModelHealth
+from core.rate_limit import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejecting()
+    assert breaker.retry_after() == pytest.approx(30)
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert not breaker.rejecting()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    assert breaker.rejecting()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker(threshold=5, cooldown=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 31
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == pytest.approx(30)
+
+
+def test_release_returns_the_trial_slot(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_route_returns_to_primary_after_cooldown(clock, monkeypatch):
+    monkeypatch.setattr(ai_client, "_health", ModelHealth(300))
+    monkeypatch.setitem(ai_client.ROUTES, "test_task", {"model": "primary-x", "fallback": "fallback-x", "max_tokens": 10})
+    breaker = rate_limit.get_model_guard("primary-x").breaker
+    breaker.cooldown = 30
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+
+    assert ai_client.route_model("test_task") == ("fallback-x", 10)
+    clock[0] += 30
+    # route_model never calls allow(); the primary must still get its trial
+    assert breaker.state == CircuitBreaker.OPEN
+    assert ai_client.route_model("test_task") == ("primary-x", 10)
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import uuid
+
+from core import digest
+from core.chunker import estimate_tokens
+
+
+def _material(tokens):
+    # Unique per test so the on-disk summary cache never answers for another test
+    tag = uuid.uuid4().hex
+    text = " ".join(f"Sentence {i} about topic {tag}." for i in range(tokens))
+    return text[: tokens * 4].rstrip()
+
+
+def _fake_model(monkeypatch, reply):
+    calls = []
+
+    async def achat_completion(model, messages, **kwargs):
+        calls.append(messages[-1]["content"])
+        return reply(messages[-1]["content"])
+
+    monkeypatch.setattr(digest, "achat_completion", achat_completion)
+    return calls
+
+
+def test_text_within_budget_is_unchanged(monkeypatch):
+    calls = _fake_model(monkeypatch, lambda chunk: "{}")
+    text = _material(500)
+    assert asyncio.run(digest.abuild_digest(text, "m", budget_tokens=1000)) == text
+    assert calls == []
+
+
+def test_fenced_summary_is_parsed(monkeypatch):
+    summary = {"section_title": "Cells", "summary": "Cells are small.", "key_topics": ["cells"], "key_terms": []}
+    _fake_model(monkeypatch, lambda chunk: "Here you go:\n```json\n" + json.dumps(summary) + ",\n```")
+    out = asyncio.run(digest.abuild_digest(_material(2000), "m", budget_tokens=500, chunk_tokens=1000))
+    assert out.startswith("## 1. Cells\nCells are small.\nKey topics: cells")
+    assert "Sentence" not in out
+
+
+def test_digest_keeps_condensing_until_it_fits(monkeypatch):
+    # Each summary is ~60% of its chunk: two rounds are not enough for this budget
+    def reply(chunk):
+        return json.dumps({"section_title": "S", "summary": chunk[: int(len(chunk) * 0.6)]})
+
+    calls = _fake_model(monkeypatch, reply)
+    out = asyncio.run(digest.abuild_digest(_material(8000), "m", budget_tokens=2000, chunk_tokens=1000))
+    assert estimate_tokens(out) <= 2000
+    assert len(calls) > 8 + 5  # a third round ran
+
+
+def test_digest_that_stops_shrinking_is_truncated(monkeypatch):
+    _fake_model(monkeypatch, lambda chunk: json.dumps({"summary": chunk}))
+    out = asyncio.run(digest.abuild_digest(_material(4000), "m", budget_tokens=1000, chunk_tokens=1000))
+    assert 500 <= estimate_tokens(out) <= 1000
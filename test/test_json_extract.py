@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+from core.json_extract import parse_json, parse_json_object
+
+FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "llm_json_outputs.jsonl"
+)
+
+with open(FIXTURES, encoding="utf-8") as f:
+    CASES = [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c["name"] for c in CASES])
+def test_fixture_case(case):
+    assert parse_json(case["raw"], log=False) == case["expect"]
+
+
+def test_empty_and_non_json():
+    assert parse_json("", log=False) is None
+    assert parse_json(None, log=False) is None
+    assert parse_json("no json here", log=False) is None
+
+
+def test_parse_json_object_rejects_arrays():
+    assert parse_json_object('[{"a": 1}]', log=False) is None
+    assert parse_json_object('```json\n{"a": 1,}\n```', log=False) == {"a": 1}
+
+
+def test_email_writer_accepts_fenced_replies():
+    from integrations.email_writer import _json_object, _normalize_draft, _normalize_fields
+
+    draft = '```json\n{"subject": "Hi", "plain": "Hello Ann", "html": "<p>Hello Ann</p>",}\n```'
+    assert _json_object(draft)
+    assert _normalize_draft(draft, "Ann", "say hi")["subject"] == "Hi"
+    fields = _normalize_fields('Sure:\n{"to_email": "ann@example.com", "cc": " "}', "email Ann")
+    assert fields["to_email"] == "ann@example.com" and fields["cc"] == ""
+    with pytest.raises(ValueError):
+        _normalize_draft("I cannot help with that.", "Ann", "say hi")
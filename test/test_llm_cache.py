@@ -0,0 +1,93 @@
+import json
+import time
+
+import pytest
+
+from core import ai_client
+from core.disk_cache import DiskCache
+from core.llm_cache import LLMCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(DiskCache(str(tmp_path / "llm.sqlite"), max_bytes=1 << 20), memory_items=8, ttl=60)
+
+
+@pytest.fixture
+def fake_post(monkeypatch, cache):
+    """Routes chat_completion through a fresh cache and returns queued responses instead of calling upstream."""
+    responses = []
+    calls = []
+
+    def _post(url, payload):
+        calls.append(payload)
+        return responses.pop(0)
+
+    monkeypatch.setattr(ai_client, "_post", _post)
+    monkeypatch.setattr(ai_client, "get_llm_cache", lambda: cache)
+    return responses, calls
+
+
+def test_memory_entry_expires_with_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+
+    now[0] += 61
+    assert cache.get("k") is None
+    assert cache.stats()["memory_items"] == 0
+
+
+def test_disk_hit_keeps_disk_expiry(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache.set("k", "value")
+    cache._memory.clear()
+
+    now[0] += 30
+    assert cache.get("k") == "value"  # promoted from disk
+    now[0] += 31
+    assert cache.get("k") is None
+
+
+def test_invalidate_drops_both_levels(cache):
+    cache.set("k", "value")
+    cache.invalidate("k")
+    assert cache.get("k") is None
+    assert cache.disk.get("k") is None
+
+
+def test_cache_if_rejects_unparseable_completion(fake_post):
+    responses, calls = fake_post
+    responses.extend(['{"title": "cut off', '{"title": "ok"}', "unused"])
+    valid = lambda raw: isinstance(json.loads(raw), dict)
+    messages = [{"role": "user", "content": "cache_if test"}]
+
+    assert ai_client.chat_completion("m", messages, cache_if=valid) == '{"title": "cut off'
+    assert ai_client.chat_completion("m", messages, cache_if=valid) == '{"title": "ok"}'
+    assert ai_client.chat_completion("m", messages, cache_if=valid) == '{"title": "ok"}'
+    assert len(calls) == 2
+
+
+def test_cached_entry_failing_cache_if_is_dropped(fake_post, cache):
+    responses, calls = fake_post
+    messages = [{"role": "user", "content": "stale entry"}]
+    key = ai_client._cache_key(ai_client._build_payload("m", messages))
+    cache.set(key, "not json")
+    responses.append('{"ok": true}')
+
+    out = ai_client.chat_completion("m", messages, cache_if=lambda raw: isinstance(json.loads(raw), dict))
+    assert out == '{"ok": true}'
+    assert len(calls) == 1
+    assert cache.get(key) == '{"ok": true}'
+
+
+def test_use_cache_false_skips_lookup(fake_post):
+    responses, calls = fake_post
+    messages = [{"role": "user", "content": "forced"}]
+    responses.extend(["first", "second"])
+
+    assert ai_client.chat_completion("m", messages) == "first"
+    assert ai_client.chat_completion("m", messages, use_cache=False) == "second"
+    assert len(calls) == 2
@@ -0,0 +1,46 @@
+import pytest
+
+from core.md_render import render_lesson_plan_markdown, render_week_markdown, replace_week_markdown
+
+
+def _week(n, topic, activity="Lecture"):
+    return {"week": n, "topic": topic, "learning_objectives": [f"Objective {n}"], "activities": [activity]}
+
+
+def _plan(weeks, **extra):
+    return {"title": "Biology", "duration_weeks": len(weeks), "weekly_schedule": weeks, **extra}
+
+
+WEEKS = [_week(n, f"Topic {n}") for n in range(1, 12)]
+
+
+@pytest.mark.parametrize("week", [1, 5, 10, 11])
+@pytest.mark.parametrize("extra", [{}, {"notes": "Bring goggles", "resources": ["Textbook"]}])
+def test_splice_matches_full_render(week, extra):
+    markdown = render_lesson_plan_markdown(_plan(WEEKS, **extra))
+    entry = _week(week, "Rewritten", activity="Lab")
+    regenerated = [entry if w["week"] == week else w for w in WEEKS]
+
+    spliced = replace_week_markdown(markdown, week, render_week_markdown(entry))
+    assert spliced == render_lesson_plan_markdown(_plan(regenerated, **extra))
+
+
+def test_week_one_does_not_match_week_ten():
+    markdown = render_lesson_plan_markdown(_plan(WEEKS))
+    spliced = replace_week_markdown(markdown, 1, render_week_markdown(_week(1, "Rewritten")))
+    assert "### Week 10: Topic 10" in spliced
+    assert "### Week 1: Rewritten" in spliced
+    assert "### Week 1: Topic 1\n" not in spliced
+
+
+def test_last_week_gets_no_trailing_separator():
+    markdown = render_lesson_plan_markdown(_plan(WEEKS))
+    spliced = replace_week_markdown(markdown, 11, render_week_markdown(_week(11, "Rewritten")))
+    assert spliced.endswith(render_week_markdown(_week(11, "Rewritten")))
+
+
+def test_missing_week_returns_none():
+    markdown = render_lesson_plan_markdown(_plan(WEEKS))
+    assert replace_week_markdown(markdown, 12, "### Week 12") is None
+    assert replace_week_markdown("", 1, "### Week 1") is None
+    assert replace_week_markdown(None, 1, "### Week 1") is None
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+from postgrest.exceptions import APIError
+
+from routes.lesson_plan_routes import _patch_week
+
+
+class FakeSupabase:
+    """Just the calls _patch_week makes: rpc(...).execute() and table(...).update(...).eq(...).execute()."""
+
+    def __init__(self, rpc_result=None, rpc_error=None, updated_rows=1):
+        self.rpc_result = rpc_result
+        self.rpc_error = rpc_error
+        self.updated_rows = updated_rows
+        self.rpc_params = None
+        self.full_update = None
+
+    def rpc(self, name, params):
+        self.rpc_params = params
+        return self
+
+    def table(self, name):
+        return self
+
+    def update(self, values):
+        self.full_update = values
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        if self.full_update is not None:
+            return SimpleNamespace(data=[{"id": "p"}] * self.updated_rows)
+        if self.rpc_error is not None:
+            raise self.rpc_error
+        return SimpleNamespace(data=self.rpc_result)
+
+
+@pytest.fixture(autouse=True)
+def app_context():
+    with Flask(__name__).app_context():
+        yield
+
+
+def _result():
+    return {"weekly_schedule": [{"week": 1, "topic": "Old"}, {"week": 2, "topic": "Old"}]}
+
+
+def test_rpc_patches_in_place():
+    supabase = FakeSupabase(rpc_result=1)
+    assert _patch_week(supabase, "p", _result(), 1, 2, {"week": 2, "topic": "New"}, None) == 1
+    assert supabase.rpc_params["week_index"] == 1 and supabase.rpc_params["expected_week"] == 2
+    assert supabase.full_update is None
+
+
+def test_rpc_that_touched_nothing_reports_zero():
+    supabase = FakeSupabase(rpc_result=0)
+    assert _patch_week(supabase, "p", _result(), 1, 2, {"week": 2}, None) == 0
+    assert supabase.full_update is None
+
+
+@pytest.mark.parametrize("code", ["PGRST202", "42883"])
+def test_missing_function_rewrites_the_result(code):
+    supabase = FakeSupabase(rpc_error=APIError({"code": code, "message": "function not found"}))
+    result = _result()
+    assert _patch_week(supabase, "p", result, 1, 2, {"week": 2, "topic": "New"}, "# Plan") == 1
+    assert supabase.full_update == {"result": result}
+    assert result["weekly_schedule"][1]["topic"] == "New" and result["_markdown"] == "# Plan"
+
+
+def test_missing_function_and_missing_row_reports_zero():
+    supabase = FakeSupabase(rpc_error=APIError({"code": "PGRST202"}), updated_rows=0)
+    assert _patch_week(supabase, "p", _result(), 0, 1, {"week": 1}, None) == 0
+
+
+@pytest.mark.parametrize("error", [APIError({"code": "57014", "message": "statement timeout"}), ConnectionError("reset")])
+def test_other_errors_do_not_rewrite_a_stale_copy(error):
+    supabase = FakeSupabase(rpc_error=error)
+    with pytest.raises(type(error)):
+        _patch_week(supabase, "p", _result(), 0, 1, {"week": 1}, None)
+    assert supabase.full_update is None
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from core import pdf_tool
+from core.chunker import estimate_tokens
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.append(BENCHMARKS)
+
+from synthetic_pdf import write_synthetic_pdf  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    path = tmp_path_factory.mktemp("pdf") / "reader.pdf"
+    write_synthetic_pdf(str(path), pages=12)
+    return str(path)
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """Counts pages PyPDF2 extracts; boilerplate sampling is off so only the main loop reads pages."""
+    monkeypatch.setattr(pdf_tool, "BOILERPLATE_ENABLED", False)
+    calls = []
+    real = pdf_tool._extract_from_reader
+
+    def counting(reader, file_path, start, stop):
+        calls.extend(range(start, stop))
+        return real(reader, file_path, start, stop)
+
+    monkeypatch.setattr(pdf_tool, "_extract_from_reader", counting)
+    return calls
+
+
+def test_streams_every_page(pdf, extracted):
+    pages = list(pdf_tool.iter_pdf_text(pdf, use_cache=False))
+    assert len(pages) == 12
+    assert all(pages)
+    assert extracted == list(range(12))
+
+
+def test_page_selection(pdf, extracted):
+    every = list(pdf_tool.iter_pdf_text(pdf, use_cache=False))
+    extracted.clear()
+    assert list(pdf_tool.iter_pdf_text(pdf, pages=[5, 2], use_cache=False)) == [every[5], every[2]]
+    assert extracted == [5, 2]
+    # out-of-range indices are skipped
+    assert list(pdf_tool.iter_pdf_text(pdf, pages=[-1, 1, 12, 99], use_cache=False)) == [every[1]]
+
+
+def test_max_tokens_stops_reading_early(pdf, extracted):
+    first = next(pdf_tool.iter_pdf_text(pdf, use_cache=False))
+    budget = estimate_tokens(first) + 10
+    extracted.clear()
+
+    out = list(pdf_tool.iter_pdf_text(pdf, max_tokens=budget, use_cache=False))
+    assert out[0] == first
+    assert len(out) == 2  # the second page is truncated to the rest of the budget
+    assert sum(estimate_tokens(p) for p in out) <= budget
+    assert extracted == [0, 1]
+
+
+def test_max_tokens_zero_yields_nothing(pdf, extracted):
+    assert list(pdf_tool.iter_pdf_text(pdf, max_tokens=0, use_cache=False)) == []
+    assert extracted == [0]
+
+
+def test_cached_pages_skip_pypdf(pdf, extracted):
+    first = list(pdf_tool.iter_pdf_text(pdf, pages=range(3)))
+    extracted.clear()
+    assert list(pdf_tool.iter_pdf_text(pdf, pages=range(3))) == first
+    assert extracted == []
+
+
+def test_missing_file_yields_nothing(tmp_path):
+    assert list(pdf_tool.iter_pdf_text(str(tmp_path / "missing.pdf"))) == []
+
+
+def _peak_rss(mode, path, budget=2000):
+    # One fresh interpreter per mode (benchmarks/bench_pdf_memory.py), so peaks do not mix
+    out = subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS, "bench_pdf_memory.py"),
+         "--mode", mode, "--path", path, "--budget", str(budget)],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    return float(out[1]), int(out[3])
+
+
+def test_streaming_peak_rss_stays_below_whole_document(tmp_path):
+    path = str(tmp_path / "large.pdf")
+    write_synthetic_pdf(path, pages=120, lines_per_page=120)
+
+    base, _ = _peak_rss("baseline", path)
+    full, full_chars = _peak_rss("full", path)
+    stream, stream_chars = _peak_rss("stream", path)
+    budget, budget_chars = _peak_rss("budget", path)
+
+    assert full_chars > 1_000_000
+    assert stream_chars > 0.99 * full_chars
+    assert stream - base < 0.5 * (full - base)
+    assert budget - base < 0.5 * (full - base)
+    assert budget_chars <= 2000 * 4
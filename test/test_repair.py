@@ -0,0 +1,84 @@
+import json
+
+from core.json_extract import parse_json
+from core.repair import Fragment, array_item_spans, find_fragments, repair_fragments, salvage
+
+RAW = '{"title": "Quiz", "questions": [{"q": "a", "answer": "1"}, {"q": "b", "answer": 2,}, {"q": "c [x]"}], "rubric": []}'
+
+
+def _check(item, index):
+    return None if isinstance(item, dict) and item.get("answer") else "missing answer"
+
+
+def test_array_item_spans_finds_each_item():
+    open_at, close_at, spans = array_item_spans(RAW, "questions")
+    assert RAW[open_at] == "[" and RAW[close_at] == "]"
+    assert [RAW[s:e] for s, e in spans] == ['{"q": "a", "answer": "1"}', '{"q": "b", "answer": 2,}', '{"q": "c [x]"}']
+
+
+def test_array_item_spans_ignores_nested_and_string_brackets():
+    raw = '{"meta": {"questions": [1]}, "note": "questions: [", "questions": [[1, 2], "x]"]}'
+    _, _, spans = array_item_spans(raw, "questions")
+    assert [raw[s:e] for s, e in spans] == ["[1, 2]", '"x]"']
+
+
+def test_array_item_spans_missing_or_unclosed():
+    assert array_item_spans('{"other": []}', "questions") is None
+    assert array_item_spans('{"questions": [{"q": "a"}, {"q": ', "questions") is None
+    assert array_item_spans("no json here", "questions") is None
+
+
+def test_salvage_replaces_broken_items_with_null():
+    doc, broken = salvage(RAW, "questions", parse_json)
+    assert doc["title"] == "Quiz"
+    assert doc["questions"][0] == {"q": "a", "answer": "1"}
+    assert doc["questions"][1] is None
+    assert broken == {1: '{"q": "b", "answer": 2,}'}
+
+
+def test_salvage_gives_up_when_nothing_is_broken_in_the_array():
+    assert salvage('{"questions": [{"q": "a"}], "x": }', "questions", parse_json) is None
+
+
+def test_find_fragments_combines_broken_and_rejected():
+    doc, broken = salvage(RAW, "questions", parse_json)
+    fragments = find_fragments(doc, "questions", _check, broken)
+    assert [(f.index, f.problem) for f in fragments] == [(1, "The item is not valid JSON."), (2, "missing answer")]
+
+
+def _repair(doc, fragments, replies):
+    replies = list(replies)
+    return repair_fragments(
+        doc, "questions", fragments, "{q: string, answer: string}", lambda messages: replies.pop(0),
+        parse_json, _check, full_retry_tokens=10000,
+    )
+
+
+def test_complete_repair_credits_saved_tokens():
+    doc = {"questions": [{"q": "a", "answer": "1"}, None]}
+    report = _repair(doc, [Fragment(1, '{"q": "b",', "The item is not valid JSON.")], ['{"q": "b", "answer": "2"}'])
+    assert doc["questions"][1] == {"q": "b", "answer": "2"}
+    assert report["repaired"] == 1 and report["failed"] == 0
+    assert 0 < report["repair_tokens"] < 10000
+    assert report["tokens_saved"] == 10000 - report["repair_tokens"]
+    assert report["tokens_wasted"] == 0
+
+
+def test_partial_repair_counts_tokens_as_extra_cost():
+    doc = {"questions": [None, {"q": "b"}]}
+    fragments = [Fragment(0, "{", "The item is not valid JSON."), Fragment(1, json.dumps({"q": "b"}), "missing answer")]
+    report = _repair(doc, fragments, ['{"q": "a", "answer": "1"}', '{"q": "b"}'])
+    assert report["repaired"] == 1 and report["failed"] == 1
+    assert report["tokens_saved"] == 0
+    assert report["tokens_wasted"] == report["repair_tokens"] > 0
+    # the unrepaired parsed item is kept, the null placeholder is gone
+    assert doc["questions"] == [{"q": "a", "answer": "1"}, {"q": "b"}]
+
+
+def test_failed_repair_saves_nothing():
+    doc = {"questions": [None]}
+    report = _repair(doc, [Fragment(0, "{", "The item is not valid JSON.")], ["still broken"])
+    assert report["repaired"] == 0
+    assert report["tokens_saved"] == 0
+    assert report["tokens_wasted"] == report["repair_tokens"]
+    assert doc["questions"] == []
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+from agents import assessment_agent
+from agents.assessment_agent import AssessmentAgent
+from core.chunker import estimate_tokens
+from core.retrieval import format_pages, parse_pages, pdf_index, text_index
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from synthetic_pdf import write_synthetic_pdf  # noqa: E402
+
+TEXT = " ".join(
+    f"Paragraph {i}: " + ("mitochondria produce energy for the cell. " if i % 7 == 3 else "plants grow toward light. ") * 20
+    for i in range(40)
+)
+
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    path = tmp_path_factory.mktemp("retrieval") / "reader.pdf"
+    write_synthetic_pdf(str(path), pages=6)
+    return str(path)
+
+
+def test_topic_selects_matching_chunks():
+    index = text_index(TEXT, chunk_tokens=60)
+    chosen = index.select(topic="mitochondria", top_k=3)
+    assert chosen and len(chosen) <= 3
+    assert all("mitochondria" in index.chunks[i] for i in chosen)
+
+
+def test_topic_without_overlap_falls_back_to_document_order():
+    index = text_index(TEXT, chunk_tokens=60)
+    chosen = index.select(topic="zzzz", token_budget=300)
+    assert chosen == list(range(len(chosen)))
+    assert sum(estimate_tokens(index.chunks[i]) for i in chosen) <= 300
+
+
+def test_topic_without_overlap_stays_within_pages(pdf):
+    index = pdf_index(pdf)
+    chosen = index.select(topic="zzzz", pages={2, 3})
+    assert chosen and {int(index.chunk_pages[i]) for i in chosen} <= {2, 3}
+
+
+def test_pages_outside_the_document_select_nothing(pdf):
+    assert pdf_index(pdf).select(pages={40, 41}) == []
+
+
+def test_format_pages_round_trips():
+    assert format_pages(parse_pages("3-7, 10, 12-13")) == "3-7, 10, 12-13"
+
+
+def test_assessment_names_pages_that_matched_nothing(pdf, monkeypatch):
+    def no_llm(**kwargs):
+        raise AssertionError("the model must not be called")
+
+    monkeypatch.setattr(assessment_agent, "chat_completion", no_llm)
+    result = AssessmentAgent().generate_assessment(pdf, {"pages": "40-45"})
+    assert result == {
+        "error": "The selected pages (40-45) have no text in this document; pages with text: 1-6."
+    }
+
+
+def test_assessment_unknown_topic_still_uses_the_material(pdf):
+    text = AssessmentAgent()._load_material(pdf, {"topic": "zzzz"})
+    assert text.startswith("[Page 1]")
@@ -0,0 +1,34 @@
+from core.schemas import coerce_integers, fill_defaults, schema_error
+
+WEEK = {"week": 1, "topic": "Intro"}
+
+
+def test_coerce_integers_parses_text_and_floats():
+    plan = {"total_duration": "16 weeks", "class_size": 30.0, "sections_per_week": " 2 ", "title": "7 wonders"}
+    coerce_integers("lesson_plan", plan)
+    assert plan == {"total_duration": 16, "class_size": 30, "sections_per_week": 2, "title": "7 wonders"}
+
+
+def test_coerce_integers_leaves_unparseable_values():
+    plan = {"total_duration": "sixteen", "class_size": 2.5}
+    coerce_integers("lesson_plan", plan)
+    assert plan == {"total_duration": "sixteen", "class_size": 2.5}
+
+
+def test_generated_plan_with_text_totals_validates_after_coercion():
+    plan = {"weekly_schedule": [WEEK], "total_duration": "16 weeks"}
+    fill_defaults("lesson_plan", plan, total_duration=16, class_size=30, sections_per_week=2)
+    assert plan["total_duration"] == "16 weeks"  # setdefault keeps the model's value
+    assert schema_error("lesson_plan", plan) is not None
+    assert schema_error("lesson_plan", coerce_integers("lesson_plan", plan)) is None
+
+
+def test_saved_schema_accepts_older_plans():
+    assert schema_error("lesson_plan_saved", {"title": "Draft"}) is None
+    assert schema_error("lesson_plan_saved", {"weekly_schedule": [], "total_duration": "one term"}) is None
+    assert schema_error("lesson_plan", {"weekly_schedule": []}) is not None
+
+
+def test_saved_schema_still_checks_weeks():
+    err = schema_error("lesson_plan_saved", {"weekly_schedule": [WEEK, {"week": 2}]})
+    assert err is not None and err.path[:2] == ("weekly_schedule", 1)
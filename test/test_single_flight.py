@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core import single_flight
+from core.single_flight import SingleFlight, SqliteLease
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(single_flight, "PEER_POLL_SECONDS", 0.01)
+
+
+@pytest.fixture
+def lease(tmp_path):
+    return SqliteLease(str(tmp_path / "inflight.sqlite"))
+
+
+def _peer_holds(lease, key, seconds=5.0):
+    # A lease row written by another worker
+    lease._connect().execute(
+        "INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+        (key, "otherhost:1", time.time() + seconds),
+    )
+
+
+def test_do_runs_concurrent_identical_calls_once():
+    flight = SingleFlight()
+    calls = []
+    barrier = threading.Barrier(5)
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(flight.do("k", fn))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_ado_runs_concurrent_identical_calls_once():
+    flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("k", fn) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_ado_waits_for_peer_without_blocking_the_loop(lease):
+    flight = SingleFlight(lease, lease_ttl=5)
+    _peer_holds(lease, "k")
+    lookups = []
+
+    def lookup():
+        lookups.append(threading.get_ident())
+        return "peer result" if len(lookups) >= 3 else None
+
+    async def fn():
+        raise AssertionError("the peer's result should be used")
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        result = await flight.ado("k", fn, lookup)
+        task.cancel()
+        return result, threading.get_ident(), ticks
+
+    result, loop_thread, ticks = asyncio.run(main())
+    assert result == "peer result"
+    assert loop_thread not in lookups
+    assert ticks > 0
+    assert flight.stats()["peer_hits"] == 1
+
+
+def test_ado_calls_upstream_when_peer_lease_is_gone(lease):
+    flight = SingleFlight(lease, lease_ttl=5)
+    _peer_holds(lease, "k", seconds=0.05)
+
+    async def fn():
+        return "own result"
+
+    assert asyncio.run(flight.ado("k", fn, lambda: None)) == "own result"
+    # released after the call
+    assert not lease.held_by_peer("k")
+    assert lease._connect().execute("SELECT COUNT(*) FROM leases WHERE key = 'k'").fetchone()[0] == 0
@@ -0,0 +1,70 @@
+import io
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils.upload_janitor import UploadJanitor
+from utils.upload_store import UploadStore
+
+
+def _stored(store, data, age):
+    path = store.save(SimpleNamespace(stream=io.BytesIO(data), filename="x.pdf")).path
+    old = time.time() - age
+    os.utime(path, (old, old))
+    store._connect().execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (old, path.stem))
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(tmp_path)
+
+
+def _janitor(root, references, **kw):
+    return UploadJanitor(root, max_age=60, max_bytes=0, grace=10, references=references, **kw)
+
+
+def test_deletes_only_unreferenced_expired_files(tmp_path, store):
+    kept = _stored(store, b"%PDF kept", 3600)
+    gone = _stored(store, b"%PDF gone", 3600)
+    fresh = _stored(store, b"%PDF fresh", 0)
+
+    report = _janitor(tmp_path, lambda: {kept.name}).run_once()
+    assert report.skipped is None
+    assert (kept.exists(), gone.exists(), fresh.exists()) == (True, False, True)
+    assert report.referenced_files == 1 and report.expired_files == 1
+
+
+def test_empty_reference_lookup_deletes_nothing(tmp_path, store):
+    old = _stored(store, b"%PDF old", 3600)
+    report = _janitor(tmp_path, lambda: set()).run_once()
+    assert report.skipped == "reference lookup returned no names"
+    assert old.exists()
+
+
+def test_failed_reference_lookup_deletes_nothing(tmp_path, store):
+    old = _stored(store, b"%PDF old", 3600)
+
+    def broken():
+        raise RuntimeError("rpc missing")
+
+    report = _janitor(tmp_path, broken).run_once()
+    assert "rpc missing" in report.skipped
+    assert old.exists()
+
+
+def test_reference_count_collapse_deletes_nothing(tmp_path, store):
+    saved = [_stored(store, f"%PDF saved {i}".encode(), 3600) for i in range(10)]
+    names = {p.name for p in saved}
+    assert _janitor(tmp_path, lambda: names).run_once().skipped is None
+
+    # e.g. RLS filtered the lookup down to one user's rows
+    report = _janitor(tmp_path, lambda: {saved[0].name}).run_once()
+    assert report.skipped.startswith("reference lookup returned 1 names")
+    assert all(p.exists() for p in saved)
+
+    # An operator can accept a real mass deletion
+    report = _janitor(tmp_path, lambda: {saved[0].name}, min_reference_ratio=0).run_once()
+    assert report.skipped is None and report.expired_files == 9
@@ -0,0 +1,90 @@
+import io
+import os
+import sqlite3
+import time
+from types import SimpleNamespace
+
+from utils.upload_janitor import UploadJanitor
+from utils.upload_store import DB_NAME, UploadStore
+
+
+def _upload(data: bytes, name: str = "notes.pdf"):
+    return SimpleNamespace(stream=io.BytesIO(data), filename=name)
+
+
+def _age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_identical_uploads_share_one_file(tmp_path):
+    store = UploadStore(tmp_path)
+    first = store.save(_upload(b"%PDF same", "a.pdf"))
+    second = store.save(_upload(b"%PDF same", "b.pdf"))
+    assert first.path == second.path and first.path.read_bytes() == b"%PDF same"
+    assert (first.deduplicated, second.deduplicated) == (False, True)
+    assert store.info(first.sha256)["original_filenames"] == ["a.pdf", "b.pdf"]
+    assert list((tmp_path / ".tmp").iterdir()) == []
+
+
+def test_dedup_hit_touches_the_blob(tmp_path):
+    store = UploadStore(tmp_path)
+    stored = store.save(_upload(b"%PDF touched"))
+    _age(stored.path, 3600)
+    store.save(_upload(b"%PDF touched"))
+    assert time.time() - stored.path.stat().st_mtime < 60
+
+
+def test_delete_if_unused_keeps_a_blob_uploaded_after_the_scan(tmp_path):
+    store = UploadStore(tmp_path)
+    stored = store.save(_upload(b"%PDF race"))
+    _age(stored.path, 3600)
+    seen = stored.path.stat().st_mtime
+
+    # The upload lands between the janitor's scan and its delete
+    store.save(_upload(b"%PDF race"))
+    assert not store.delete_if_unused(stored.path, seen)
+    assert stored.path.exists()
+
+    assert store.delete_if_unused(stored.path, time.time() + 1)
+    assert not stored.path.exists()
+    assert store.info(stored.sha256) is None
+
+
+def test_reupload_after_delete_restores_the_file(tmp_path):
+    store = UploadStore(tmp_path)
+    stored = store.save(_upload(b"%PDF again"))
+    store.delete_if_unused(stored.path, time.time() + 1)
+    again = store.save(_upload(b"%PDF again"))
+    assert not again.deduplicated
+    assert again.path.read_bytes() == b"%PDF again"
+
+
+def test_old_store_loses_the_refcount_column(tmp_path):
+    conn = sqlite3.connect(tmp_path / DB_NAME)
+    conn.execute(
+        "CREATE TABLE blobs (sha256 TEXT PRIMARY KEY, rel_path TEXT NOT NULL, size INTEGER NOT NULL,"
+        " refcount INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+    )
+    conn.close()
+    store = UploadStore(tmp_path)
+    assert store.save(_upload(b"%PDF migrated")).path.exists()
+
+
+def test_janitor_skips_a_blob_reuploaded_during_the_scan(tmp_path, monkeypatch):
+    store = UploadStore(tmp_path)
+    stored = store.save(_upload(b"%PDF janitor race"))
+    _age(stored.path, 3600)
+    janitor = UploadJanitor(tmp_path, max_age=60, max_bytes=0, grace=10, references=lambda: {"other.pdf"})
+    janitor.store = store
+
+    real_delete = store.delete_if_unused
+
+    def upload_then_delete(path, used):
+        store.save(_upload(b"%PDF janitor race"))
+        return real_delete(path, used)
+
+    monkeypatch.setattr(store, "delete_if_unused", upload_then_delete)
+    report = janitor.run_once()
+    assert report.expired_files == 0
+    assert stored.path.exists()
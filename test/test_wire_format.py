@@ -0,0 +1,61 @@
+import pytest
+
+from agents.lesson_plan_agent import COMPACT_WEEK_KEYS, WEEK_OUTLINE_SPEC, LessonPlanAgent
+from core.wire_format import LESSON_WEEK_WIRE, WireFormat
+
+WEEK = {
+    "week": 3,
+    "topic": "Cells",
+    "learning_objectives": ["Describe organelles"],
+    "vocabulary": ["nucleus", "ribosome"],
+    "activities": [{"name": "Lab", "duration_minutes": 30, "type": "Hands-on"}],
+    "timeline": [{"time_range": "0-10", "activity": "Warm-up", "instructor_notes": "Recap"}],
+    "materials": ["Microscopes"],
+    "differentiation": {"support_strategies": ["Diagrams"], "challenge_strategies": ["Essay"], "accommodations": []},
+    "assessment": {"type": "Quiz", "questions_or_tasks": ["Name three organelles"], "rubric": "1 pt each", "duration_minutes": 10},
+    "homework": {"tasks": ["Read ch. 3"], "estimated_time_minutes": 20, "due_date_offset_days": 2},
+    "sections": [{"section_number": 1, "title": "Intro", "activities": ["Lab"], "materials": [], "assessment": "Exit ticket"}],
+}
+
+
+def test_compact_expand_round_trip():
+    compact = LESSON_WEEK_WIRE.compact(WEEK)
+    assert compact["w"] == 3
+    assert compact["a"] == [["Lab", 30, "Hands-on"]]
+    assert compact["d"]["s"] == ["Diagrams"]
+    assert LESSON_WEEK_WIRE.expand(compact) == WEEK
+
+
+def test_expand_passes_full_keys_and_objects_through():
+    assert LESSON_WEEK_WIRE.expand(WEEK) == WEEK
+    mixed = {"w": 1, "topic": "Intro", "a": [{"name": "Talk", "duration_minutes": 5, "type": "Lecture"}], "extra": 1}
+    assert LESSON_WEEK_WIRE.expand(mixed) == {
+        "week": 1, "topic": "Intro", "activities": [{"name": "Talk", "duration_minutes": 5, "type": "Lecture"}], "extra": 1,
+    }
+
+
+def test_expand_list_of_weeks():
+    assert LESSON_WEEK_WIRE.expand([LESSON_WEEK_WIRE.compact(WEEK)] * 2) == [WEEK, WEEK]
+
+
+def test_ambiguous_short_keys_rejected():
+    with pytest.raises(ValueError):
+        WireFormat({"week": "w", "weeks": "w"})
+    with pytest.raises(ValueError):
+        WireFormat({"week": "topic", "topic": "t"})
+
+
+def test_legend_names_every_field():
+    legend = LESSON_WEEK_WIRE.legend()
+    for full in WEEK:
+        assert full in legend
+
+
+@pytest.mark.parametrize("compact_output", [False, True])
+def test_skeleton_prompt_has_outline_spec_only(compact_output):
+    agent = LessonPlanAgent(compact_output=compact_output)
+    system = agent._build_skeleton_messages("material", 12, 30, 2)[0]["content"]
+    assert WEEK_OUTLINE_SPEC in system
+    assert "weekly_schedule (array" not in system
+    assert COMPACT_WEEK_KEYS not in system
+    assert LESSON_WEEK_WIRE.legend() not in system
@@ -1,5 +1,5 @@
 from pathlib import Path
-from werkzeug.utils import secure_filename
+from utils.upload_store import get_upload_store
 
 ALLOWED_EXTENSIONS = {'.pdf'}
 
@@ -9,14 +9,8 @@ def allowed_file(filename: str) -> bool:
 
 def save_uploaded_file(file, upload_dir: Path) -> Path:
     """
-    Save uploaded file with unique name if file exists
+    Save uploaded file into the content-addressed store (ab/cd/<sha256>.pdf);
+    identical uploads share one file. The original filename is kept as metadata.
     Returns: Path to saved file
     """
-    safe_name = secure_filename(file.filename or "")
-    dest = upload_dir / safe_name
-    i = 1
-    while dest.exists():
-        dest = upload_dir / f"{dest.stem}_{i}{dest.suffix}"
-        i += 1
-    file.save(dest.as_posix())
-    return dest
\ No newline at end of file
+    return get_upload_store(upload_dir).save(file).path
\ No newline at end of file
@@ -0,0 +1,283 @@
+"""
+Garbage collection for UPLOAD_DIR.
+
+A file is kept while an assessments or lesson_plans row points at it
+(pdf_path). Unreferenced files are deleted once they are older than
+UPLOAD_MAX_AGE_SECONDS; if the directory is still above UPLOAD_MAX_BYTES,
+the least recently used unreferenced files go next. Nothing younger than
+UPLOAD_GRACE_SECONDS is touched, since a fresh upload is only saved to the
+database after the user reviews the generated result.
+
+The scan walks the directory in batches of UPLOAD_JANITOR_BATCH entries and
+yields between batches, so a large directory never stalls the worker.
+
+References come from the upload_reference_names() RPC
+(database/rpc_upload_references.sql). It is SECURITY DEFINER, so it sees every
+user's rows; the janitor runs outside any request and has no user context
+for RLS. The cycle deletes nothing when the lookup fails, when it returns no
+names, or when it returns far fewer than the last accepted lookup (see
+UPLOAD_JANITOR_MIN_REFERENCE_RATIO).
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from core.config import (
+    CACHE_DIR,
+    UPLOAD_GRACE_SECONDS,
+    UPLOAD_JANITOR_BATCH,
+    UPLOAD_JANITOR_INTERVAL_SECONDS,
+    UPLOAD_JANITOR_MIN_REFERENCE_RATIO,
+    UPLOAD_MAX_AGE_SECONDS,
+    UPLOAD_MAX_BYTES,
+)
+from core.logger import logger
+from core.single_flight import SqliteLease
+from utils.upload_store import DB_NAME, get_upload_store
+
+# upload_store meta entry holding the size of the last accepted reference lookup
+REFERENCE_COUNT_META = "janitor_reference_count"
+# Pause between scan batches; keeps the janitor from competing with request I/O
+BATCH_PAUSE_SECONDS = 0.05
+
+_SHA_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass
+class JanitorReport:
+    started_at: float = 0.0
+    scanned_files: int = 0
+    scanned_bytes: int = 0
+    referenced_files: int = 0
+    expired_files: int = 0
+    evicted_files: int = 0
+    reclaimed_bytes: int = 0
+    remaining_bytes: int = 0
+    scan_seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+    skipped: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def fetch_referenced_names() -> Set[str]:
+    """
+    File names of every pdf_path in assessments and lesson_plans, for all users.
+
+    Names rather than full paths: rows written by another deployment (or
+    before UPLOAD_DIR moved) still protect their file. Upload names are
+    unique within UPLOAD_DIR, so this can only keep too much, never too little.
+    Not the table API: outside a request RLS filters it to no rows, or to the rows
+    of whichever user last set the shared client's context.
+    """
+    from utils.db import get_supabase_client
+
+    res = get_supabase_client().rpc("upload_reference_names", {}).execute()
+    if not isinstance(res.data, list):
+        raise RuntimeError(f"upload_reference_names returned {type(res.data).__name__}")
+    return {Path(path).name for path in res.data if path}
+
+
+class UploadJanitor:
+    def __init__(
+        self,
+        root: Path,
+        max_age: float = UPLOAD_MAX_AGE_SECONDS,
+        max_bytes: int = UPLOAD_MAX_BYTES,
+        grace: float = UPLOAD_GRACE_SECONDS,
+        batch: int = UPLOAD_JANITOR_BATCH,
+        references=fetch_referenced_names,
+        min_reference_ratio: float = UPLOAD_JANITOR_MIN_REFERENCE_RATIO,
+    ):
+        self.root = Path(root).resolve()
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.batch = max(1, batch)
+        self.references = references
+        self.min_reference_ratio = min_reference_ratio
+        self.store = get_upload_store(self.root)
+        self.last_report: Optional[JanitorReport] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _walk(self) -> Iterator[os.DirEntry]:
+        stack = [self.root.as_posix()]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and not entry.name.startswith(DB_NAME):
+                            yield entry
+            except OSError as e:
+                logger.warning("Upload janitor cannot list a directory: %s", e)
+
+    def _delete(self, path: str, report: JanitorReport, used: Optional[float] = None) -> bool:
+        """
+        Delete path. Store blobs go through UploadStore.delete_if_unused, which
+        keeps the file if it was uploaded again after `used` (what the scan saw).
+        """
+        p = Path(path)
+        try:
+            if used is not None and _SHA_NAME.match(p.stem):
+                if not self.store.delete_if_unused(p, used):
+                    return False
+            else:
+                os.unlink(path)
+        except FileNotFoundError:
+            return False
+        except (OSError, sqlite3.Error) as e:
+            report.errors.append(f"{path}: {e}")
+            return False
+        # Drop emptied ab/cd shard directories; rmdir fails harmlessly when they are not empty
+        for parent in (p.parent, p.parent.parent):
+            if parent.name == ".tmp" or parent == self.root or self.root not in parent.parents:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+        return True
+
+    def _suspicious(self, referenced: Set[str]) -> Optional[str]:
+        """Why a reference lookup should not be trusted with deletes, or None."""
+        if not referenced:
+            return "reference lookup returned no names"
+        previous = self.store.get_meta(REFERENCE_COUNT_META)
+        if previous and len(referenced) < previous * self.min_reference_ratio:
+            return f"reference lookup returned {len(referenced)} names, last accepted {int(previous)}"
+        return None
+
+    def run_once(self) -> JanitorReport:
+        report = JanitorReport(started_at=time.time())
+        t0 = time.perf_counter()
+        try:
+            referenced = set(self.references())
+            report.skipped = self._suspicious(referenced)
+        except Exception as e:
+            report.skipped = f"reference lookup failed: {e}"
+        if report.skipped:
+            report.scan_seconds = time.perf_counter() - t0
+            logger.warning("Upload janitor skipped %s: %s", self.root, report.skipped)
+            self.last_report = report
+            return report
+        self.store.set_meta(REFERENCE_COUNT_META, len(referenced))
+
+        last_used = self.store.last_used()
+        now = time.time()
+        tmp_dir = (self.root / ".tmp").as_posix()
+        # (last used, size, path) of unreferenced files still inside the age limit
+        candidates: List[Tuple[float, int, str]] = []
+        remaining = 0
+
+        for n, entry in enumerate(self._walk(), 1):
+            if self._stop.is_set():
+                break
+            if n % self.batch == 0:
+                time.sleep(BATCH_PAUSE_SECONDS)
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            report.scanned_files += 1
+            report.scanned_bytes += st.st_size
+
+            if os.path.dirname(entry.path) == tmp_dir:
+                # Leftover of an interrupted upload
+                if now - st.st_mtime > self.grace and self._delete(entry.path, report):
+                    report.expired_files += 1
+                    report.reclaimed_bytes += st.st_size
+                else:
+                    remaining += st.st_size
+                continue
+
+            if entry.name in referenced:
+                report.referenced_files += 1
+                remaining += st.st_size
+                continue
+
+            rel = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+            used = max(last_used.get(rel, 0.0), st.st_mtime)
+            if now - used <= self.grace:
+                remaining += st.st_size
+            elif now - used > self.max_age:
+                if self._delete(entry.path, report, used):
+                    report.expired_files += 1
+                    report.reclaimed_bytes += st.st_size
+                else:
+                    remaining += st.st_size
+            else:
+                candidates.append((used, st.st_size, entry.path))
+                remaining += st.st_size
+
+        if self.max_bytes and remaining > self.max_bytes and not self._stop.is_set():
+            candidates.sort()
+            for used, size, path in candidates:
+                if remaining <= self.max_bytes:
+                    break
+                if self._delete(path, report, used):
+                    report.evicted_files += 1
+                    report.reclaimed_bytes += size
+                    remaining -= size
+
+        report.remaining_bytes = remaining
+        report.scan_seconds = time.perf_counter() - t0
+        self.last_report = report
+        logger.info(
+            "Upload janitor %s: scanned %d files (%d bytes) in %.2fs, %d referenced, "
+            "%d expired, %d evicted, reclaimed %d bytes, %d bytes remain",
+            self.root, report.scanned_files, report.scanned_bytes, report.scan_seconds,
+            report.referenced_files, report.expired_files, report.evicted_files,
+            report.reclaimed_bytes, report.remaining_bytes,
+        )
+        return report
+
+    def run_forever(self, interval: float = UPLOAD_JANITOR_INTERVAL_SECONDS) -> None:
+        # Every gunicorn worker starts a janitor; the lease lets one of them run per interval
+        lease = SqliteLease(os.path.join(CACHE_DIR, "janitor.sqlite"))
+        key = f"upload-janitor:{self.root.as_posix()}"
+        while not self._stop.is_set():
+            if lease.acquire(key, interval):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error("Upload janitor failed on %s: %s", self.root, e)
+            self._stop.wait(interval)
+
+
+_janitors: Dict[str, UploadJanitor] = {}
+_janitors_lock = threading.Lock()
+
+
+def get_upload_janitor(root: Path) -> UploadJanitor:
+    key = Path(root).resolve().as_posix()
+    janitor = _janitors.get(key)
+    if janitor is None:
+        with _janitors_lock:
+            janitor = _janitors.get(key)
+            if janitor is None:
+                janitor = _janitors[key] = UploadJanitor(Path(key))
+    return janitor
+
+
+def start_upload_janitor(root: Path, interval: float = UPLOAD_JANITOR_INTERVAL_SECONDS) -> UploadJanitor:
+    """Run the janitor for `root` in a daemon thread (once per process)."""
+    janitor = get_upload_janitor(root)
+    with _janitors_lock:
+        if janitor._thread is None:
+            janitor._thread = threading.Thread(
+                target=janitor.run_forever, args=(interval,), name="upload-janitor", daemon=True
+            )
+            janitor._thread.start()
+    return janitor
@@ -0,0 +1,206 @@
+"""
+Content-addressed store for uploaded PDFs.
+
+Uploads are streamed to a temp file while being hashed, then renamed into
+UPLOAD_DIR/ab/cd/<sha256>.pdf. Identical uploads share one file; a sqlite
+table next to the files records when each blob was last uploaded and the
+original filename of every upload. Whether a blob is still needed is decided
+by the database rows pointing at it (utils.upload_janitor), not here.
+
+A dedup hit and a janitor delete of the same blob both run inside a write
+transaction on that sqlite file, so one cannot slip between the other's
+check and its file operation.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 1024 * 1024
+DB_NAME = "uploads.sqlite"
+
+
+@dataclass
+class StoredUpload:
+    path: Path
+    sha256: str
+    size: int
+    original_filename: str
+    deduplicated: bool
+
+
+class UploadStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / ".tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / DB_NAME
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " sha256 TEXT PRIMARY KEY,"
+            " rel_path TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL"
+            ")"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS upload_names ("
+            " sha256 TEXT NOT NULL,"
+            " original_filename TEXT NOT NULL,"
+            " uploaded_at REAL NOT NULL"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_names_sha ON upload_names (sha256)")
+        # Small numbers kept across workers and restarts (e.g. the janitor's last reference count)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+        # Stores created before the reference count was dropped
+        if any(col[1] == "refcount" for col in conn.execute("PRAGMA table_info(blobs)")):
+            conn.execute("ALTER TABLE blobs DROP COLUMN refcount")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path.as_posix(), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def path_for(self, sha256: str, suffix: str = ".pdf") -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{suffix}"
+
+    def save(self, file) -> StoredUpload:
+        """Store a werkzeug FileStorage (or any object with .stream/.filename)."""
+        original = file.filename or ""
+        suffix = Path(secure_filename(original)).suffix.lower() or ".pdf"
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir, suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for block in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+            sha = digest.hexdigest()
+            dest = self.path_for(sha, suffix)
+
+            now = time.time()
+            conn = self._connect()
+            # Held until the blob is in place and marked used: delete_if_unused waits for it
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                try:
+                    # Touch the existing copy so a scan that already saw it as old keeps it
+                    os.utime(dest)
+                    deduplicated = True
+                except FileNotFoundError:
+                    deduplicated = False
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    # Same filesystem as the store, so the rename is atomic
+                    os.replace(tmp_name, dest)
+                conn.execute(
+                    "INSERT INTO blobs (sha256, rel_path, size, created, last_used) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(sha256) DO UPDATE SET last_used = excluded.last_used",
+                    (sha, dest.relative_to(self.root).as_posix(), size, now, now),
+                )
+                conn.execute(
+                    "INSERT INTO upload_names (sha256, original_filename, uploaded_at) VALUES (?, ?, ?)",
+                    (sha, original, now),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+        return StoredUpload(dest, sha, size, original, deduplicated)
+
+    def delete_if_unused(self, path: Path, used_before: float) -> bool:
+        """
+        Delete a blob file unless it was uploaded (or touched) after used_before,
+        i.e. after the janitor looked at it. Returns True if the file was deleted.
+        """
+        path = Path(path)
+        sha = path.stem
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                mtime = None
+            row = conn.execute("SELECT last_used FROM blobs WHERE sha256 = ?", (sha,)).fetchone()
+            used = max(mtime or 0.0, row[0] if row else 0.0)
+            if mtime is not None and used > used_before:
+                conn.execute("ROLLBACK")
+                return False
+            if mtime is not None:
+                os.unlink(path)
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+            conn.execute("DELETE FROM upload_names WHERE sha256 = ?", (sha,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return mtime is not None
+
+    def last_used(self) -> Dict[str, float]:
+        """rel_path -> last upload time of every tracked blob."""
+        conn = self._connect()
+        return {rel: used for rel, used in conn.execute("SELECT rel_path, last_used FROM blobs")}
+
+    def get_meta(self, name: str) -> Optional[float]:
+        row = self._connect().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: float) -> None:
+        self._connect().execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def info(self, sha256: str) -> Optional[Dict]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT rel_path, size, created, last_used FROM blobs WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        if row is None:
+            return None
+        names: List[str] = [
+            r[0] for r in conn.execute(
+                "SELECT original_filename FROM upload_names WHERE sha256 = ? ORDER BY uploaded_at", (sha256,)
+            )
+        ]
+        return {
+            "sha256": sha256,
+            "path": (self.root / row[0]).as_posix(),
+            "size": row[1],
+            "created": row[2],
+            "last_used": row[3],
+            "original_filenames": names,
+        }
+
+
+_stores: Dict[str, UploadStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_upload_store(root: Path) -> UploadStore:
+    key = Path(root).resolve().as_posix()
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = UploadStore(Path(key))
+    return store